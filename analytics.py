@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+
+import numpy as np
+
+from body_measurement import HISTORY_WINDOWS
+from measurement_store import DEFAULT_STORE, MeasurementStore
+
+# Measurement kinds, in the column order of every aggregate
+KINDS = list(HISTORY_WINDOWS)
+KIND_INDEX = {kind: i for i, kind in enumerate(KINDS)}
+
+DEFAULT_STATE = 'analytics_state.npz'
+
+
+class OnlineMoments:
+    """Running mean and co-moment matrix, merged one chunk of sessions at a time.
+
+    Chunks are combined with the pairwise update of Chan et al., so the
+    result equals a single pass over all rows. Only sessions with every
+    measurement feed the matrix, so all entries share the same rows.
+    """
+
+    def __init__(self, k):
+        self.count = 0
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    def update(self, rows):
+        if len(rows) == 0:
+            return
+        count = len(rows)
+        mean = rows.mean(axis=0)
+        centered = rows - mean
+        delta = mean - self.mean
+        total = self.count + count
+        self.comoment += centered.T @ centered + np.outer(delta, delta) * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    def covariance(self):
+        return self.comoment / (self.count - 1) if self.count > 1 else np.full_like(self.comoment, np.nan)
+
+    def correlation(self):
+        covariance = self.covariance()
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return covariance / np.outer(std, std)
+
+
+class ErrorStats:
+    """Per-kind error of measured values against ground truth."""
+
+    def __init__(self, k):
+        self.count = np.zeros(k)
+        self.abs_sum = np.zeros(k)
+        self.squared_sum = np.zeros(k)
+        self.signed_sum = np.zeros(k)
+
+    def update(self, kinds, measured, truth):
+        kinds = np.asarray(kinds, dtype=int)
+        error = np.asarray(measured, dtype=float) - np.asarray(truth, dtype=float)
+        np.add.at(self.count, kinds, 1)
+        np.add.at(self.abs_sum, kinds, np.abs(error))
+        np.add.at(self.squared_sum, kinds, error ** 2)
+        np.add.at(self.signed_sum, kinds, error)
+
+    def summary(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return {
+                "count": self.count,
+                "mae": self.abs_sum / self.count,
+                "rmse": np.sqrt(self.squared_sum / self.count),
+                "bias": self.signed_sum / self.count,
+            }
+
+
+class Reservoir:
+    """Uniform random sample of at most `size` session vectors from a stream of any length."""
+
+    def __init__(self, size, k, seed=0):
+        self.size = size
+        self.rows = np.empty((0, k))
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, rows):
+        free = max(0, self.size - len(self.rows))
+        self.rows = np.vstack([self.rows, rows[:free]])
+        rest = rows[free:]
+        if len(rest):
+            # Algorithm R: the i-th row seen replaces a random slot with probability size / i
+            seen = self.seen + free + np.arange(1, len(rest) + 1)
+            slots = self.rng.integers(0, seen)
+            for slot, row in zip(slots, rest):
+                if slot < self.size:
+                    self.rows[slot] = row
+        self.seen += len(rows)
+
+
+def session_vectors(records):
+    """(session ids, (sessions, kinds) array with NaN for missing kinds) from measurement records."""
+    sessions = {}
+    for record in records:
+        if record.kind in KIND_INDEX:
+            row = sessions.setdefault(record.session_id, np.full(len(KINDS), np.nan))
+            row[KIND_INDEX[record.kind]] = record.value
+    return list(sessions), np.array(list(sessions.values())).reshape(-1, len(KINDS))
+
+
+class MeasurementAnalytics:
+    """Dashboard aggregates over the whole measurement history, updated incrementally.
+
+    refresh() reads only the rows written since the previous refresh, in
+    chunks of `chunk_size` rows, and folds them into the running
+    correlation, min/max and error aggregates and into a reservoir sample
+    used to train the feature importance model. The state is saved to
+    `state_path`, so a dashboard refresh never rereads old sessions.
+    """
+
+    def __init__(self, store_path=DEFAULT_STORE, state_path=DEFAULT_STATE, chunk_size=10000, sample_size=50000):
+        self.store_path = store_path
+        self.state_path = state_path
+        self.chunk_size = chunk_size
+        k = len(KINDS)
+        self.moments = OnlineMoments(k)
+        self.errors = ErrorStats(k)
+        self.reservoir = Reservoir(sample_size, k)
+        self.minimum = np.full(k, np.inf)
+        self.maximum = np.full(k, -np.inf)
+        self.sessions = 0
+        self.last_measurement_id = 0
+        self.last_truth_id = 0
+        if state_path and os.path.exists(state_path):
+            self._load()
+
+    def refresh(self):
+        """Fold every measurement and ground truth value written since the last refresh."""
+        with MeasurementStore(self.store_path) as store:
+            measurement_id, truth_id = store.last_ids()
+            pending = []
+            for _, record in store.measurements_between(self.last_measurement_id, measurement_id):
+                # Cut chunks between sessions so no session is split across two of them
+                if len(pending) >= self.chunk_size and record.session_id != pending[-1].session_id:
+                    self._add_sessions(pending)
+                    pending = []
+                pending.append(record)
+            self._add_sessions(pending)
+
+            # Each (measurement, truth) pair is counted once: new measurements against
+            # truth seen before, then new truth against every measurement up to now
+            self._add_errors(store.truth_pairs((self.last_measurement_id, measurement_id), (0, self.last_truth_id)))
+            self._add_errors(store.truth_pairs((0, measurement_id), (self.last_truth_id, truth_id)))
+        self.last_measurement_id, self.last_truth_id = measurement_id, truth_id
+        if self.state_path:
+            self._save()
+
+    def _add_sessions(self, records):
+        _, rows = session_vectors(records)
+        if len(rows) == 0:
+            return
+        self.sessions += len(rows)
+        self.minimum = np.fmin(self.minimum, np.nanmin(np.where(np.isnan(rows), np.inf, rows), axis=0))
+        self.maximum = np.fmax(self.maximum, np.nanmax(np.where(np.isnan(rows), -np.inf, rows), axis=0))
+        complete = rows[~np.isnan(rows).any(axis=1)]
+        self.moments.update(complete)
+        self.reservoir.update(complete)
+
+    def _add_errors(self, pairs):
+        pairs = [(KIND_INDEX[kind], measured, truth) for kind, measured, truth in pairs if kind in KIND_INDEX]
+        if pairs:
+            self.errors.update(*zip(*pairs))
+
+    def normalize(self, rows):
+        """Scale rows to [0, 1] per kind with the running min/max of the whole history."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (rows - self.minimum) / (self.maximum - self.minimum)
+
+    def feature_importance(self, target="height", n_estimators=200):
+        """Random forest importance of the other kinds for predicting `target`, on the reservoir sample.
+
+        Trees are fitted on every CPU core. Needs scikit-learn.
+        """
+        from sklearn.ensemble import RandomForestRegressor
+
+        rows = self.reservoir.rows
+        if len(rows) < 2:
+            return {}
+        target_index = KIND_INDEX[target]
+        features = [kind for kind in KINDS if kind != target]
+        model = RandomForestRegressor(n_estimators=n_estimators, n_jobs=-1, random_state=0)
+        model.fit(np.delete(rows, target_index, axis=1), rows[:, target_index])
+        return dict(zip(features, model.feature_importances_.tolist()))
+
+    def report(self):
+        """JSON-friendly summary for dashboards; NaN where there is not enough data."""
+        def clean(values):
+            return [None if not np.isfinite(value) else round(float(value), 4) for value in np.ravel(values)]
+
+        errors = self.errors.summary()
+        return {
+            "kinds": KINDS,
+            "sessions": self.sessions,
+            "complete_sessions": self.moments.count,
+            "correlation": [clean(row) for row in self.moments.correlation()],
+            "mean": clean(self.moments.mean),
+            "min": clean(self.minimum),
+            "max": clean(self.maximum),
+            "errors": {name: dict(zip(KINDS, clean(values))) for name, values in errors.items()},
+        }
+
+    def _save(self):
+        temporary = f"{self.state_path}.tmp.npz"
+        np.savez(temporary, count=self.moments.count, mean=self.moments.mean, comoment=self.moments.comoment,
+                 error_count=self.errors.count, abs_sum=self.errors.abs_sum,
+                 squared_sum=self.errors.squared_sum, signed_sum=self.errors.signed_sum,
+                 sample=self.reservoir.rows, seen=self.reservoir.seen, minimum=self.minimum,
+                 maximum=self.maximum, sessions=self.sessions,
+                 watermarks=[self.last_measurement_id, self.last_truth_id], kinds=KINDS)
+        os.replace(temporary, self.state_path)
+
+    def _load(self):
+        with np.load(self.state_path) as state:
+            if list(state["kinds"]) != KINDS:
+                raise ValueError(f"{self.state_path} was built for other measurement kinds; delete it to rebuild")
+            self.moments.count = int(state["count"])
+            self.moments.mean = state["mean"]
+            self.moments.comoment = state["comoment"]
+            self.errors.count = state["error_count"]
+            self.errors.abs_sum = state["abs_sum"]
+            self.errors.squared_sum = state["squared_sum"]
+            self.errors.signed_sum = state["signed_sum"]
+            self.reservoir.rows = state["sample"][:self.reservoir.size]
+            self.reservoir.seen = int(state["seen"])
+            self.minimum = state["minimum"]
+            self.maximum = state["maximum"]
+            self.sessions = int(state["sessions"])
+            self.last_measurement_id, self.last_truth_id = (int(value) for value in state["watermarks"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Update and print the measurement analytics.")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="measurement store to read")
+    parser.add_argument('--state', default=DEFAULT_STATE, help="file the running aggregates are kept in")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="measurement rows read at a time")
+    parser.add_argument('--importance', metavar='TARGET', help="also fit feature importance for this kind")
+    parser.add_argument('--output', help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    analytics = MeasurementAnalytics(args.store, args.state, args.chunk_size)
+    analytics.refresh()
+    report = analytics.report()
+    if args.importance:
+        report["importance"] = {args.importance: analytics.feature_importance(args.importance)}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
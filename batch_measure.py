@@ -0,0 +1,156 @@
+import argparse
+import multiprocessing
+import os
+import time
+from contextlib import nullcontext
+from multiprocessing.util import Finalize
+
+from body_measurement import (FrameBuffers, calibrated_calculators, calibration_record, infer_landmarks,
+                              measurement_stats, model_input, process_frames, summarize)
+from calibration import DEFAULT_CACHE, CalibrationCache
+from landmark_filter import LandmarkFilter
+from landmarks import body_widths, landmarks_to_array
+from measurement_store import MeasurementStore
+from model_pool import warm_pose
+from offline import iter_frames
+
+# Pose graph owned by each worker process, built once by init_worker
+_pose = None
+
+# Calibration of the camera the recordings were made with, if any
+_camera_calibration = None
+
+# Whether landmarks are smoothed before they are measured, as in a live scan
+_use_filter = True
+
+# Conversion buffers reused by every image this worker measures
+_buffers = FrameBuffers()
+
+
+def init_worker(pose_options=None, camera_calibration=None, use_filter=True):
+    """Build and warm up this worker's Pose graph once; it is reused for every job.
+
+    The graph is closed when the worker process exits.
+    """
+    global _pose, _camera_calibration, _use_filter
+    _pose = warm_pose(**(pose_options or {}))
+    _camera_calibration = camera_calibration
+    _use_filter = use_filter
+    Finalize(_pose, _pose.close, exitpriority=10)
+
+
+def measure_file(path):
+    """Measure one recorded session. Failures are returned, never raised.
+
+    Measurements use the worker's camera calibration and landmark filter,
+    like a live scan from the same camera.
+    """
+    started = time.perf_counter()
+    try:
+        # Clear tracking state left over from the previous recording
+        _pose.reset()
+        estimators = process_frames(iter_frames(path, timestamps=True), _pose,
+                                    calibrated_calculators(_camera_calibration), display=False,
+                                    camera_calibration=_camera_calibration,
+                                    landmark_filter=LandmarkFilter() if _use_filter else None)
+        return {"path": path, "results": summarize(estimators), "stats": measurement_stats(estimators),
+                "error": None, "seconds": time.perf_counter() - started}
+    except Exception as e:
+        return {"path": path, "results": None, "stats": None, "error": f"{type(e).__name__}: {e}",
+                "seconds": time.perf_counter() - started}
+
+
+def infer_images(images):
+    """(landmarks, w, h) for each BGR image, using this worker's Pose graph."""
+    results = []
+    for img in images:
+        h, w = img.shape[:2]
+        results.append((infer_landmarks(img, _pose, buffers=_buffers), w, h))
+    return results
+
+
+def infer_segmented(images):
+    """(landmarks, w, h, widths) for each BGR image; needs a worker built with enable_segmentation.
+
+    widths holds the body's pixel width at each torso level of the
+    segmentation mask (see landmarks.body_widths), or None without a pose.
+    Only these few numbers leave the worker, never the mask itself.
+    """
+    results = []
+    for img in images:
+        h, w = img.shape[:2]
+        result = _pose.process(model_input(img, _buffers))
+        landmarks = landmarks_to_array(result)
+        widths = None
+        if landmarks is not None and result.segmentation_mask is not None:
+            widths = body_widths(result.segmentation_mask, landmarks)
+        results.append((landmarks, w, h, widths))
+    return results
+
+
+def measure_many(paths, processes=None, chunksize=1, ordered=True, pose_options=None, camera_calibration=None,
+                 use_filter=True):
+    """Spread recorded sessions across a process pool, yielding one result per file.
+
+    ordered=False yields results as soon as any worker finishes, which keeps
+    all workers busy when recordings differ a lot in length. With a
+    CameraCalibration every file is measured in cm through it. Landmarks
+    are smoothed before they are measured unless use_filter is False. Once all
+    files are measured the workers exit on their own and close their Pose
+    graphs; if the caller stops early they are terminated.
+    """
+    processes = processes or os.cpu_count()
+    pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                initargs=(pose_options, camera_calibration, use_filter))
+    try:
+        mapper = pool.imap if ordered else pool.imap_unordered
+        yield from mapper(measure_file, paths, chunksize)
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.close()
+        pool.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure many recorded sessions in parallel.")
+    parser.add_argument('paths', nargs='+', help="video files or frame directories")
+    parser.add_argument('--processes', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunksize', type=int, default=1, help="jobs handed to a worker at a time")
+    parser.add_argument('--unordered', action='store_true', help="report results as soon as they finish")
+    parser.add_argument('--store', help="measurement store to record results in, one session per file")
+    parser.add_argument('--camera', help="camera the recordings were made with, to use its cached calibration")
+    parser.add_argument('--calibration', default=DEFAULT_CACHE, help="camera calibration cache used with --camera")
+    parser.add_argument('--no-filter', dest='use_filter', action='store_false',
+                        help="measure the raw landmarks instead of smoothing them first")
+    args = parser.parse_args()
+
+    camera_calibration = None
+    if args.camera is not None:
+        camera_calibration = CalibrationCache(args.calibration).get(args.camera)
+        if camera_calibration is None:
+            print(f"No calibration for camera {args.camera}; using the default scaling factors.")
+
+    # Only the parent process writes, in batches, so workers never contend for the store
+    started = time.perf_counter()
+    done = failed = 0
+    with MeasurementStore(args.store) if args.store else nullcontext() as store:
+        for job in measure_many(args.paths, args.processes, args.chunksize, ordered=not args.unordered,
+                                camera_calibration=camera_calibration, use_filter=args.use_filter):
+            done += 1
+            if job["error"]:
+                failed += 1
+                print(f"{job['path']}: failed ({job['error']})")
+            else:
+                print(f"{job['path']}: {job['results']}")
+                if store is not None:
+                    store.record_session(job["path"], job["stats"], calibration_record(camera_calibration))
+
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0.0
+    print(f"Measured {done - failed}/{done} files in {elapsed:.1f} s ({rate:.2f} files/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import cv2 as cv
+import numpy as np
+
+from batch_measure import measure_many
+from body_measurement import DisplayStage, default_calculators, measurement_stats, process_frames, save_measurements
+from landmark_filter import LandmarkFilter
+from landmark_log import LandmarkLog
+from landmarks import NUM_LANDMARKS
+from metrics import MetricsRegistry
+from model_pool import create_pose
+from offline import video_frames
+
+# Stick figure joints (normalized x, y) used for the synthetic fixture
+FIGURE = {
+    "head": (0.50, 0.15), "neck": (0.50, 0.25), "hip": (0.50, 0.55),
+    "l_hand": (0.35, 0.50), "r_hand": (0.65, 0.50), "l_foot": (0.43, 0.90), "r_foot": (0.57, 0.90),
+}
+BONES = [("neck", "hip"), ("neck", "l_hand"), ("neck", "r_hand"), ("hip", "l_foot"), ("hip", "r_foot")]
+
+# Landmarks used for the geometry and aggregation stages when pose finds nobody in the fixture
+SYNTHETIC_LANDMARKS = np.column_stack([
+    np.linspace(0.4, 0.6, NUM_LANDMARKS), np.linspace(0.1, 0.9, NUM_LANDMARKS),
+    np.zeros(NUM_LANDMARKS), np.ones(NUM_LANDMARKS)]).astype(np.float32)
+
+
+def make_synthetic_video(path, frames=150, size=(1280, 720), fps=30):
+    """Write a video of a slowly swaying stick figure, so benchmarks need no camera or recordings."""
+    w, h = size
+    writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for i in range(frames):
+        img = np.full((h, w, 3), 200, dtype=np.uint8)
+        sway = 0.02 * np.sin(2 * np.pi * i / fps)
+        points = {name: (int((x + sway * y) * w), int(y * h)) for name, (x, y) in FIGURE.items()}
+        for a, b in BONES:
+            cv.line(img, points[a], points[b], (60, 40, 30), max(2, w // 80))
+        cv.circle(img, points["head"], h // 14, (120, 150, 200), -1)
+        writer.write(img)
+    writer.release()
+    return path
+
+
+def percentiles(samples):
+    """Throughput and latency percentiles (ms) for one stage."""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000
+    total = values.sum() / 1000
+    return {
+        "count": len(samples),
+        "fps": len(samples) / total if total else None,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
+
+
+class StageSamples(MetricsRegistry):
+    """Metrics registry that keeps every stage timing, so the benchmark can report percentiles."""
+
+    def __init__(self):
+        super().__init__()
+        self.samples = {}
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - started)
+
+
+class OffscreenDisplay(DisplayStage):
+    """Draws the live overlays on every frame without opening a window, so it runs headless."""
+
+    def show(self, img, estimators=None, overlay=None):
+        self.draw(img, estimators, overlay)
+        return True
+
+
+class SyntheticFallback:
+    """Pose wrapper that answers with SYNTHETIC_LANDMARKS when the model finds nobody.
+
+    The stick figure fixture does not always look like a person to the
+    model, and without landmarks the geometry and aggregation stages would
+    not run at all.
+    """
+
+    def __init__(self, pose):
+        self.pose = pose
+        self.synthetic = 0
+        points = [SimpleNamespace(x=x, y=y, z=z, visibility=v) for x, y, z, v in SYNTHETIC_LANDMARKS.tolist()]
+        self.fallback = SimpleNamespace(pose_landmarks=SimpleNamespace(landmark=points))
+
+    def process(self, img):
+        result = self.pose.process(img)
+        if result.pose_landmarks:
+            return result
+        self.synthetic += 1
+        return self.fallback
+
+
+def resized_frames(frames, size=None, max_frames=None):
+    for count, (timestamp, img) in enumerate(frames):
+        if max_frames is not None and count >= max_frames:
+            break
+        yield timestamp, img if size is None else cv.resize(img, size, interpolation=cv.INTER_AREA)
+
+
+def benchmark_pipeline(source, size=None, model_complexity=1, display=False, max_frames=None, gate=False,
+                       keyframes=False, landmark_filter=True):
+    """Time every stage of the engine's per-frame path on one recording.
+
+    Runs body_measurement.process_frames itself, with the same optional
+    stages as a live scan (person gate, keyframe scheduler, landmark
+    filter, landmark log), and reads the stage timings from its metrics
+    timers. display=True renders the overlays the live engine draws
+    (without opening a window, so it also runs on headless machines).
+    """
+    from person_gate import PersonGate
+    from scheduler import KeyframeScheduler
+
+    metrics = StageSamples()
+    scratch = tempfile.mkdtemp(prefix='ivs_benchmark_')
+    log_path = os.path.join(scratch, 'session.lmk')
+    store_path = os.path.join(scratch, 'measurements.db')
+    started = time.perf_counter()
+
+    with create_pose(model_complexity=model_complexity) as pose, LandmarkLog(log_path) as log:
+        fallback = SyntheticFallback(pose)
+        frames = resized_frames(video_frames(source, timestamps=True), size, max_frames)
+        estimators = process_frames(frames, fallback,
+                                    default_calculators(), display=OffscreenDisplay(max_fps=0) if display else False,
+                                    gate=PersonGate() if gate else None,
+                                    scheduler=KeyframeScheduler() if keyframes else None, recorder=log,
+                                    metrics=metrics, landmark_filter=LandmarkFilter() if landmark_filter else None)
+        with metrics.timer("output"):
+            save_measurements(measurement_stats(estimators), path=store_path)
+
+    elapsed = time.perf_counter() - started
+    shutil.rmtree(scratch, ignore_errors=True)
+    # The capture timer also times the final, empty read that ends the loop
+    count = len(metrics.samples.get("capture", [])) - 1
+    return {
+        "frames": count,
+        "synthetic_landmark_frames": fallback.synthetic,
+        "end_to_end_fps": count / elapsed if elapsed else None,
+        "stages": {stage: percentiles(samples) for stage, samples in metrics.samples.items()},
+    }
+
+
+def benchmark_processes(source, processes, copies):
+    """Files per second when the batch runner measures `copies` of a recording."""
+    started = time.perf_counter()
+    jobs = list(measure_many([source] * copies, processes=processes, ordered=False))
+    elapsed = time.perf_counter() - started
+    failed = sum(1 for job in jobs if job["error"])
+    return {"files": copies, "failed": failed, "files_per_second": copies / elapsed if elapsed else None}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "opencv": cv.__version__,
+    }
+
+
+def compare(results, baseline, threshold):
+    """Runs whose p50 stage latency grew by more than `threshold` (a fraction) over the baseline."""
+    regressions = []
+    previous = {run["name"]: run for run in baseline["runs"]}
+    for run in results["runs"]:
+        before = previous.get(run["name"])
+        if before is None or "stages" not in run:
+            continue
+        for stage, stats in run["stages"].items():
+            old = before["stages"].get(stage, {}).get("p50_ms")
+            new = stats.get("p50_ms")
+            if old and new and new > old * (1 + threshold):
+                regressions.append(f"{run['name']} {stage}: p50 {old:.2f} ms -> {new:.2f} ms")
+    return regressions
+
+
+def parse_size(text):
+    w, _, h = text.lower().partition('x')
+    return int(w), int(h)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the measurement pipeline without a camera.")
+    parser.add_argument('--video', help="recorded fixture to use (default: a generated synthetic video)")
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[(1280, 720), (640, 360)],
+                        help="input resolutions, e.g. 1280x720 640x360")
+    parser.add_argument('--complexities', type=int, nargs='+', default=[0, 1],
+                        help="pose model_complexity values to benchmark")
+    parser.add_argument('--display', action='store_true', help="also benchmark with overlay rendering")
+    parser.add_argument('--gate', action='store_true', help="run the person gate, as live scans do")
+    parser.add_argument('--keyframes', action='store_true', help="run the keyframe scheduler, as live scans do")
+    parser.add_argument('--no-filter', action='store_true', help="measure unfiltered landmarks")
+    parser.add_argument('--processes', type=int, nargs='+', default=[1],
+                        help="process counts for the batch runner benchmark")
+    parser.add_argument('--frames', type=int, default=150, help="frames per run")
+    parser.add_argument('--output', default='benchmark_results.json', help="file the results are saved to")
+    parser.add_argument('--compare', metavar='BASELINE', help="results file to check for regressions against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="allowed p50 slowdown before flagging")
+    args = parser.parse_args()
+
+    source = args.video
+    if source is None:
+        source = make_synthetic_video(os.path.join(tempfile.gettempdir(), 'ivs_benchmark.avi'), args.frames)
+
+    runs = []
+    for size in args.sizes:
+        for complexity in args.complexities:
+            for display in ([False, True] if args.display else [False]):
+                name = f"{size[0]}x{size[1]}-complexity{complexity}-{'display' if display else 'headless'}"
+                name += "-gate" * args.gate + "-keyframes" * args.keyframes + "-unfiltered" * args.no_filter
+                print(f"Running {name}...")
+                run = benchmark_pipeline(source, size, complexity, display, args.frames, args.gate,
+                                         args.keyframes, not args.no_filter)
+                run.update(name=name, size=list(size), model_complexity=complexity, display=display)
+                runs.append(run)
+                pose_ms = run['stages'].get('pose', {}).get('p50_ms', 0.0)
+                print(f"  {run['end_to_end_fps']:.1f} fps end to end, pose p50 {pose_ms:.1f} ms")
+
+    for processes in args.processes:
+        name = f"batch-{processes}-processes"
+        print(f"Running {name}...")
+        run = benchmark_processes(source, processes, copies=max(2, 2 * processes))
+        run.update(name=name, processes=processes)
+        runs.append(run)
+        print(f"  {run['files_per_second']:.2f} files/s")
+
+    results = {"environment": environment(), "source": args.video or "synthetic", "runs": runs}
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results saved to '{args.output}'")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
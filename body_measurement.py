@@ -0,0 +1,559 @@
+import argparse
+import time
+from functools import partial
+
+import numpy as np
+from estimator import StreamingEstimator
+from landmark_filter import LandmarkFilter
+from landmarks import SEGMENT_INDEX, landmarks_to_array, segment_lengths, segment_visibility
+from measurement_store import DEFAULT_STORE, MeasurementStore, new_session_id
+from metrics import REGISTRY, serve_metrics
+from model_pool import DEFAULT_PROFILE, load_profile, pose_options, shared_pool
+
+# OpenCV and mediapipe are imported inside the functions that use them, so
+# importing the calculators (e.g. to recompute logs or serve results) stays fast
+
+# Scaling factors (cm per pixel) carried over from the individual scripts
+CALIBRATION = {
+    "height": 0.5,             # full_height.py
+    "shoulder": 30 / 100,      # shoulder.py
+    "arm": 30 / 100,           # arm_length.py
+    "waist": 80 / 100,         # waist.py
+    "lower_length": 0.5,       # lower_length.py
+}
+
+# Reference length used by chest.py to calibrate from the first frame
+CHEST_REFERENCE_LENGTH_CM = 30
+
+# Factors for segment lengths that a camera calibration already gives in cm
+METRIC_CALIBRATION = {name: 1.0 for name in [*CALIBRATION, "chest"]}
+
+# Number of recent frames averaged for each measurement (None averages every frame)
+HISTORY_WINDOWS = {
+    "height": 20,
+    "shoulder": None,
+    "arm": None,
+    "chest": None,
+    "waist": 17,
+    "lower_length": 17,
+}
+
+
+# Segment each measurement is computed from, also used to reject poorly visible frames
+MEASUREMENT_SEGMENTS = {
+    "height": SEGMENT_INDEX["height"],
+    "shoulder": SEGMENT_INDEX["shoulder"],
+    "arm": SEGMENT_INDEX["arm"],
+    "chest": SEGMENT_INDEX["shoulder"],
+    "waist": SEGMENT_INDEX["waist"],
+    "lower_length": SEGMENT_INDEX["lower_length"],
+}
+
+# Longest wait (s) for a camera frame before the camera is treated as disconnected
+FRAME_TIMEOUT = 5.0
+
+
+# Calculators take the segment lengths in pixels from segment_lengths(), either
+# for one frame or for a (frames, segments) stack, and return centimetres
+def measure_height(lengths, calibration=CALIBRATION):
+    return lengths[..., SEGMENT_INDEX["height"]] * calibration["height"]
+
+
+def measure_shoulder(lengths, calibration=CALIBRATION):
+    return lengths[..., SEGMENT_INDEX["shoulder"]] * calibration["shoulder"]
+
+
+def measure_arm(lengths, calibration=CALIBRATION):
+    return lengths[..., SEGMENT_INDEX["arm"]] * calibration["arm"]
+
+
+def measure_waist(lengths, calibration=CALIBRATION):
+    return lengths[..., SEGMENT_INDEX["waist"]] * calibration["waist"]
+
+
+def measure_lower_length(lengths, calibration=CALIBRATION):
+    return lengths[..., SEGMENT_INDEX["lower_length"]] * calibration["lower_length"]
+
+
+def measure_chest(lengths, calibration=METRIC_CALIBRATION):
+    # Chest width equals the shoulder width (see ChestCalculator), doubled as in chest.py
+    return lengths[..., SEGMENT_INDEX["shoulder"]] * calibration["chest"] * 2
+
+
+class ChestCalculator:
+    """Chest circumference as in chest.py, calibrated from the first frame's shoulder width."""
+
+    def __init__(self, reference_length_cm=CHEST_REFERENCE_LENGTH_CM):
+        self.reference_length_cm = reference_length_cm
+        self.scale_factor = None
+
+    def __call__(self, lengths):
+        # The 50 px chest offset from chest.py is applied to both points, so the
+        # chest width equals the shoulder width in pixels
+        chest_width_pixels = lengths[..., SEGMENT_INDEX["shoulder"]]
+        if self.scale_factor is None:
+            first = float(np.ravel(chest_width_pixels)[0])
+            self.scale_factor = self.reference_length_cm / first if first else 1
+        return chest_width_pixels * self.scale_factor * 2
+
+
+def default_calculators(calibration=None, chest_reference_cm=CHEST_REFERENCE_LENGTH_CM):
+    """Fresh set of the six measurement calculators, keyed by measurement name.
+
+    calibration overrides some or all of the CALIBRATION scaling factors.
+    """
+    calibration = {**CALIBRATION, **(calibration or {})}
+    return {
+        "height": partial(measure_height, calibration=calibration),
+        "shoulder": partial(measure_shoulder, calibration=calibration),
+        "arm": partial(measure_arm, calibration=calibration),
+        "chest": ChestCalculator(chest_reference_cm),
+        "waist": partial(measure_waist, calibration=calibration),
+        "lower_length": partial(measure_lower_length, calibration=calibration),
+    }
+
+
+def metric_calculators():
+    """The six calculators for segment lengths already in cm, e.g. from a CameraCalibration."""
+    calculators = default_calculators(METRIC_CALIBRATION)
+    calculators["chest"] = partial(measure_chest, calibration=METRIC_CALIBRATION)
+    return calculators
+
+
+def calibrated_calculators(camera_calibration=None):
+    """Calculators for a camera: metric ones with a CameraCalibration, the CALIBRATION factors without."""
+    return metric_calculators() if camera_calibration is not None else default_calculators()
+
+
+def calibration_record(camera_calibration=None):
+    """Scaling a session was measured with, as recorded in the measurement store."""
+    if camera_calibration is None:
+        return dict(CALIBRATION)
+    return {**METRIC_CALIBRATION, "homography": camera_calibration.homography.tolist()}
+
+
+def measurement_visibility(visibility, name):
+    """Visibility of the segment a measurement depends on (1.0 for custom measurements)."""
+    if name not in MEASUREMENT_SEGMENTS:
+        return 1.0
+    return visibility[..., MEASUREMENT_SEGMENTS[name]]
+
+
+def measure_landmarks(landmarks, w, h, calculators, camera_calibration=None):
+    """Every measurement for a (33, 4) frame or a (frames, 33, 4) stack of landmarks.
+
+    With a CameraCalibration the calculators get segment lengths in cm
+    (use metric_calculators()), otherwise in pixels. Returns
+    {name: (values, visibility)}; with a stack both are arrays with one
+    entry per frame.
+    """
+    if camera_calibration is not None:
+        lengths = camera_calibration.segment_lengths(landmarks)
+    else:
+        lengths = segment_lengths(landmarks, w, h)
+    visibility = segment_visibility(landmarks)
+    return {name: (calculator(lengths), measurement_visibility(visibility, name))
+            for name, calculator in calculators.items()}
+
+
+def create_estimators(calculators):
+    """One streaming estimator per calculator, using the scripts' smoothing windows."""
+    return {name: StreamingEstimator(window=HISTORY_WINDOWS.get(name)) for name in calculators}
+
+
+def summarize(estimators):
+    """Current value of every measurement, rounded to two decimals."""
+    return {name: round(estimator.value, 2) if estimator.count else None
+            for name, estimator in estimators.items()}
+
+
+def measurement_stats(estimators):
+    """{name: (value, frame_count, variance)} for storing a session's results."""
+    return {name: (estimator.value, estimator.count, estimator.variance)
+            for name, estimator in estimators.items()}
+
+
+def save_measurements(stats, session_id=None, calibration=None, path=DEFAULT_STORE):
+    """Record a session's measurements in the measurement store and return its session id."""
+    session_id = session_id or new_session_id()
+    calibration = {**CALIBRATION, **(calibration or {})}
+    with MeasurementStore(path) as store:
+        store.record_session(session_id, stats, calibration)
+    print(f"Measurements saved to '{path}' as session {session_id}")
+    return session_id
+
+
+class FrameBuffers:
+    """Reused scratch images for the per-frame conversions.
+
+    Each named buffer only grows, so after the first few frames converting
+    a frame or a person crop of any size allocates nothing. The FrameBuffers
+    owns every array get() returns: the next get() of the same name
+    overwrites it, so a caller that keeps one past the current frame (or
+    hands it to another thread) must copy it.
+    """
+
+    def __init__(self):
+        self.buffers = {}
+
+    def get(self, name, shape):
+        size = int(np.prod(shape))
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.size < size:
+            buffer = self.buffers[name] = np.empty(size, dtype=np.uint8)
+        return buffer[:size].reshape(shape)
+
+
+def model_input(img, buffers, input_width=None):
+    """Read-only RGB view of a BGR frame, converted into a reused buffer.
+
+    Marking the view read-only lets mediapipe use the pixels in place
+    instead of copying them. The view is overwritten by the next call.
+    """
+    import cv2 as cv
+    if input_width and img.shape[1] > input_width:
+        scale = input_width / img.shape[1]
+        size = (input_width, max(1, round(img.shape[0] * scale)))
+        img = cv.resize(img, size, dst=buffers.get("resized", (size[1], size[0], 3)), interpolation=cv.INTER_AREA)
+    img_rgb = cv.cvtColor(img, cv.COLOR_BGR2RGB, dst=buffers.get("rgb", img.shape))
+    view = img_rgb.view()
+    view.flags.writeable = False
+    return view
+
+
+class DisplayStage:
+    """Preview window drawn at most `max_fps` times a second.
+
+    Frames in between are neither drawn on nor shown, and the running
+    values are only summarized for frames that are drawn. An overlay
+    callable, if given, draws extra annotations on shown frames only.
+    show() returns False once 'q' is pressed.
+
+    Drawing happens on the stage's own copy of the frame, so the caller's
+    frame is never changed and may be kept or reused. That copy is reused
+    for the next frame, so an overlay must not keep a reference to the
+    image it is given.
+    """
+
+    def __init__(self, window="Body Measurement", max_fps=15):
+        self.window = window
+        self.interval = 1 / max_fps if max_fps else 0
+        self.last_shown = float('-inf')
+        self.buffers = FrameBuffers()
+
+    def show(self, img, estimators=None, overlay=None):
+        import cv2 as cv
+        now = time.perf_counter()
+        if now - self.last_shown < self.interval:
+            return True
+        self.last_shown = now
+        cv.imshow(self.window, self.draw(img, estimators, overlay))
+        # Exit on 'q' key press
+        return cv.waitKey(1) & 0xFF != ord('q')
+
+    def draw(self, img, estimators=None, overlay=None):
+        """Copy of img with the running values and the overlay drawn onto it."""
+        frame = self.buffers.get("display", img.shape)
+        np.copyto(frame, img)
+        if estimators is not None:
+            draw_results(frame, summarize(estimators))
+        if overlay is not None:
+            overlay(frame)
+        return frame
+
+
+def draw_results(img, results):
+    """Display the running values on the video feed."""
+    import cv2 as cv
+    for row, (name, value) in enumerate(results.items()):
+        cv.putText(img, f"{name}: {value} cm", (50, 50 + 35 * row),
+                   cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+
+def infer_landmarks(img, pose, gate=None, metrics=REGISTRY, input_width=None, buffers=None):
+    """(33, 4) landmarks of a BGR frame in frame coordinates, or None.
+
+    With a PersonGate, inference is skipped when nobody is in view and
+    otherwise runs on the tracked body region only. With input_width the
+    image given to the model is first scaled down to at most that width;
+    landmarks are normalized, so measurements still use full-frame pixels.
+    FrameBuffers passed in are reused for the model input.
+    """
+    roi = None
+    if gate is not None:
+        with metrics.timer("gating"):
+            img_input, roi = gate.prepare(img)
+        if img_input is None:
+            metrics.counter("gated_frames_total", "Frames skipped because nobody was in view").inc()
+            return None
+    else:
+        img_input = img
+
+    metrics.counter("pose_inferences_total", "Pose inference calls").inc()
+    with metrics.timer("convert"):
+        img_rgb = model_input(img_input, buffers or FrameBuffers(), input_width)
+    with metrics.timer("pose"):
+        landmarks = landmarks_to_array(pose.process(img_rgb))
+
+    if gate is not None:
+        h, w = img.shape[:2]
+        landmarks = gate.update(landmarks, roi, w, h)
+    return landmarks
+
+
+def with_frame_times(frames, fps=30.0):
+    """(timestamp, img) pairs from frames that may already be such pairs.
+
+    Sources that know when a frame was taken (camera_frames and
+    video_frames with timestamps=True) yield pairs; plain images are taken
+    to be 1 / fps seconds apart.
+    """
+    for index, frame in enumerate(frames):
+        yield frame if isinstance(frame, tuple) else (index / fps, frame)
+
+
+def process_frames(frames, pose, calculators, display=False, stop_when_converged=False, gate=None,
+                   scheduler=None, recorder=None, metrics=REGISTRY, started=None, input_width=None,
+                   display_fps=15, camera_calibration=None, guide=None, landmark_filter=None):
+    """Run pose inference on BGR frames and feed every calculator.
+
+    frames yields images, or (timestamp, image) pairs with the capture time
+    in seconds; the landmark filter and the recorder use those times (see
+    with_frame_times). With display=False no drawing or GUI calls are made,
+    so frames are processed as fast as decoding and inference allow; with display=True
+    the preview is drawn at most display_fps times a second, and any other
+    object with a DisplayStage's show() is used as the display stage. With
+    stop_when_converged the loop ends as soon as every estimate has
+    converged. A PersonGate restricts inference to frames and regions with
+    a person in them, and a KeyframeScheduler only runs inference on
+    keyframes and tracks landmarks in between. A LandmarkLog recorder keeps
+    every frame's landmarks and the camera calibration, so measurements can
+    be recomputed later. A
+    LandmarkFilter smooths the landmarks before they are measured; the
+    recorder keeps them unfiltered, with the filter's settings, so a
+    recomputation replays the same filter.
+    input_width caps the width of the image given to the model, and a
+    CameraCalibration turns segment lengths into cm. A VoiceGuide is told
+    the pipeline state after every frame and prompts the subject. Stage
+    timings, frame counts and the time to the first and to stable
+    measurements (from `started`, a perf_counter() value, or the call) go to
+    the metrics registry. Returns the streaming estimators keyed by
+    measurement name.
+    """
+    estimators = create_estimators(calculators)
+    buffers = FrameBuffers()
+    if display is True:
+        display_stage = DisplayStage(max_fps=display_fps)
+    else:
+        display_stage = display or None
+    frames_with_pose = metrics.counter("frames_with_landmarks_total", "Frames with a detected pose")
+    frames_without_pose = metrics.counter("frames_without_landmarks_total", "Frames without a detected pose")
+    time_to_stable = metrics.histogram("session_seconds_to_stable", "Session time until every measurement converged")
+    time_to_first = metrics.histogram("session_seconds_to_first_measurement",
+                                      "Session time until the first measurement was available")
+    started = time.perf_counter() if started is None else started
+    measured_once = stable = False
+    if recorder is not None:
+        recorder.describe(camera_calibration=camera_calibration, landmark_filter=landmark_filter)
+
+    def infer(img):
+        return infer_landmarks(img, pose, gate, metrics, input_width, buffers)
+
+    frames = with_frame_times(frames)
+    while True:
+        with metrics.timer("capture"):
+            timestamp, img = next(frames, (None, None))
+        if img is None:
+            break
+
+        with metrics.timer("inference"):
+            landmarks = scheduler.step(img, infer) if scheduler is not None else infer(img)
+        h, w, c = img.shape
+        if recorder is not None:
+            with metrics.timer("recording"):
+                recorder.append(timestamp, landmarks, w, h)
+        if landmark_filter is not None:
+            with metrics.timer("filtering"):
+                landmarks = landmark_filter(landmarks, timestamp)
+
+        if landmarks is not None:
+            frames_with_pose.inc()
+            with metrics.timer("geometry"):
+                measured = measure_landmarks(landmarks, w, h, calculators, camera_calibration)
+            with metrics.timer("aggregation"):
+                for name, (value, visibility) in measured.items():
+                    estimators[name].update(float(value), float(visibility))
+            if not measured_once and any(estimator.count for estimator in estimators.values()):
+                measured_once = True
+                time_to_first.observe(time.perf_counter() - started)
+        else:
+            frames_without_pose.inc()
+        if guide is not None:
+            guide.update(landmarks, estimators)
+
+        if display_stage is not None:
+            with metrics.timer("display"):
+                keep_going = display_stage.show(img, estimators if landmarks is not None else None)
+            if not keep_going:
+                break
+
+        if not stable and all(estimator.converged for estimator in estimators.values()):
+            stable = True
+            time_to_stable.observe(time.perf_counter() - started)
+            if stop_when_converged:
+                print("All measurements converged.")
+                break
+
+    return estimators
+
+
+def camera_frames(capture, metrics=REGISTRY, timestamps=False, timeout=FRAME_TIMEOUT):
+    """Yield frames from an opened FrameGrabber until it stops delivering them.
+
+    With timestamps=True every frame comes with its capture time, as a
+    (time.monotonic(), img) pair. A camera that delivers no frame within
+    `timeout` seconds, e.g. one unplugged mid-scan, ends the stream.
+    """
+    dropped = metrics.counter("dropped_frames_total", "Camera frames replaced before they were processed")
+    reported = 0
+    while True:
+        isTrue, img, captured_at = capture.read_latest(timeout)
+        if not isTrue:
+            print("Failed to capture image." if capture.stopped else f"No camera frame within {timeout} s.")
+            break
+        dropped.inc(capture.dropped - reported)
+        reported = capture.dropped
+        yield (captured_at, img) if timestamps else img
+
+
+def pipeline_options(profile=None, use_gate=True, use_keyframes=True, use_filter=True, camera_calibration=None):
+    """process_frames() keyword arguments for the kiosk's pipeline.
+
+    measure_body_in_video() and tune_profile.py both build their pipeline
+    here, so a profile is tuned on the stages it will run with: the
+    PersonGate, the KeyframeScheduler and the LandmarkFilter unless turned
+    off, the profile's input width and the camera calibration. Every call
+    returns fresh stages, as they keep per-session state.
+    """
+    from person_gate import PersonGate
+    from scheduler import KeyframeScheduler
+
+    profile = profile or {}
+    return {
+        "gate": PersonGate() if use_gate else None,
+        "scheduler": KeyframeScheduler() if use_keyframes else None,
+        "landmark_filter": LandmarkFilter() if use_filter else None,
+        "input_width": profile.get("input_width"),
+        "camera_calibration": camera_calibration,
+    }
+
+
+def measure_body_in_video(calculators=None, camera_index=0, use_gate=True, use_keyframes=True, use_filter=True,
+                          recorder=None, store_path=DEFAULT_STORE, pool=None, profile=None,
+                          calibration_cache=None, guide=None):
+    """Capture once and run every calculator on the same pose result per frame.
+
+    The Pose graph is borrowed from a PosePool (the process-wide one by
+    default), so consecutive sessions reuse a warm model. With a LandmarkLog
+    recorder every frame's landmarks are appended to it. The results are
+    saved to the measurement store at store_path, if set. Returns a dict with
+    one averaged value (cm) per measurement. An inference profile from
+    tune_profile.py sets the Pose options and the model input width. With a
+    CalibrationCache the camera's cached marker calibration is used, and
+    redone if the camera moved; without a usable one the scaling factors in
+    CALIBRATION apply. A VoiceGuide, if given, prompts the subject from the
+    pipeline state. Landmarks are smoothed with a LandmarkFilter before
+    they are measured unless use_filter is False.
+    """
+    import cv2 as cv
+    from capture import FrameGrabber
+
+    started = time.perf_counter()
+    profile = profile or {}
+    pool = pool or shared_pool(**pose_options(profile))
+    # Build the model while the camera opens
+    pool.warm(background=True)
+
+    capture = FrameGrabber(camera_index)
+    if not capture.isOpened():
+        print("Error: Camera not accessible!")
+        return None
+
+    camera_calibration = None
+    if calibration_cache is not None:
+        isTrue, img, _ = capture.read_latest(FRAME_TIMEOUT)
+        if isTrue:
+            camera_calibration = calibration_cache.for_frame(camera_index, img)
+        if camera_calibration is None:
+            print("No camera calibration; using the default scaling factors.")
+    if calculators is None:
+        calculators = calibrated_calculators(camera_calibration)
+
+    print("Starting camera feed... Hold still until the scan completes, or press 'q' to stop.")
+    if guide is not None:
+        guide.say("welcome")
+    try:
+        with pool.acquire() as pose:
+            estimators = process_frames(camera_frames(capture, timestamps=True), pose, calculators, display=True,
+                                        stop_when_converged=True, recorder=recorder, started=started, guide=guide,
+                                        **pipeline_options(profile, use_gate, use_keyframes, use_filter,
+                                                           camera_calibration))
+    finally:
+        capture.release()
+        cv.destroyAllWindows()
+
+    results = summarize(estimators)
+    for name, value in results.items():
+        print(f"{name}: {value} cm")
+    if store_path:
+        save_measurements(measurement_stats(estimators), calibration=calibration_record(camera_calibration),
+                          path=store_path)
+    return results
+
+
+def main():
+    from calibration import DEFAULT_CACHE, CalibrationCache
+
+    parser = argparse.ArgumentParser(description="Measure all six body measurements in one camera session.")
+    parser.add_argument('--camera', type=int, default=0, help="camera index")
+    parser.add_argument('--metrics-port', type=int, help="serve pipeline metrics at http://localhost:PORT/metrics")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE,
+                        help="inference profile written by tune_profile.py (used if the file exists)")
+    parser.add_argument('--calibration', default=DEFAULT_CACHE,
+                        help="camera calibration cache ('' to use the default scaling factors)")
+    parser.add_argument('--catalog', action='append', default=[],
+                        help="CSV size chart to recommend garment sizes from (repeatable)")
+    parser.add_argument('--tolerances', help="JSON file with per-brand size tolerances (cm)")
+    parser.add_argument('--voice', action='store_true', help="guide the subject with spoken prompts")
+    args = parser.parse_args()
+
+    catalog = None
+    if args.catalog:
+        from size_recommender import SizeCatalog, load_tolerances
+
+        # Index the size charts before the scan, so the recommendation is instant
+        catalog = SizeCatalog(load_tolerances(args.tolerances))
+        catalog.refresh(args.catalog)
+    guide = None
+    if args.voice:
+        from voice_guidance import VoiceGuide
+
+        guide = VoiceGuide()
+    if args.metrics_port:
+        serve_metrics(port=args.metrics_port)
+    calibration_cache = CalibrationCache(args.calibration) if args.calibration else None
+    try:
+        results = measure_body_in_video(camera_index=args.camera, profile=load_profile(args.profile),
+                                        calibration_cache=calibration_cache, guide=guide)
+    finally:
+        if guide is not None:
+            guide.close()
+    if catalog is not None and results:
+        for recommendation in catalog.recommend(results):
+            fit = "fits" if recommendation["fits"] else "closest"
+            print(f"Recommended: {recommendation['brand']} {recommendation['size']} "
+                  f"({recommendation['sku']}), {fit}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+from landmarks import point_segment_lengths
+
+DEFAULT_CACHE = 'calibration.json'
+
+# Printed reference: an ArUco marker from this dictionary, or a chessboard
+MARKER_DICTIONARY = "DICT_4X4_50"
+MARKER_SIZE_CM = 20.0
+CHESSBOARD_SQUARE_CM = 2.5
+
+# Downscaled background kept with each calibration to notice camera movement
+THUMBNAIL_SIZE = (160, 120)
+MAX_SHIFT_PX = 3.0
+
+
+def _thumbnail(img):
+    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    return cv.resize(gray, THUMBNAIL_SIZE, interpolation=cv.INTER_AREA).astype(np.float32)
+
+
+class CameraCalibration:
+    """Pixel to centimetre mapping of one camera, as a homography onto the marker plane.
+
+    The homography corrects for perspective, so lengths are right anywhere
+    in the plane the subject stands in, not only at the marker. Landmarks
+    are normalized, so the mapping holds for any resolution of the same
+    camera view. reference is the background thumbnail moved() compares
+    against; calibrations restored without one (e.g. from a landmark log)
+    can only measure.
+    """
+
+    def __init__(self, homography, frame_size, reference, created_at=None):
+        self.homography = np.asarray(homography, dtype=np.float64)
+        self.frame_size = tuple(frame_size)
+        self.reference = None if reference is None else np.asarray(reference, dtype=np.float32)
+        self.created_at = time.time() if created_at is None else created_at
+
+    def to_cm(self, points):
+        """Plane coordinates (cm) of pixel points with shape (..., 2)."""
+        homogeneous = points @ self.homography[:, :2].T + self.homography[:, 2]
+        return homogeneous[..., :2] / homogeneous[..., 2:]
+
+    def segment_lengths(self, landmarks):
+        """Length in cm of every segment in SEGMENTS, for a (33, 4) frame or a (frames, 33, 4) stack."""
+        return point_segment_lengths(self.to_cm(landmarks[..., :2].astype(np.float64) * self.frame_size))
+
+    def width_cm(self, center, width):
+        """Length in cm of a horizontal span `width` wide centred on `center`, both normalized."""
+        x, y = center
+        ends = self.to_cm(np.array([[x - width / 2, y], [x + width / 2, y]]) * self.frame_size)
+        return float(np.linalg.norm(ends[1] - ends[0]))
+
+    def moved(self, img, max_shift=MAX_SHIFT_PX):
+        """Whether the view has shifted by more than max_shift pixels since calibration."""
+        current = _thumbnail(img)
+        window = cv.createHanningWindow(THUMBNAIL_SIZE, cv.CV_32F)
+        (dx, dy), _ = cv.phaseCorrelate(self.reference, current, window)
+        w, h = self.frame_size
+        return np.hypot(dx * w / THUMBNAIL_SIZE[0], dy * h / THUMBNAIL_SIZE[1]) > max_shift
+
+    def to_json(self):
+        return {"homography": self.homography.tolist(), "frame_size": list(self.frame_size),
+                "reference": self.reference.round(1).tolist(), "created_at": self.created_at}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["homography"], data["frame_size"], data["reference"], data["created_at"])
+
+
+def detect_marker(img, marker_size_cm=MARKER_SIZE_CM):
+    """Image and plane (cm) corners of the first ArUco marker in view, or None."""
+    aruco = cv.aruco
+    dictionary = aruco.getPredefinedDictionary(getattr(aruco, MARKER_DICTIONARY))
+    if hasattr(aruco, "ArucoDetector"):
+        corners, ids, _ = aruco.ArucoDetector(dictionary).detectMarkers(img)
+    else:
+        corners, ids, _ = aruco.detectMarkers(img, dictionary)
+    if ids is None or len(corners) == 0:
+        return None
+    s = marker_size_cm
+    return corners[0].reshape(4, 2), np.array([[0, 0], [s, 0], [s, s], [0, s]], dtype=np.float32)
+
+
+def detect_chessboard(img, pattern=(9, 6), square_cm=CHESSBOARD_SQUARE_CM):
+    """Image and plane (cm) positions of a chessboard's inner corners, or None."""
+    gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+    found, corners = cv.findChessboardCorners(gray, pattern)
+    if not found:
+        return None
+    corners = cv.cornerSubPix(gray, corners, (5, 5), (-1, -1),
+                              (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.01))
+    grid = np.mgrid[0:pattern[0], 0:pattern[1]].T.reshape(-1, 2).astype(np.float32) * square_cm
+    return corners.reshape(-1, 2), grid
+
+
+def calibrate(img, marker_size_cm=MARKER_SIZE_CM, chessboard=None, square_cm=CHESSBOARD_SQUARE_CM):
+    """CameraCalibration from a frame showing the reference, or None if it is not in view.
+
+    Looks for an ArUco marker, or for a chessboard with `chessboard` inner
+    corners (columns, rows) if given.
+    """
+    found = detect_chessboard(img, chessboard, square_cm) if chessboard else detect_marker(img, marker_size_cm)
+    if found is None:
+        return None
+    image_points, plane_points = found
+    homography, _ = cv.findHomography(image_points, plane_points)
+    if homography is None:
+        return None
+    h, w = img.shape[:2]
+    return CameraCalibration(homography, (w, h), _thumbnail(img))
+
+
+class CalibrationCache:
+    """Calibrations keyed by camera, kept in memory and in a JSON file.
+
+    get() is a dict lookup. for_frame() only re-detects the reference when
+    a camera has no calibration yet or has moved since it was calibrated.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = path
+        self.calibrations = self._load()
+        self.removed = set()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        with open(self.path) as file:
+            return {camera: CameraCalibration.from_json(data) for camera, data in json.load(file).items()}
+
+    def get(self, camera):
+        return self.calibrations.get(str(camera))
+
+    def put(self, camera, calibration):
+        self.calibrations[str(camera)] = calibration
+        self.removed.discard(str(camera))
+        self.save()
+
+    def invalidate(self, camera):
+        if self.calibrations.pop(str(camera), None) is not None:
+            self.removed.add(str(camera))
+            self.save()
+
+    def save(self):
+        """Write this cache's cameras into the file, keeping cameras other processes saved.
+
+        Each writer uses its own temporary file and replaces the cache
+        atomically, so kiosks sharing it never read half a write. A write
+        that lands between the re-read and the replace can still be lost;
+        it is redone the next time that kiosk calibrates.
+        """
+        if not self.path:
+            return
+        saved = self._load()
+        for camera in self.removed:
+            saved.pop(camera, None)
+        saved.update(self.calibrations)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, prefix=f"{os.path.basename(self.path)}.",
+                                         suffix='.tmp', delete=False) as file:
+            json.dump({camera: calibration.to_json() for camera, calibration in saved.items()}, file)
+        try:
+            os.replace(file.name, self.path)
+        except OSError:
+            os.unlink(file.name)
+            raise
+
+    def for_frame(self, camera, img, **detect_options):
+        """Calibration that is valid for this frame of `camera`, or None.
+
+        The cached calibration is kept while the view has not shifted. A
+        camera that moved, or was never calibrated, is calibrated from this
+        frame if the reference is in view. Otherwise there is no valid
+        calibration for the frame, but the cached one stays until a new one
+        replaces it: the shift may be a person passing in front of the camera.
+        """
+        calibration = self.get(camera)
+        if calibration is not None and not calibration.moved(img):
+            return calibration
+        calibration = calibrate(img, **detect_options)
+        if calibration is not None:
+            self.put(camera, calibration)
+        return calibration
+
+
+def parse_pattern(text):
+    columns, _, rows = text.lower().partition('x')
+    return int(columns), int(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate a camera from a printed reference marker.")
+    parser.add_argument('--camera', type=int, default=0, help="camera index")
+    parser.add_argument('--marker-size', type=float, default=MARKER_SIZE_CM, help="ArUco marker side (cm)")
+    parser.add_argument('--chessboard', type=parse_pattern, help="use a chessboard with these inner corners, e.g. 9x6")
+    parser.add_argument('--square', type=float, default=CHESSBOARD_SQUARE_CM, help="chessboard square side (cm)")
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help="calibration cache file")
+    args = parser.parse_args()
+
+    capture = cv.VideoCapture(args.camera)
+    isTrue, img = capture.read()
+    capture.release()
+    if not isTrue:
+        print("Error: Camera not accessible!")
+        return
+
+    calibration = calibrate(img, args.marker_size, args.chessboard, args.square)
+    if calibration is None:
+        print("Reference marker not found; hang it upright where the subject will stand.")
+        return
+    CalibrationCache(args.cache).put(args.camera, calibration)
+    print(f"Camera {args.camera} calibrated and saved to '{args.cache}'")
+
+
+if __name__ == "__main__":
+    main()
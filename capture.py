@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import deque
+
+import cv2 as cv
+
+
+class FrameGrabber:
+    """Reads a camera on its own thread and keeps only the newest frames.
+
+    Drop-in replacement for cv.VideoCapture in the detect_* loops: read()
+    returns the most recent frame instead of the oldest buffered one, so slow
+    inference never makes the loop measure stale frames. Frames that are
+    replaced before anyone reads them are counted in `dropped`. With
+    realtime=True a video file is played at its own frame rate, so it can
+    stand in for a live camera. A source that fails to open starts out
+    stopped, so reads return at once instead of waiting for frames.
+    """
+
+    def __init__(self, source=0, buffer_size=2, realtime=False):
+        self.capture = cv.VideoCapture(source)
+        fps = self.capture.get(cv.CAP_PROP_FPS) if realtime else 0
+        self.interval = 1 / fps if fps and fps > 0 else 0
+        self.frames = deque(maxlen=buffer_size)
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.stopped = not self.capture.isOpened()
+        self.thread = None
+        if not self.stopped:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def _run(self):
+        next_frame = time.monotonic()
+        while not self.stopped:
+            if self.interval:
+                next_frame += self.interval
+                time.sleep(max(0.0, next_frame - time.monotonic()))
+            isTrue, img = self.capture.read()
+            captured_at = time.monotonic()
+            with self.condition:
+                if not isTrue:
+                    self.stopped = True
+                    self.condition.notify_all()
+                    break
+                if len(self.frames) == self.frames.maxlen:
+                    self.dropped += 1
+                self.frames.append((img, captured_at))
+                self.condition.notify_all()
+
+    def read_latest(self, timeout=None):
+        """Newest frame and its capture time (time.monotonic()), waiting for one if needed.
+
+        Returns (False, None, None) once the camera stops delivering frames or
+        the timeout expires.
+        """
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.frames or self.stopped, timeout):
+                return False, None, None
+            if not self.frames:
+                return False, None, None
+            img, captured_at = self.frames.pop()
+            self.dropped += len(self.frames)
+            self.frames.clear()
+        return True, img, captured_at
+
+    def read(self):
+        isTrue, img, _ = self.read_latest()
+        return isTrue, img
+
+    def release(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.capture.release()
@@ -0,0 +1,184 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# Scale that turns a median absolute deviation into a standard deviation for normal data
+MAD_TO_STD = 1.4826
+
+# Cap on the lag-1 autocorrelation used for the effective sample size
+MAX_AUTOCORRELATION = 0.95
+
+
+class StreamingEstimator:
+    """Running statistics for one measurement with O(1) updates and constant memory.
+
+    Keeps a Welford running mean and variance over every accepted frame, an
+    optional moving-average window with a running sum (the replacement for
+    the list.pop(0) windows in the scripts), and a small bounded buffer for
+    the median/MAD used to reject outliers. Frames whose landmarks are not
+    visible enough are rejected before they touch any statistic.
+
+    The median/MAD buffer holds every visible value, rejected or not, so it
+    follows the data rather than the estimate. A single outlier is dropped,
+    but `restart_after` outliers in a row mean the measurement itself has
+    moved (the subject stepped closer, the camera was bumped), and the
+    statistics restart from those values instead of freezing on the old
+    level.
+
+    Consecutive values are often correlated: smoothed landmarks, and
+    landmarks tracked between keyframes, carry part of the previous
+    frame's error. The confidence interval therefore uses the effective
+    sample size n (1 - r) / (1 + r), with r the running lag-1
+    autocorrelation, instead of treating every frame as an independent
+    sample.
+    """
+
+    def __init__(self, window=None, min_visibility=0.5, tolerance=0.5, z_score=1.96,
+                 min_samples=15, robust_window=64, outlier_threshold=3.5, restart_after=10):
+        self.window = deque(maxlen=window) if window else None
+        self.window_sum = 0.0
+        self.recent = deque(maxlen=robust_window)
+        self.min_visibility = min_visibility
+        self.tolerance = tolerance
+        self.z_score = z_score
+        self.min_samples = min_samples
+        self.outlier_threshold = outlier_threshold
+        self.restart_after = restart_after
+        self.outliers = []
+        self.restarts = 0
+        self.count = 0
+        self.rejected = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._reset_pairs()
+
+    def _reset_pairs(self):
+        # Running co-moment of consecutive accepted values, for the lag-1 autocorrelation
+        self.previous = None
+        self.pairs = 0
+        self._pair_means = [0.0, 0.0]
+        self._c1 = 0.0
+
+    def update(self, value, visibility=1.0):
+        """Add one frame's value. Returns False when the frame was rejected."""
+        value = float(value)
+        if visibility < self.min_visibility or not math.isfinite(value):
+            self.rejected += 1
+            return False
+        outlier = self.count >= self.min_samples and self.is_outlier(value)
+        self.recent.append(value)
+        if not outlier:
+            self.outliers.clear()
+            self._accept(value)
+            return True
+
+        self.rejected += 1
+        self.outliers.append(value)
+        if len(self.outliers) < self.restart_after:
+            return False
+        # The level has shifted: start over from the values at the new level
+        values, self.outliers = self.outliers, []
+        self.restart(values)
+        return True
+
+    def restart(self, values=()):
+        """Drop every statistic and start again from values."""
+        self.restarts += 1
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self._reset_pairs()
+        if self.window is not None:
+            self.window.clear()
+        self.window_sum = 0.0
+        self.recent.clear()
+        for value in values:
+            self.recent.append(value)
+            self._accept(value)
+
+    def _accept(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+        if self.previous is not None:
+            self.pairs += 1
+            means = self._pair_means
+            delta_previous = self.previous - means[0]
+            means[0] += delta_previous / self.pairs
+            means[1] += (value - means[1]) / self.pairs
+            self._c1 += delta_previous * (value - means[1])
+        self.previous = value
+
+        if self.window is not None:
+            if len(self.window) == self.window.maxlen:
+                self.window_sum -= self.window[0]
+            self.window.append(value)
+            self.window_sum += value
+
+    def is_outlier(self, value):
+        mad = self.mad
+        return mad > 0 and abs(value - self.median) > self.outlier_threshold * MAD_TO_STD * mad
+
+    @property
+    def value(self):
+        """Current estimate.
+
+        Until it converges, a windowed estimator reports its window average,
+        which follows the subject for the live display. Once converged every
+        estimator reports the running mean, the quantity whose confidence
+        interval `converged` tests; a 17-20 frame average of correlated
+        values is far noisier than that interval.
+        """
+        if self.count == 0:
+            return None
+        if self.window is not None and not self.converged:
+            return self.window_sum / len(self.window)
+        return self.mean
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def median(self):
+        return float(np.median(self.recent)) if self.recent else None
+
+    @property
+    def mad(self):
+        if not self.recent:
+            return 0.0
+        values = np.asarray(self.recent)
+        return float(np.median(np.abs(values - np.median(values))))
+
+    @property
+    def autocorrelation(self):
+        """Lag-1 autocorrelation of the accepted values, clipped to [0, MAX_AUTOCORRELATION]."""
+        if self.pairs < 2 or self._m2 <= 0:
+            return 0.0
+        r = (self._c1 / self.pairs) / (self._m2 / self.count)
+        return min(max(r, 0.0), MAX_AUTOCORRELATION)
+
+    @property
+    def effective_count(self):
+        """Number of independent samples the accepted values are worth."""
+        r = self.autocorrelation
+        return self.count * (1 - r) / (1 + r)
+
+    @property
+    def half_width(self):
+        """Half width of the confidence interval around the running mean."""
+        if self.count < 2:
+            return math.inf
+        return self.z_score * self.std / math.sqrt(max(self.effective_count, 1.0))
+
+    @property
+    def converged(self):
+        """True once the confidence interval is narrower than the tolerance."""
+        return self.count >= self.min_samples and self.half_width <= self.tolerance
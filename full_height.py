@@ -1,126 +1,126 @@
+import argparse
+
 import cv2 as cv
-import mediapipe as mp
-import math
-import pyttsx3
-import threading
-import numpy as np
-
-# Initialize Mediapipe Pose
-mpPose = mp.solutions.pose
-pose = mpPose.Pose()
-
-# Initialize Text-to-Speech
-engine = pyttsx3.init()
-
-def speak(text):
-    engine.say(text)
-    engine.runAndWait()
-
-def calculate_stable_height(measurements):
-    """Calculate the average height from the list of measurements for stability."""
-    return round(np.mean(measurements), 2)
-
-def save_measurement_to_file(height):
-    """Save the final height measurement to a file."""
-    with open('measurement.txt', 'a') as file:
-        file.write(f"Final Height: {height} cm\n")
-    print(f"Measurement saved to 'measurement.txt': {height} cm")
-
-def detect_height_in_video(stop_event):
-    capture = cv.VideoCapture(0)
+from body_measurement import FRAME_TIMEOUT, FrameBuffers, model_input
+from capture import FrameGrabber
+from estimator import StreamingEstimator
+from measurement_store import DEFAULT_STORE, MeasurementStore, new_session_id
+from landmark_filter import LandmarkFilter
+from model_pool import create_pose
+from landmarks import (LEFT_ANKLE, NOSE, SEGMENT_INDEX, landmarks_to_array,
+                       segment_lengths, segment_visibility, to_pixels)
+from voice_guidance import VoiceGuide
+
+def calculate_stable_height(estimator):
+    """Average height over the estimator's window for stability."""
+    return round(estimator.value, 2)
+
+def save_measurement(height, estimator, session_id):
+    """Save the final height measurement to the measurement store under session_id."""
+    if height is None:
+        print("No height measurement to save.")
+        return
+    with MeasurementStore() as store:
+        store.record(session_id, "height", height, estimator.count, estimator.variance, {"height": 0.5})
+    print(f"Measurement saved to '{DEFAULT_STORE}' as session {session_id}: {height} cm")
+
+def detect_height_in_video(guide=None, session_id=None):
+    capture = FrameGrabber(0)
     
     if not capture.isOpened():
         print("Error: Camera not accessible.")
         return
 
-    measurements = []  # List to store measurements for smoothing
+    # One session id per run, so the other scripts can add to the same subject's session
+    session_id = session_id or new_session_id()
+
+    # Build the pose model when a measurement starts rather than on import
+    pose = create_pose()
+    landmark_filter = LandmarkFilter()  # Smooths landmark jitter before measuring
+    buffers = FrameBuffers()  # Reused for the RGB conversion, so frames allocate nothing
+
+    estimator = StreamingEstimator(window=20)  # Average the last 20 measurements for smoothing
     stable_measurement = None  # Variable to store stable height measurement
     frame_count = 0  # To track how many frames we've processed
-
-    while True:
-        isTrue, img = capture.read()
-        if not isTrue:
-            print("Error: Unable to read from camera.")
-            break  # Break if the video capture fails
-
-        img_rgb = cv.cvtColor(img, cv.COLOR_BGR2RGB)
-        result = pose.process(img_rgb)
-
-        # Check if landmarks are detected
-        if result.pose_landmarks:
-            # Retrieve the landmarks for height measurement
-            landmarks = result.pose_landmarks.landmark
-            h, w, c = img.shape
-
-            # Use landmarks to measure height
-            nose = landmarks[mpPose.PoseLandmark.NOSE.value]
-            left_ankle = landmarks[mpPose.PoseLandmark.LEFT_ANKLE.value]
-
-            # Calculate pixel distances
-            nose_x, nose_y = int(nose.x * w), int(nose.y * h)
-            ankle_x, ankle_y = int(left_ankle.x * w), int(left_ankle.y * h)
-            distance_pixels = math.sqrt((nose_x - ankle_x) ** 2 + (nose_y - ankle_y) ** 2)
-
-            # Convert pixel distance to centimeters (adjust the scale as needed)
-            height_cm = distance_pixels * 0.5  # Adjust the scale as needed
-            measurements.append(height_cm)
-
-            # Average the measurements after capturing enough frames (20)
-            if len(measurements) > 20:
-                measurements.pop(0)
-            
-            stable_measurement = calculate_stable_height(measurements)
-
-            # Draw landmarks: Head and Toe in Black, Other Landmarks in Green
-            for i in range(len(landmarks)):
-                lm = landmarks[i]
-                x, y = int(lm.x * w), int(lm.y * h)
-
-                if i == mpPose.PoseLandmark.NOSE.value or i == mpPose.PoseLandmark.LEFT_ANKLE.value:
-                    # Draw head and toe in black
-                    cv.circle(img, (x, y), 5, (0, 0, 0), -1)
-                else:
-                    # Draw other landmarks in green
-                    cv.circle(img, (x, y), 5, (0, 255, 0), -1)
-
-            # Display stable height on the video feed
-            cv.putText(img, f"Height: {stable_measurement} cm", (50, 150), cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-
-        else:
-            print("No pose landmarks detected in this frame.")
-
-        # Show the video feed with landmarks
-        cv.imshow("Height Detection", img)
-
-        # Check if 'q' key is pressed to exit
-        if cv.waitKey(1) & 0xFF == ord('q'):
-            print(f"Stable Measurement: {stable_measurement} cm")
-            save_measurement_to_file(stable_measurement)  # Save the measurement to the file
-            print("Exiting...")
-            break
-
-    capture.release()
-    cv.destroyAllWindows()
-
-def main(mode='video'):
+    if guide is not None:
+        guide.say("welcome")
+
+    try:
+        while True:
+            # Newest frame, stamped with when it was captured, for the landmark filter
+            isTrue, img, captured_at = capture.read_latest(FRAME_TIMEOUT)
+            if not isTrue:
+                print("Error: Unable to read from camera.")
+                break  # Break if the video capture fails
+
+            img_rgb = model_input(img, buffers)
+            result = pose.process(img_rgb)
+
+            # Check if landmarks are detected
+            landmarks = landmark_filter(landmarks_to_array(result), captured_at)
+            if landmarks is not None:
+                # Retrieve the landmarks for height measurement
+                h, w, c = img.shape
+
+                # Calculate pixel distance from nose to ankle
+                distance_pixels = segment_lengths(landmarks, w, h)[SEGMENT_INDEX["height"]]
+
+                # Convert pixel distance to centimeters (adjust the scale as needed)
+                height_cm = distance_pixels * 0.5  # Adjust the scale as needed
+                if estimator.update(height_cm, segment_visibility(landmarks)[SEGMENT_INDEX["height"]]):
+                    stable_measurement = calculate_stable_height(estimator)
+
+                # Draw landmarks: Head and Toe in Black, Other Landmarks in Green
+                points = to_pixels(landmarks, w, h).astype(int).tolist()
+                for i, (x, y) in enumerate(points):
+                    if i == NOSE or i == LEFT_ANKLE:
+                        # Draw head and toe in black
+                        cv.circle(img, (x, y), 5, (0, 0, 0), -1)
+                    else:
+                        # Draw other landmarks in green
+                        cv.circle(img, (x, y), 5, (0, 255, 0), -1)
+
+                # Display stable height on the video feed
+                cv.putText(img, f"Height: {stable_measurement} cm", (50, 150), cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+            # Prompt the subject from what the pipeline sees, without waiting for the audio
+            if guide is not None:
+                guide.update(landmarks, {"height": estimator})
+
+            # Show the video feed with landmarks
+            cv.imshow("Height Detection", img)
+
+            # Check if 'q' key is pressed to exit
+            if cv.waitKey(1) & 0xFF == ord('q'):
+                print(f"Stable Measurement: {stable_measurement} cm")
+                save_measurement(stable_measurement, estimator, session_id)  # Save the measurement to the store
+                print("Exiting...")
+                break
+
+            # Stop by itself once the height is stable
+            if estimator.converged:
+                print(f"Stable Measurement: {stable_measurement} cm")
+                save_measurement(stable_measurement, estimator, session_id)
+                print("Height measurement converged.")
+                break
+    finally:
+        capture.release()
+        cv.destroyAllWindows()
+        pose.close()
+
+def main(mode='video', session_id=None):
     if mode == 'video':
-        # Create a stop event that can be set to signal the video thread to stop
-        stop_event = threading.Event()
-
-        # Start video capture in a separate thread to avoid blocking speech
-        video_thread = threading.Thread(target=detect_height_in_video, args=(stop_event,))
-        video_thread.start()
-
-        # Start speaking while the video is running
-        speak("Please come into the frame and stand at least 180 centimeters away from the camera.")
-        speak("I am about to measure.")
-        speak("Please stand still for a moment.")
-
-        # Wait for the video thread to finish when 'q' is pressed
-        video_thread.join()
+        # Prompts play on the guide's own thread, so capture runs on this one
+        guide = VoiceGuide()
+        try:
+            detect_height_in_video(guide, session_id)
+        finally:
+            guide.close()
 
     else:
         print("Invalid mode. Use 'video' for live capture.")
 
 if __name__ == "__main__":
-    main(mode='video')
+    parser = argparse.ArgumentParser(description="Measure full height from the camera.")
+    parser.add_argument('--session', help="session id to record under, to group it with the other measurements")
+    main(mode='video', session_id=parser.parse_args().session)
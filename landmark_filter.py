@@ -0,0 +1,117 @@
+import numpy as np
+
+from landmarks import NUM_LANDMARKS
+
+
+def _alpha(dt, cutoff):
+    """Smoothing factor of a first-order low-pass filter with this cutoff (Hz)."""
+    tau = 1.0 / (2 * np.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class LandmarkFilter:
+    """One-Euro filter over the x, y, z of every landmark of many streams at once.
+
+    Each stream (a camera, or a person in view) has a slot in (slots, 33, 3)
+    state arrays, so one update() call filters every landmark of every
+    stream with a handful of NumPy operations. The cutoff frequency rises
+    with each landmark's speed: a subject standing still is smoothed
+    heavily, while real movement passes with little lag. Coordinates are
+    normalized, so `beta` is per unit of frame size per second. Visibility
+    is passed through unfiltered. Without timestamps, frames are assumed
+    to be 1 / rate seconds apart.
+
+    The defaults suit pose jitter of 0.2-0.5% of the frame (about 0.5-1 cm
+    for a standing subject) at 30 fps: min_cutoff=1 Hz cuts that jitter to
+    about a third at rest, and beta=10 keeps the lag on a sideways step
+    (half a frame width per second) to about half a frame. With beta=0 the
+    lag is about five frames; beta=30 halves it again but passes about
+    half of the jitter.
+    """
+
+    def __init__(self, min_cutoff=1.0, beta=10.0, d_cutoff=1.0, rate=30.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.rate = rate
+        self.slots = {}
+        self.x = np.zeros((0, NUM_LANDMARKS, 3))
+        self.dx = np.zeros((0, NUM_LANDMARKS, 3))
+        self.t = np.zeros(0)
+        self.fresh = np.zeros(0, dtype=bool)
+
+    def to_json(self):
+        return {"min_cutoff": self.min_cutoff, "beta": self.beta, "d_cutoff": self.d_cutoff, "rate": self.rate}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["min_cutoff"], data["beta"], data["d_cutoff"], data["rate"])
+
+    def _slot(self, key):
+        slot = self.slots.get(key)
+        if slot is None:
+            free = sorted(set(range(len(self.t))) - set(self.slots.values()))
+            if not free:
+                # Grow the state arrays, doubling so many streams cost few reallocations
+                grow = max(1, len(self.t))
+                self.x = np.concatenate([self.x, np.zeros((grow, NUM_LANDMARKS, 3))])
+                self.dx = np.concatenate([self.dx, np.zeros((grow, NUM_LANDMARKS, 3))])
+                self.t = np.concatenate([self.t, np.zeros(grow)])
+                self.fresh = np.concatenate([self.fresh, np.ones(grow, dtype=bool)])
+                free = [len(self.t) - grow]
+            slot = self.slots[key] = free[0]
+            self.fresh[slot] = True
+        return slot
+
+    def update(self, keys, landmarks, timestamps=None):
+        """Filtered copy of a (streams, 33, 4) stack, one row per key.
+
+        A key seen for the first time, or again after release(), starts
+        from its landmarks as they are. timestamps, in seconds, is one value
+        for all streams or one per stream.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float64)
+        slots = np.array([self._slot(key) for key in keys], dtype=int)
+        fresh = self.fresh[slots]
+        if timestamps is None:
+            dt = np.full(len(slots), 1.0 / self.rate)
+            now = self.t[slots] + dt
+        else:
+            now = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), slots.shape)
+            dt = np.where(fresh, 1.0 / self.rate, np.maximum(now - self.t[slots], 1e-6))
+        dt = dt[:, None, None]
+
+        x = landmarks[..., :3]
+        previous = self.x[slots]
+        dx = (x - previous) / dt
+        a_d = _alpha(dt, self.d_cutoff)
+        dx_hat = a_d * dx + (1 - a_d) * self.dx[slots]
+        a = _alpha(dt, self.min_cutoff + self.beta * np.abs(dx_hat))
+        x_hat = a * x + (1 - a) * previous
+
+        x_hat[fresh] = x[fresh]
+        dx_hat[fresh] = 0.0
+        self.x[slots] = x_hat
+        self.dx[slots] = dx_hat
+        self.t[slots] = now
+        self.fresh[slots] = False
+
+        filtered = landmarks.copy()
+        filtered[..., :3] = x_hat
+        return filtered
+
+    def release(self, key):
+        """Forget a stream; its slot is reused by the next new key."""
+        self.slots.pop(key, None)
+
+    def retain(self, keys):
+        """Forget every stream but these."""
+        for key in set(self.slots) - set(keys):
+            self.release(key)
+
+    def __call__(self, landmarks, timestamp=None, key=0):
+        """Filter one stream's (33, 4) landmarks; None (nobody in view) resets the stream."""
+        if landmarks is None:
+            self.release(key)
+            return None
+        return self.update([key], landmarks[None], timestamp)[0]
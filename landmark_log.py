@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import struct
+
+import numpy as np
+
+from body_measurement import (calibrated_calculators, create_estimators, default_calculators, measure_landmarks,
+                              summarize)
+from landmark_filter import LandmarkFilter
+from landmarks import NUM_LANDMARKS
+
+# File layout: a 20-byte header (magic, frame width, frame height, metadata
+# length), the session metadata as JSON padded to a multiple of 8 bytes, then
+# fixed-size records, so a log can be appended to while capturing and
+# memory-mapped as one structured array afterwards
+MAGIC = b"IVSLMK02"
+HEADER = struct.Struct("<8sIII")
+# Logs written before the metadata block existed: magic, frame width, frame height
+MAGIC_V1 = b"IVSLMK01"
+HEADER_V1 = struct.Struct("<8sII")
+RECORD = np.dtype([("timestamp", "<f8"), ("landmarks", "<f4", (NUM_LANDMARKS, 4))])
+
+# Landmarks stored for frames without a detected pose
+MISSING = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+
+
+class LandmarkLog:
+    """Appends per-frame timestamps and (33, 4) landmark arrays to a log file.
+
+    Frames without a pose are stored as NaN so the log keeps the full
+    timeline. Timestamps are the frames' capture times in seconds (see
+    body_measurement.with_frame_times). describe() sets the session metadata
+    written to the header (the camera calibration and the landmark filter
+    settings), which recompute_measurements() applies again.
+    Appending to an existing log requires the same frame size and metadata.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.size = None
+        self.metadata = {}
+
+    def describe(self, camera_calibration=None, landmark_filter=None):
+        """Set the session metadata; call before the first frame is appended."""
+        self.metadata = {}
+        if camera_calibration is not None:
+            self.metadata["calibration"] = {"homography": camera_calibration.homography.tolist(),
+                                            "frame_size": list(camera_calibration.frame_size)}
+        if landmark_filter is not None:
+            self.metadata["landmark_filter"] = landmark_filter.to_json()
+
+    def append(self, timestamp, landmarks, w, h):
+        if self.file is None:
+            self._open(w, h)
+        elif self.size != (w, h):
+            raise ValueError(f"Frame size {w}x{h} does not match the log's {self.size[0]}x{self.size[1]}")
+        record = np.zeros((), dtype=RECORD)
+        record["timestamp"] = timestamp
+        record["landmarks"] = MISSING if landmarks is None else landmarks
+        self.file.write(record.tobytes())
+
+    def _open(self, w, h):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER_V1.size:
+            existing_w, existing_h, metadata, _ = read_header(self.path)
+            self.size = (existing_w, existing_h)
+            if self.size != (w, h):
+                raise ValueError(f"Frame size {w}x{h} does not match the log's {self.size[0]}x{self.size[1]}")
+            if metadata != json.loads(json.dumps(self.metadata)):
+                raise ValueError(f"Session metadata does not match the log's: {metadata}")
+            self.file = open(self.path, 'ab')
+        else:
+            self.size = (w, h)
+            metadata = json.dumps(self.metadata).encode()
+            metadata += b" " * (-len(metadata) % 8)
+            self.file = open(self.path, 'wb')
+            self.file.write(HEADER.pack(MAGIC, w, h, len(metadata)) + metadata)
+
+    def flush(self):
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_header(path):
+    """(width, height, metadata, offset of the first record) of a landmark log."""
+    with open(path, 'rb') as file:
+        magic = file.read(len(MAGIC))
+        file.seek(0)
+        if magic == MAGIC_V1:
+            _, w, h = HEADER_V1.unpack(file.read(HEADER_V1.size))
+            return w, h, {}, HEADER_V1.size
+        if magic != MAGIC:
+            raise ValueError(f"Not a landmark log: {path}")
+        _, w, h, length = HEADER.unpack(file.read(HEADER.size))
+        metadata = json.loads(file.read(length))
+    return w, h, metadata, HEADER.size + length
+
+
+def read_landmark_log(path):
+    """Memory-map a landmark log.
+
+    Returns (records, w, h, metadata) where records["timestamp"] has shape
+    (frames,) and records["landmarks"] has shape (frames, 33, 4), and
+    metadata is what LandmarkLog.describe() recorded. A partly written last
+    record, e.g. from a capture that was killed, is ignored.
+    """
+    w, h, metadata, offset = read_header(path)
+    frames = (os.path.getsize(path) - offset) // RECORD.itemsize
+    if frames == 0:
+        return np.zeros(0, dtype=RECORD), w, h, metadata
+    records = np.memmap(path, dtype=RECORD, mode='r', offset=offset, shape=(frames,))
+    return records, w, h, metadata
+
+
+def recorded_calibration(metadata):
+    """CameraCalibration stored in a log's metadata, or None for an uncalibrated session."""
+    from calibration import CameraCalibration
+
+    recorded = metadata.get("calibration")
+    if recorded is None:
+        return None
+    return CameraCalibration(recorded["homography"], recorded["frame_size"], reference=None)
+
+
+def recompute_measurements(path, calibration=None, calculators=None, landmark_filter=None):
+    """Regenerate every measurement from a landmark log without running inference.
+
+    The camera calibration and the landmark filter recorded with the
+    session are applied again, at the recorded frame times, so a session
+    recomputes to the same values. calibration overrides the default
+    scaling factors instead (ignoring a recorded camera calibration);
+    calculators replaces the measurement formulas entirely, and must be
+    metric ones for a calibrated log. A LandmarkFilter replaces the
+    recorded one, e.g. to try other settings. Frames are replayed through
+    the same streaming estimators as a live session.
+    """
+    records, w, h, metadata = read_landmark_log(path)
+    camera_calibration = None if calibration else recorded_calibration(metadata)
+    if calculators is None:
+        calculators = default_calculators(calibration) if calibration else calibrated_calculators(camera_calibration)
+    if landmark_filter is None and "landmark_filter" in metadata:
+        landmark_filter = LandmarkFilter.from_json(metadata["landmark_filter"])
+
+    landmarks = np.asarray(records["landmarks"])
+    found = ~np.isnan(landmarks).any(axis=(1, 2))
+    if landmark_filter is not None:
+        # Frames without a pose reset the filter, as they did live
+        filtered = [landmark_filter(frame if seen else None, timestamp)
+                    for frame, seen, timestamp in zip(landmarks, found, records["timestamp"].tolist())]
+        landmarks = np.array([frame for frame in filtered if frame is not None]).reshape(-1, NUM_LANDMARKS, 4)
+    else:
+        landmarks = landmarks[found]
+
+    estimators = create_estimators(calculators)
+    if len(landmarks):
+        for name, (values, visibility) in measure_landmarks(landmarks, w, h, calculators,
+                                                            camera_calibration).items():
+            for value, frame_visibility in zip(values.tolist(), np.broadcast_to(visibility, values.shape).tolist()):
+                estimators[name].update(value, frame_visibility)
+    return summarize(estimators)
+
+
+def parse_scale(text):
+    name, _, value = text.partition('=')
+    if not value:
+        raise argparse.ArgumentTypeError(f"Expected NAME=CM_PER_PIXEL, got {text!r}")
+    return name, float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute measurements from recorded landmark logs.")
+    parser.add_argument('logs', nargs='+', help="landmark log files")
+    parser.add_argument('--scale', type=parse_scale, action='append', default=[],
+                        help="override a scaling factor, e.g. --scale height=0.52 (ignores a recorded "
+                             "camera calibration)")
+    args = parser.parse_args()
+
+    calibration = dict(args.scale)
+    for path in args.logs:
+        print(f"{path}: {recompute_measurements(path, calibration)}")
+
+
+if __name__ == "__main__":
+    main()
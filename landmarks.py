@@ -0,0 +1,121 @@
+import numpy as np
+
+# Landmark indices, matching mp.solutions.pose.PoseLandmark
+NOSE = 0
+LEFT_SHOULDER = 11
+RIGHT_SHOULDER = 12
+LEFT_WRIST = 15
+LEFT_HIP = 23
+RIGHT_HIP = 24
+LEFT_ANKLE = 27
+RIGHT_ANKLE = 28
+NUM_LANDMARKS = 33
+
+# Landmark pairs whose distance the measurements are built from
+SEGMENTS = {
+    "height": (NOSE, LEFT_ANKLE),
+    "shoulder": (LEFT_SHOULDER, RIGHT_SHOULDER),
+    "arm": (LEFT_SHOULDER, LEFT_WRIST),
+    "waist": (LEFT_HIP, RIGHT_HIP),
+    "lower_length": (LEFT_HIP, LEFT_ANKLE),
+}
+SEGMENT_INDEX = {name: i for i, name in enumerate(SEGMENTS)}
+
+# Torso levels measured from a segmentation mask, as a fraction of the way
+# from the shoulder line down to the hip line
+BODY_LEVELS = {"chest": 0.25, "waist": 0.8}
+_FIRST = np.array([pair[0] for pair in SEGMENTS.values()])
+_SECOND = np.array([pair[1] for pair in SEGMENTS.values()])
+
+
+def landmarks_to_array(result):
+    """(33, 4) float32 array of x, y, z, visibility, or None without a pose."""
+    if not result.pose_landmarks:
+        return None
+    return np.array([(lm.x, lm.y, lm.z, lm.visibility) for lm in result.pose_landmarks.landmark],
+                    dtype=np.float32)
+
+
+def to_pixels(landmarks, w, h):
+    """Pixel x, y of every landmark; works on (33, 4) and (frames, 33, 4) arrays."""
+    return landmarks[..., :2] * np.array([w, h], dtype=np.float32)
+
+
+def segment_lengths(landmarks, w, h):
+    """Pixel length of every segment in SEGMENTS in one vectorized call.
+
+    Accepts a (33, 4) frame or a (frames, 33, 4) stack and returns an array
+    of shape (len(SEGMENTS),) or (frames, len(SEGMENTS)).
+    """
+    return point_segment_lengths(to_pixels(landmarks, w, h))
+
+
+def point_segment_lengths(points):
+    """Length of every segment from (..., 33, 2) landmark points, in the points' unit."""
+    diff = points[..., _FIRST, :] - points[..., _SECOND, :]
+    return np.hypot(diff[..., 0], diff[..., 1])
+
+
+def segment_visibility(landmarks):
+    """Lowest visibility of the two landmarks of every segment."""
+    return np.minimum(landmarks[..., _FIRST, 3], landmarks[..., _SECOND, 3])
+
+
+def torso_point(landmarks, fraction):
+    """Normalized x, y on the torso centre line, `fraction` of the way from the shoulder line to the hip line."""
+    shoulders = landmarks[[LEFT_SHOULDER, RIGHT_SHOULDER], :2].mean(axis=0)
+    hips = landmarks[[LEFT_HIP, RIGHT_HIP], :2].mean(axis=0)
+    return shoulders + fraction * (hips - shoulders)
+
+
+def _run_width(row, x):
+    """Length of the run of foreground pixels in a mask row that contains column x."""
+    if not row[x]:
+        return 0
+    left = np.flatnonzero(~row[:x])
+    right = np.flatnonzero(~row[x:])
+    x0 = left[-1] + 1 if len(left) else 0
+    x1 = x + right[0] if len(right) else len(row)
+    return x1 - x0
+
+
+def body_widths(mask, landmarks, levels=BODY_LEVELS, band=5, threshold=0.5):
+    """Pixel width of the body in a segmentation mask at each torso level.
+
+    The width is the foreground run through the torso centre line, so arms
+    held away from the body are not counted. Each level takes the median
+    over `band` rows. Returns {level: pixels}, with 0 where the mask is
+    empty at the centre.
+    """
+    h, w = mask.shape[:2]
+    foreground = mask > threshold
+    widths = {}
+    for name, fraction in levels.items():
+        x, y = torso_point(landmarks, fraction) * (w, h)
+        x = int(np.clip(x, 0, w - 1))
+        rows = np.clip(np.arange(int(y) - band // 2, int(y) + band // 2 + 1), 0, h - 1)
+        widths[name] = float(np.median([_run_width(foreground[row], x) for row in rows]))
+    return widths
+
+
+def crop_to_frame(landmarks, roi, w, h):
+    """Map landmarks detected in the crop roi = (x0, y0, x1, y1) back to normalized frame coordinates."""
+    x0, y0, x1, y1 = roi
+    crop_w, crop_h = x1 - x0, y1 - y0
+    mapped = landmarks.copy()
+    mapped[..., 0] = (x0 + landmarks[..., 0] * crop_w) / w
+    mapped[..., 1] = (y0 + landmarks[..., 1] * crop_h) / h
+    # MediaPipe scales z like x
+    mapped[..., 2] = landmarks[..., 2] * crop_w / w
+    return mapped
+
+
+def bounding_box(landmarks, w, h, min_visibility=0.3):
+    """Pixel box (x0, y0, x1, y1) around the visible landmarks, or None if none are visible."""
+    visible = landmarks[landmarks[:, 3] >= min_visibility]
+    if len(visible) == 0:
+        return None
+    points = to_pixels(visible, w, h)
+    x0, y0 = points.min(axis=0)
+    x1, y1 = points.max(axis=0)
+    return float(x0), float(y0), float(x1), float(y1)
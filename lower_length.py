@@ -1,87 +1,104 @@
+import argparse
+
 import cv2 as cv
-import mediapipe as mp
-import math
-import numpy as np
-
-# Initialize Mediapipe Pose
-mpPose = mp.solutions.pose
-pose = mpPose.Pose()
-
-def calculate_stable_length(measurements):
-    """Calculate the average length from the list of measurements for stability."""
-    return round(np.mean(measurements), 2)
-
-def save_measurement_to_file(length):
-    """Save the final length measurement to a file."""
-    with open('measurement.txt', 'a') as file:
-        file.write(f"Final Lower Body Length: {length} cm\n")
-    print(f"Measurement saved to 'measurement.txt': {length} cm")
-
-def detect_lower_body_length_in_video():
-    capture = cv.VideoCapture(0)  # Open the camera
+from body_measurement import FRAME_TIMEOUT, FrameBuffers, model_input
+from capture import FrameGrabber
+from estimator import StreamingEstimator
+from measurement_store import DEFAULT_STORE, MeasurementStore, new_session_id
+from landmark_filter import LandmarkFilter
+from model_pool import create_pose
+from landmarks import (LEFT_ANKLE, LEFT_HIP, SEGMENT_INDEX, landmarks_to_array,
+                       segment_lengths, segment_visibility, to_pixels)
+
+def calculate_stable_length(estimator):
+    """Average length over the estimator's window for stability."""
+    return round(estimator.value, 2)
+
+def save_measurement(length, estimator, session_id):
+    """Save the final length measurement to the measurement store under session_id."""
+    with MeasurementStore() as store:
+        store.record(session_id, "lower_length", length, estimator.count, estimator.variance,
+                     {"lower_length": 0.5})
+    print(f"Measurement saved to '{DEFAULT_STORE}' as session {session_id}: {length} cm")
+
+def detect_lower_body_length_in_video(session_id=None):
+    capture = FrameGrabber(0)  # Open the camera
+    if not capture.isOpened():
+        print("Error: Camera not accessible!")
+        return
+
+    # One session id per run, so the other scripts can add to the same subject's session
+    session_id = session_id or new_session_id()
+
+    # Build the pose model when a measurement starts rather than on import
+    pose = create_pose()
+    landmark_filter = LandmarkFilter()  # Smooths landmark jitter before measuring
+    buffers = FrameBuffers()  # Reused for the RGB conversion, so frames allocate nothing
     
-    measurements = []  # List to store measurements for smoothing
+    estimator = StreamingEstimator(window=17)  # Keep the last 17 measurements for stability
     stable_measurement = None  # Variable to store stable length measurement
 
-    while True:
-        isTrue, img = capture.read()
-        if not isTrue:
-            break
+    try:
+        while True:
+            # Newest frame, stamped with when it was captured, for the landmark filter
+            isTrue, img, captured_at = capture.read_latest(FRAME_TIMEOUT)
+            if not isTrue:
+                break
         
-        img_rgb = cv.cvtColor(img, cv.COLOR_BGR2RGB)
-        result = pose.process(img_rgb)
-
-        if result.pose_landmarks:
-            # Retrieve the landmarks for length measurement
-            landmarks = result.pose_landmarks.landmark
-            h, w, c = img.shape
-
-            # Use landmarks to measure lower body length
-            left_hip = landmarks[mpPose.PoseLandmark.LEFT_HIP.value]
-            left_ankle = landmarks[mpPose.PoseLandmark.LEFT_ANKLE.value]
-
-            # Calculate pixel distances
-            hip_x, hip_y = int(left_hip.x * w), int(left_hip.y * h)
-            ankle_x, ankle_y = int(left_ankle.x * w), int(left_ankle.y * h)
-            distance_pixels = math.sqrt((hip_x - ankle_x) ** 2 + (hip_y - ankle_y) ** 2)
-
-            # Convert pixel distance to centimeters (adjust the scale as needed)
-            length_cm = distance_pixels * 0.5  # Adjust the scale as needed
-            measurements.append(length_cm)
-
-            # Keep the last 17 measurements for stability
-            if len(measurements) > 17:
-                measurements.pop(0)
-
-            stable_measurement = calculate_stable_length(measurements)
-
-            # Draw black points at hip and ankle
-            cv.circle(img, (hip_x, hip_y), 10, (0, 0, 0), -1)  # Hip point
-            cv.circle(img, (ankle_x, ankle_y), 10, (0, 0, 0), -1)  # Ankle point
-
-            # Display stable length on the video feed
-            cv.putText(img, f"Lower Body Length: {stable_measurement} cm", (50, 150), 
-                       cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-
-        # Show the video feed with landmarks
-        cv.imshow("Lower Body Length Detection", img)
-
-        # Check for 'q' key press to exit
-        if cv.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    # Save the final stable measurement when exiting
-    if measurements:
-        final_measurement = calculate_stable_length(measurements)
-        save_measurement_to_file(final_measurement)
-
-    capture.release()
-    cv.destroyAllWindows()
-
-def main(mode='video'):
+            img_rgb = model_input(img, buffers)
+            result = pose.process(img_rgb)
+
+            landmarks = landmark_filter(landmarks_to_array(result), captured_at)
+            if landmarks is not None:
+                # Retrieve the landmarks for length measurement
+                h, w, c = img.shape
+                points = to_pixels(landmarks, w, h).astype(int).tolist()
+                hip_x, hip_y = points[LEFT_HIP]
+                ankle_x, ankle_y = points[LEFT_ANKLE]
+
+                # Calculate pixel distance from hip to ankle
+                distance_pixels = segment_lengths(landmarks, w, h)[SEGMENT_INDEX["lower_length"]]
+
+                # Convert pixel distance to centimeters (adjust the scale as needed)
+                length_cm = distance_pixels * 0.5  # Adjust the scale as needed
+                if estimator.update(length_cm, segment_visibility(landmarks)[SEGMENT_INDEX["lower_length"]]):
+                    stable_measurement = calculate_stable_length(estimator)
+
+                # Draw black points at hip and ankle
+                cv.circle(img, (hip_x, hip_y), 10, (0, 0, 0), -1)  # Hip point
+                cv.circle(img, (ankle_x, ankle_y), 10, (0, 0, 0), -1)  # Ankle point
+
+                # Display stable length on the video feed
+                cv.putText(img, f"Lower Body Length: {stable_measurement} cm", (50, 150), 
+                           cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+            # Show the video feed with landmarks
+            cv.imshow("Lower Body Length Detection", img)
+
+            # Check for 'q' key press to exit
+            if cv.waitKey(1) & 0xFF == ord('q'):
+                break
+
+            # Stop by itself once the measurement is stable
+            if estimator.converged:
+                print("Lower body length measurement converged.")
+                break
+
+        # Save the final stable measurement when exiting
+        if estimator.count:
+            final_measurement = calculate_stable_length(estimator)
+            save_measurement(final_measurement, estimator, session_id)
+    finally:
+        capture.release()
+        cv.destroyAllWindows()
+        pose.close()
+
+def main(mode='video', session_id=None):
     if mode == 'video':
         # Run the lower body length detection from video
-        detect_lower_body_length_in_video()
+        detect_lower_body_length_in_video(session_id)
 
 if __name__ == "__main__":
-    main(mode='video')  # Run the program to detect lower body length in real-time and save to a file
+    parser = argparse.ArgumentParser(description="Measure the lower body length from the camera.")
+    parser.add_argument('--session', help="session id to record under, to group it with the other measurements")
+    main(mode='video', session_id=parser.parse_args().session)  # Run the program to detect lower body length in real-time and save to a file
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+from batch_measure import infer_images, init_worker
+from body_measurement import (create_estimators, default_calculators, measure_landmarks,
+                              measurement_stats, save_measurements, summarize)
+from measurement_store import DEFAULT_STORE, new_session_id
+from offline import video_frames
+
+MAX_BODY_BYTES = 200 * 1024 * 1024
+STATUS_TEXT = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class Session:
+    """Measurement state of one client: the engine's calculators and streaming estimators."""
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.calculators = default_calculators()
+        self.estimators = create_estimators(self.calculators)
+        self.frames = 0
+        self.lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+    def add(self, landmarks, w, h):
+        self.frames += 1
+        self.last_seen = time.monotonic()
+        if landmarks is None:
+            return
+        for name, (value, visibility) in measure_landmarks(landmarks, w, h, self.calculators).items():
+            self.estimators[name].update(float(value), float(visibility))
+
+    def report(self, done=False):
+        return {
+            "session_id": self.session_id,
+            "frames": self.frames,
+            "measurements": summarize(self.estimators),
+            "converged": all(estimator.converged for estimator in self.estimators.values()),
+            "done": done,
+        }
+
+
+class MicroBatcher:
+    """Collects frames from all sessions into small batches for the pose worker pool.
+
+    A batch is sent as soon as it holds `max_batch` frames or the oldest
+    frame has waited `max_wait` seconds. At most one batch per worker is in
+    flight; everything else waits in a bounded queue, and is_overloaded()
+    tells the HTTP layer when to turn new uploads away.
+    """
+
+    def __init__(self, pool, workers, max_batch=8, max_wait=0.01, queue_size=256):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.in_flight = asyncio.Semaphore(workers)
+        self.task = None
+        self.dispatches = set()
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def is_overloaded(self):
+        return self.queue.qsize() >= self.queue.maxsize * 3 // 4
+
+    async def infer(self, img):
+        """Landmarks for one BGR frame, waiting for room in the queue if needed."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((img, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.in_flight.acquire()
+            dispatch = asyncio.create_task(self._dispatch(batch))
+            self.dispatches.add(dispatch)
+            dispatch.add_done_callback(self.dispatches.discard)
+
+    async def _dispatch(self, batch):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.pool, infer_images, [img for img, _ in batch])
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self.in_flight.release()
+
+
+class MeasurementService:
+    """HTTP front end: sessions, photo and clip uploads, streamed partial results.
+
+    POST   /sessions                create a session
+    POST   /sessions/<id>/frames    one photo (JPEG/PNG body); returns the updated result
+    POST   /sessions/<id>/clip      a short video; streams one JSON line per micro-batch
+    GET    /sessions/<id>           current result
+    DELETE /sessions/<id>           final result, recorded in the measurement store
+    """
+
+    def __init__(self, workers=None, store_path=DEFAULT_STORE, max_batch=8, max_wait=0.01,
+                 queue_size=256, session_timeout=600):
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                        initargs=({"static_image_mode": True},))
+        self.batcher = MicroBatcher(self.pool, self.workers, max_batch, max_wait, queue_size)
+        self.store_path = store_path
+        self.session_timeout = session_timeout
+        self.sessions = {}
+
+    async def start(self):
+        """Start the pose workers and the batcher.
+
+        The workers are forked here, before any connection is accepted, so
+        no worker inherits a client socket and keeps it open after the
+        response. It also builds their Pose graphs before the first upload.
+        """
+        await asyncio.get_running_loop().run_in_executor(self.pool, infer_images, [])
+        self.batcher.start()
+
+    async def serve(self, host='0.0.0.0', port=8080):
+        await self.start()
+        self.expiry_task = asyncio.create_task(self._expire_sessions())
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Measurement service listening on {host}:{port} with {self.workers} pose workers")
+        async with server:
+            await server.serve_forever()
+
+    async def _expire_sessions(self):
+        while True:
+            await asyncio.sleep(60)
+            await self.expire_idle()
+
+    async def expire_idle(self):
+        """End sessions idle for longer than session_timeout, keeping what they measured.
+
+        A client that disconnects mid-scan never sends DELETE, so the
+        partial results are saved as they are, marked incomplete.
+        """
+        cutoff = time.monotonic() - self.session_timeout
+        for session_id in [sid for sid, s in self.sessions.items() if s.last_seen < cutoff]:
+            session = self.sessions.pop(session_id)
+            print(f"Session {session_id} expired after {session.frames} frames; saving it as incomplete")
+            await self._save(session, complete=False)
+
+    async def _save(self, session, complete=True):
+        if self.store_path:
+            calibration = None if complete else {"incomplete": True}
+            await asyncio.to_thread(save_measurements, measurement_stats(session.estimators),
+                                    session.session_id, calibration, self.store_path)
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, body = await read_request(reader)
+            await self.route(method, path, body, writer)
+        except HttpError as e:
+            await send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception:
+            traceback.print_exc()
+            try:
+                await send_json(writer, 500, {"error": "Internal server error"})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body, writer):
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if parts == ["sessions"] and method == "POST":
+            session = Session(new_session_id())
+            self.sessions[session.session_id] = session
+            await send_json(writer, 201, session.report())
+            return
+        if len(parts) < 2 or parts[0] != "sessions":
+            raise HttpError(404, "Not found")
+
+        session = self.sessions.get(parts[1])
+        if session is None:
+            raise HttpError(404, "Unknown session")
+        action = parts[2] if len(parts) > 2 else None
+
+        if action is None and method == "GET":
+            await send_json(writer, 200, session.report())
+        elif action is None and method == "DELETE":
+            del self.sessions[session.session_id]
+            await self._save(session)
+            await send_json(writer, 200, session.report(done=True))
+        elif action == "frames" and method == "POST":
+            self._check_load()
+            img = await asyncio.to_thread(cv.imdecode, np.frombuffer(body, np.uint8), cv.IMREAD_COLOR)
+            if img is None:
+                raise HttpError(400, "Body is not a readable image")
+            async with session.lock:
+                session.add(*await self.batcher.infer(img))
+            await send_json(writer, 200, session.report())
+        elif action == "clip" and method == "POST":
+            self._check_load()
+            await self.stream_clip(session, body, writer)
+        else:
+            raise HttpError(405, "Method not allowed")
+
+    def _check_load(self):
+        if self.batcher.is_overloaded():
+            raise HttpError(503, "Overloaded, retry later")
+
+    async def stream_clip(self, session, body, writer):
+        """Measure a clip, writing the partial result after every micro-batch of frames.
+
+        The clip is opened and its first frames decoded before the response
+        starts, so an unreadable upload is answered with 400. A failure once
+        results are streaming ends the stream with an {"error": ...} line.
+        """
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as file:
+            file.write(body)
+        try:
+            frames = video_frames(file.name)
+            try:
+                chunk = await asyncio.to_thread(take, frames, self.batcher.max_batch)
+            except (IOError, cv.error):
+                chunk = []
+            if not chunk:
+                raise HttpError(400, "Body is not a readable video")
+
+            await start_stream(writer)
+            try:
+                async with session.lock:
+                    while chunk:
+                        results = await asyncio.gather(*(self.batcher.infer(img) for img in chunk))
+                        for result in results:
+                            session.add(*result)
+                        await write_chunk(writer, session.report())
+                        chunk = await asyncio.to_thread(take, frames, self.batcher.max_batch)
+                await write_chunk(writer, session.report(done=True))
+            except ConnectionError:
+                raise
+            except Exception as e:
+                traceback.print_exc()
+                await write_chunk(writer, {"error": str(e) or type(e).__name__})
+            await end_stream(writer)
+        finally:
+            os.remove(file.name)
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def take(iterator, count):
+    """Up to `count` items from an iterator."""
+    items = []
+    for item in iterator:
+        items.append(item)
+        if len(items) == count:
+            break
+    return items
+
+
+async def read_request(reader):
+    request_line = (await reader.readline()).decode('latin-1').split()
+    if len(request_line) != 3:
+        raise HttpError(400, "Malformed request line")
+    method, path, _ = request_line
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "Upload too large")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), path, body
+
+
+async def send_json(writer, status, payload):
+    body = json.dumps(payload).encode()
+    writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                 f"Connection: close\r\n\r\n".encode() + body)
+    await writer.drain()
+
+
+async def start_stream(writer):
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                 b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+
+
+async def write_chunk(writer, payload):
+    data = json.dumps(payload).encode() + b"\n"
+    writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+    await writer.drain()
+
+
+async def end_stream(writer):
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve body measurements for uploaded photos and clips.")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None, help="pose worker processes (default: one per CPU)")
+    parser.add_argument('--max-batch', type=int, default=8, help="frames per micro-batch")
+    parser.add_argument('--max-wait-ms', type=float, default=10, help="longest wait to fill a micro-batch")
+    parser.add_argument('--queue-size', type=int, default=256, help="frames queued before uploads are refused")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="measurement store for finished sessions")
+    args = parser.parse_args()
+
+    service = MeasurementService(args.workers, args.store, args.max_batch, args.max_wait_ms / 1000,
+                                 args.queue_size)
+    asyncio.run(service.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import json
+import sqlite3
+import time
+import uuid
+from collections import namedtuple
+
+DEFAULT_STORE = 'measurements.db'
+
+MeasurementRecord = namedtuple(
+    'MeasurementRecord',
+    ['session_id', 'kind', 'value', 'frame_count', 'variance', 'calibration', 'recorded_at'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL NOT NULL,
+    frame_count INTEGER NOT NULL,
+    variance REAL,
+    calibration TEXT,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS measurements_session ON measurements (session_id);
+CREATE INDEX IF NOT EXISTS measurements_time ON measurements (recorded_at, kind);
+CREATE TABLE IF NOT EXISTS ground_truth (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value REAL NOT NULL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ground_truth_session ON ground_truth (session_id, kind);
+"""
+
+COLUMNS = "session_id, kind, value, frame_count, variance, calibration, recorded_at"
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class MeasurementStore:
+    """Typed measurement records in SQLite, safe for many concurrent writer processes.
+
+    The database runs in WAL mode so readers never block writers, and every
+    writer waits for the lock instead of failing. Records are buffered and
+    written in one transaction per `batch_size` records, or on commit().
+    """
+
+    def __init__(self, path=DEFAULT_STORE, batch_size=500, timeout=30.0):
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_truth = []
+
+    def record(self, session_id, kind, value, frame_count=0, variance=None, calibration=None,
+               recorded_at=None):
+        """Queue one measurement; it is written with the next batch."""
+        self.pending.append((
+            session_id, kind, float(value), int(frame_count),
+            None if variance is None else float(variance),
+            None if calibration is None else json.dumps(calibration, sort_keys=True),
+            time.time() if recorded_at is None else recorded_at,
+        ))
+        if len(self.pending) >= self.batch_size:
+            self.commit()
+
+    def record_session(self, session_id, stats, calibration=None):
+        """Queue every measurement of a session from {kind: (value, frame_count, variance)}."""
+        recorded_at = time.time()
+        for kind, (value, frame_count, variance) in stats.items():
+            if value is not None:
+                self.record(session_id, kind, value, frame_count, variance, calibration, recorded_at)
+
+    def record_truth(self, session_id, kind, value, recorded_at=None):
+        """Queue a tape-measured reference value for a session's measurement."""
+        self.pending_truth.append((session_id, kind, float(value),
+                                   time.time() if recorded_at is None else recorded_at))
+        if len(self.pending_truth) >= self.batch_size:
+            self.commit()
+
+    def commit(self):
+        """Write all queued records in a single transaction."""
+        if not self.pending and not self.pending_truth:
+            return
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT INTO measurements ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)", self.pending)
+            self.connection.executemany(
+                "INSERT INTO ground_truth (session_id, kind, value, recorded_at) VALUES (?, ?, ?, ?)",
+                self.pending_truth)
+        self.pending = []
+        self.pending_truth = []
+
+    def by_session(self, session_id):
+        """All measurements of one session, oldest first."""
+        rows = self.connection.execute(
+            f"SELECT {COLUMNS} FROM measurements WHERE session_id = ? ORDER BY recorded_at, id",
+            (session_id,))
+        return [self._to_record(row) for row in rows]
+
+    def in_range(self, start=None, end=None, kind=None):
+        """Iterate over the measurements recorded in [start, end), optionally of one kind.
+
+        Rows are streamed from the cursor, so large ranges are never loaded at once.
+        """
+        query = f"SELECT {COLUMNS} FROM measurements WHERE recorded_at >= ? AND recorded_at < ?"
+        params = [float('-inf') if start is None else start, float('inf') if end is None else end]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        query += " ORDER BY recorded_at, id"
+        for row in self.connection.execute(query, params):
+            yield self._to_record(row)
+
+    def last_ids(self):
+        """Highest row id of the measurements and of the ground truth tables (0 when empty)."""
+        measurement_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM measurements").fetchone()[0]
+        truth_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM ground_truth").fetchone()[0]
+        return measurement_id, truth_id
+
+    def measurements_between(self, after_id, until_id):
+        """Iterate over (row id, MeasurementRecord) with after_id < id <= until_id, in id order.
+
+        Row ids only grow, so a reader that remembers the last id it saw
+        can pick up exactly the measurements written since.
+        """
+        rows = self.connection.execute(
+            f"SELECT id, {COLUMNS} FROM measurements WHERE id > ? AND id <= ? ORDER BY id", (after_id, until_id))
+        for row in rows:
+            yield row[0], self._to_record(row[1:])
+
+    def truth_pairs(self, measurement_ids, truth_ids):
+        """Iterate over (kind, measured, truth) for measurement and truth rows in the given id ranges.
+
+        Both ranges are (after_id, until_id] pairs.
+        """
+        rows = self.connection.execute(
+            "SELECT m.kind, m.value, t.value FROM measurements m "
+            "JOIN ground_truth t ON t.session_id = m.session_id AND t.kind = m.kind "
+            "WHERE m.id > ? AND m.id <= ? AND t.id > ? AND t.id <= ?", (*measurement_ids, *truth_ids))
+        yield from rows
+
+    @staticmethod
+    def _to_record(row):
+        row = list(row)
+        if row[5] is not None:
+            row[5] = json.loads(row[5])
+        return MeasurementRecord(*row)
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
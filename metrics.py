@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond stages up to whole sessions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two additions."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", labels + (("le", "+Inf" if bound == float('inf') else repr(bound)),), cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class MetricsRegistry:
+    """Named metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self, prefix="ivs_"):
+        self.prefix = prefix
+        self.metrics = {}
+        self.help = {}
+        self.types = {}
+        self.lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = (self.prefix + name, tuple(sorted((labels or {}).items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, factory())
+                self.help.setdefault(key[0], help_text)
+                self.types.setdefault(key[0], kind)
+        return metric
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get("counter", name, help_text, labels, Counter)
+
+    def gauge(self, name, help_text="", labels=None):
+        return self._get("gauge", name, help_text, labels, Gauge)
+
+    def histogram(self, name, help_text="", labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get("histogram", name, help_text, labels, lambda: Histogram(buckets))
+
+    @contextmanager
+    def timer(self, stage):
+        """Time a block of the capture loop into the stage latency histogram."""
+        histogram = self.histogram("stage_seconds", "Time spent in each pipeline stage", {"stage": stage})
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            items = sorted(self.metrics.items())
+        seen = set()
+        for (name, labels), metric in items:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {self.types[name]}")
+            for sample_name, sample_labels, value in metric.samples(name, labels):
+                if sample_labels:
+                    label_text = ",".join(f'{key}="{val}"' for key, val in sample_labels)
+                    lines.append(f"{sample_name}{{{label_text}}} {value}")
+                else:
+                    lines.append(f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by the measurement pipeline
+REGISTRY = MetricsRegistry()
+
+
+def serve_metrics(registry=REGISTRY, port=9108, host=''):
+    """Serve the registry at http://host:port/metrics from a background thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('', '/metrics'):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def write_metrics(path, registry=REGISTRY):
+    """Write the registry to a text file for offline runs, replacing it atomically."""
+    temporary = f"{path}.tmp"
+    with open(temporary, 'w') as file:
+        file.write(registry.render())
+    os.replace(temporary, path)
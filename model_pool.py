@@ -0,0 +1,177 @@
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from metrics import REGISTRY
+
+# Frame pushed through every new graph so its first real frame does not pay for initialization
+WARM_UP_FRAME = np.zeros((256, 256, 3), dtype=np.uint8)
+
+# Inference profile chosen by tune_profile.py for this machine
+DEFAULT_PROFILE = 'inference_profile.json'
+
+# Longest wait (s) in PosePool.acquire() for a graph to be built or returned
+ACQUIRE_TIMEOUT = 30.0
+
+# Profile keys that are passed to mpPose.Pose(); "input_width" is applied by the engine
+POSE_OPTIONS = ("model_complexity", "min_detection_confidence", "min_tracking_confidence")
+
+
+def pose_solution():
+    """mediapipe's pose solution, imported on first use.
+
+    Importing mediapipe takes most of a second, so modules that only need
+    the geometry or the store never pay for it.
+    """
+    import mediapipe as mp
+    return mp.solutions.pose
+
+
+def create_pose(**pose_options):
+    """A new mediapipe Pose graph."""
+    return pose_solution().Pose(**pose_options)
+
+
+def warm_pose(**pose_options):
+    """A new Pose graph that has already processed one frame."""
+    pose = create_pose(**pose_options)
+    pose.process(WARM_UP_FRAME)
+    pose.reset()
+    return pose
+
+
+def load_profile(path=DEFAULT_PROFILE):
+    """Inference profile saved by tune_profile.py, or {} (the defaults) if there is none."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def pose_options(profile):
+    """Pose() keyword arguments of an inference profile."""
+    return {key: profile[key] for key in POSE_OPTIONS if profile.get(key) is not None}
+
+
+class PosePool:
+    """Pose graphs that are built once, kept warm and handed out to sessions.
+
+    acquire() lends a graph for one session and resets its tracking state
+    when it comes back. Graphs are built on demand up to `size`; warm()
+    builds them ahead of time, e.g. from a background thread at kiosk start
+    while the camera is still opening. If building a graph fails, the
+    error is kept in `error` and raised by the acquire() calls that were
+    waiting for that graph; later calls try to build it again.
+    """
+
+    def __init__(self, size=1, warm_up=True, metrics=REGISTRY, **pose_options):
+        self.size = size
+        self.warm_up = warm_up
+        self.metrics = metrics
+        self.pose_options = pose_options
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.error = None
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def _build(self):
+        started = time.perf_counter()
+        try:
+            pose = (warm_pose if self.warm_up else create_pose)(**self.pose_options)
+        except Exception as e:
+            with self.lock:
+                self.created -= 1
+                self.error = e
+                self.failures += 1
+            raise
+        self.metrics.histogram("pose_model_build_seconds", "Time to build and warm up one Pose graph").observe(
+            time.perf_counter() - started)
+        return pose
+
+    def _reserve(self):
+        with self.lock:
+            if self.created >= self.size:
+                return False
+            self.created += 1
+            return True
+
+    def warm(self, background=False):
+        """Build every graph not built yet; with background=True return at once."""
+        if background:
+            thread = threading.Thread(target=self._warm_in_background, daemon=True)
+            thread.start()
+            return thread
+        while self._reserve():
+            self.idle.put(self._build())
+        return None
+
+    def _warm_in_background(self):
+        try:
+            self.warm()
+        except Exception:
+            # Kept in self.error; acquire() raises it to the session that needed the graph
+            pass
+
+    @contextmanager
+    def acquire(self, timeout=ACQUIRE_TIMEOUT):
+        """Lend a warm graph, building one if none is idle and the pool is not full.
+
+        Waits up to `timeout` seconds for a graph that another thread is
+        building or using, then raises TimeoutError. If that graph could not
+        be built, its error is raised instead.
+        """
+        deadline = time.monotonic() + timeout
+        failures = self.failures
+        while True:
+            try:
+                pose = self.idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            if self.failures != failures:
+                raise self.error
+            if self._reserve():
+                pose = self._build()
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"No Pose graph became available within {timeout} s")
+            try:
+                # Wake up now and then to notice a failed build, which never reaches the queue
+                pose = self.idle.get(timeout=min(remaining, 0.1))
+                break
+            except queue.Empty:
+                pass
+        try:
+            yield pose
+        finally:
+            # Clear tracking state so the next session starts from a fresh detection
+            pose.reset()
+            self.idle.put(pose)
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_shared_pools = {}
+_shared_lock = threading.Lock()
+
+
+def shared_pool(size=1, **pose_options):
+    """Process-wide pool for a set of Pose options, created on first use."""
+    key = tuple(sorted(pose_options.items()))
+    with _shared_lock:
+        pool = _shared_pools.get(key)
+        if pool is None:
+            pool = _shared_pools[key] = PosePool(size, **pose_options)
+        return pool
@@ -0,0 +1,247 @@
+import argparse
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from batch_measure import infer_segmented, init_worker
+from body_measurement import (CALIBRATION, METRIC_CALIBRATION, create_estimators, default_calculators,
+                              measure_landmarks, measurement_stats, save_measurements, summarize)
+from calibration import DEFAULT_CACHE, CalibrationCache
+from capture import FrameGrabber
+from landmarks import BODY_LEVELS, LEFT_HIP, LEFT_SHOULDER, RIGHT_HIP, RIGHT_SHOULDER, torso_point
+from measurement_store import DEFAULT_STORE
+
+# Scaling factor (cm per pixel) of a camera without a marker calibration
+DEFAULT_VIEW_SCALE = CALIBRATION["shoulder"]
+
+# Landmarks whose visibility gates each circumference, in both views
+CIRCUMFERENCE_LANDMARKS = {"chest": [LEFT_SHOULDER, RIGHT_SHOULDER], "waist": [LEFT_HIP, RIGHT_HIP]}
+
+
+def ellipse_circumference(width, depth):
+    """Ramanujan's approximation of the perimeter of an ellipse with the given axes."""
+    a, b = width / 2, depth / 2
+    return math.pi * (3 * (a + b) - math.sqrt((3 * a + b) * (a + 3 * b)))
+
+
+def front_calculators(calibration=None):
+    """The engine's calculators minus chest and waist, which come from both views here."""
+    calculators = default_calculators(calibration)
+    del calculators["chest"], calculators["waist"]
+    return calculators
+
+
+def width_cm(view, name, calibration=None):
+    """Body width (cm) at a torso level of one view: (landmarks, w, h, widths)."""
+    landmarks, w, h, widths = view
+    if calibration is None:
+        return widths[name] * DEFAULT_VIEW_SCALE
+    return calibration.width_cm(torso_point(landmarks, BODY_LEVELS[name]), widths[name] / w)
+
+
+def measure_fused(views, calculators, calibrations=None):
+    """Measurements of one synchronized set of views: {view: (landmarks, w, h, widths)}.
+
+    Lengths come from the front view's landmarks. Chest and waist are
+    circumferences of an ellipse whose axes are the body's width in the
+    front view and its depth in the side view, both read from the
+    segmentation masks. calibrations maps a view to its CameraCalibration;
+    views without one use DEFAULT_VIEW_SCALE, and the calculators must be
+    metric ones when the front view is calibrated. Returns
+    {name: (value, visibility)} like measure_landmarks; measurements a set
+    lacks a view for are left out.
+    """
+    calibrations = calibrations or {}
+    front = views.get("front")
+    side = views.get("side")
+    measured = {}
+    if front is not None and front[0] is not None:
+        landmarks, w, h, _ = front
+        measured.update(measure_landmarks(landmarks, w, h, calculators, calibrations.get("front")))
+
+    if front is None or side is None or front[3] is None or side[3] is None:
+        return measured
+    for name, indices in CIRCUMFERENCE_LANDMARKS.items():
+        width = width_cm(front, name, calibrations.get("front"))
+        depth = width_cm(side, name, calibrations.get("side"))
+        if width and depth:
+            visibility = min(float(front[0][indices, 3].min()), float(side[0][indices, 3].min()))
+            measured[name] = (ellipse_circumference(width, depth), visibility)
+    return measured
+
+
+def synchronized_frames(grabbers, max_skew=0.04, timeout=0.25):
+    """Yield (timestamp, {view: img}) sets whose capture times lie within max_skew seconds.
+
+    Views that lag the newest frame get one short chance to deliver a newer
+    frame and are otherwise left out of the set, and a camera that delivers
+    nothing within `timeout` is skipped, so one slow or dead stream never
+    holds up the others. A stream ends when its grabber stops or its source
+    is not open; the generator ends when every stream has ended.
+    """
+    live = dict(grabbers)
+    while live:
+        frames = {}
+        for view, grabber in list(live.items()):
+            isTrue, img, captured_at = grabber.read_latest(timeout)
+            if isTrue:
+                frames[view] = (img, captured_at)
+            elif grabber.stopped or not grabber.isOpened():
+                del live[view]
+        if not frames:
+            continue
+
+        newest = max(captured_at for _, captured_at in frames.values())
+        for view, (img, captured_at) in list(frames.items()):
+            if newest - captured_at <= max_skew:
+                continue
+            isTrue, img, captured_at = live[view].read_latest(2 * max_skew)
+            if isTrue and abs(newest - captured_at) <= max_skew:
+                frames[view] = (img, captured_at)
+            else:
+                del frames[view]
+        yield newest, {view: img for view, (img, _) in frames.items()}
+
+
+class KioskRig:
+    """The cameras of one kiosk, fused and measured on a pose pool shared with other rigs.
+
+    Each rig runs on its own thread and keeps at most one synchronized set
+    in flight, so a slow rig only ever delays itself. The cameras keep
+    capturing meanwhile and stale frames are dropped. With a
+    CalibrationCache every camera is calibrated from the marker (keyed by
+    its source), like the single-camera kiosk; cameras without a usable
+    calibration fall back to the default scaling factors. Raises IOError if
+    a camera cannot be opened.
+    """
+
+    def __init__(self, name, sources, pool, max_skew=0.04, realtime=True, calibration_cache=None):
+        self.name = name
+        self.grabbers = {}
+        for view, source in sources.items():
+            grabber = self.grabbers[view] = FrameGrabber(source, realtime=realtime)
+            if not grabber.isOpened():
+                self.release()
+                raise IOError(f"{name}: could not open the {view} camera ({source})")
+        self.pool = pool
+        self.max_skew = max_skew
+        self.calibrations = {}
+        if calibration_cache is not None:
+            for view, source in sources.items():
+                isTrue, img, _ = self.grabbers[view].read_latest(timeout=5)
+                if isTrue:
+                    self.calibrations[view] = calibration_cache.for_frame(source, img)
+                if self.calibrations.get(view) is None:
+                    print(f"{name}: no calibration for the {view} camera; using the default scaling factors.")
+        metric = self.calibrations.get("front") is not None
+        self.calculators = front_calculators(METRIC_CALIBRATION if metric else None)
+        self.estimators = create_estimators([*self.calculators, *CIRCUMFERENCE_LANDMARKS])
+        self.sets = 0
+
+    def calibration_record(self):
+        """How each view was scaled, as recorded with the session in the measurement store."""
+        views = {}
+        for view in self.grabbers:
+            calibration = self.calibrations.get(view)
+            views[view] = ({"homography": calibration.homography.tolist()} if calibration is not None
+                           else {"scale": DEFAULT_VIEW_SCALE})
+        record = {"views": views}
+        if self.calibrations.get("front") is not None:
+            record.update(METRIC_CALIBRATION)
+        return record
+
+    def release(self):
+        for grabber in self.grabbers.values():
+            grabber.release()
+
+    def run(self, stop_when_converged=True, max_sets=None):
+        try:
+            for _, frames in synchronized_frames(self.grabbers, self.max_skew):
+                futures = {view: self.pool.submit(infer_segmented, [img]) for view, img in frames.items()}
+                views = {view: future.result()[0] for view, future in futures.items()}
+                for name, (value, visibility) in measure_fused(views, self.calculators, self.calibrations).items():
+                    self.estimators[name].update(float(value), float(visibility))
+                self.sets += 1
+                if stop_when_converged and all(estimator.converged for estimator in self.estimators.values()):
+                    break
+                if max_sets is not None and self.sets >= max_sets:
+                    break
+        finally:
+            self.release()
+        return self.estimators
+
+
+def run_rigs(rigs, workers=None, stop_when_converged=True, max_sets=None, store_path=DEFAULT_STORE,
+             realtime=True, calibration_cache=None):
+    """Measure several kiosks at once, all sharing one pose worker pool.
+
+    rigs maps a kiosk name to {view: camera index or video file}. Returns
+    {kiosk: results}. Each kiosk's session is saved to the measurement store
+    at store_path, if set. Cameras are calibrated through calibration_cache,
+    if given (see KioskRig).
+    """
+    workers = workers or os.cpu_count()
+    # Frames from every camera share the workers, so each one is treated as an independent image
+    with ProcessPoolExecutor(workers, initializer=init_worker,
+                             initargs=({"static_image_mode": True, "enable_segmentation": True},)) as pool:
+        kiosks = []
+        try:
+            for name, sources in rigs.items():
+                kiosks.append(KioskRig(name, sources, pool, realtime=realtime, calibration_cache=calibration_cache))
+        except IOError:
+            for kiosk in kiosks:
+                kiosk.release()
+            raise
+        threads = [threading.Thread(target=kiosk.run, args=(stop_when_converged, max_sets)) for kiosk in kiosks]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    results = {}
+    for kiosk in kiosks:
+        results[kiosk.name] = summarize(kiosk.estimators)
+        print(f"{kiosk.name}: {kiosk.sets} synchronized sets in {elapsed:.1f} s")
+        if store_path:
+            save_measurements(measurement_stats(kiosk.estimators), calibration=kiosk.calibration_record(),
+                              path=store_path)
+    return results
+
+
+def parse_rig(text):
+    """NAME:VIEW=SOURCE,VIEW=SOURCE, where SOURCE is a camera index or a video file."""
+    name, _, views = text.partition(':')
+    sources = {}
+    for item in views.split(','):
+        view, _, source = item.partition('=')
+        if not source:
+            raise argparse.ArgumentTypeError(f"Expected NAME:VIEW=SOURCE,..., got {text!r}")
+        sources[view] = int(source) if source.isdigit() else source
+    return name, sources
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure with synchronized front and side cameras.")
+    parser.add_argument('--rig', type=parse_rig, action='append', required=True,
+                        help="a kiosk's cameras, e.g. kiosk1:front=0,side=1 (video files work too)")
+    parser.add_argument('--workers', type=int, default=None, help="pose worker processes (default: one per CPU)")
+    parser.add_argument('--sets', type=int, help="stop each kiosk after this many synchronized sets")
+    parser.add_argument('--fast', action='store_true', help="read video files as fast as possible")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="measurement store the results are recorded in")
+    parser.add_argument('--calibration', default=DEFAULT_CACHE,
+                        help="camera calibration cache ('' to use the default scaling factors)")
+    args = parser.parse_args()
+
+    cache = CalibrationCache(args.calibration) if args.calibration else None
+    results = run_rigs(dict(args.rig), args.workers, max_sets=args.sets, store_path=args.store,
+                       realtime=not args.fast, calibration_cache=cache)
+    for name, values in results.items():
+        print(f"{name}: {values}")
+
+
+if __name__ == "__main__":
+    main()
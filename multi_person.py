@@ -0,0 +1,306 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+from batch_measure import infer_images, init_worker
+from body_measurement import (DisplayStage, calibrated_calculators, calibration_record, camera_frames,
+                              create_estimators, measure_landmarks, measurement_stats, save_measurements, summarize,
+                              with_frame_times)
+from calibration import DEFAULT_CACHE, CalibrationCache
+from capture import FrameGrabber
+from landmark_filter import LandmarkFilter
+from landmarks import bounding_box, crop_to_frame
+from measurement_store import DEFAULT_STORE
+from offline import iter_frames
+from person_gate import FULLBODY_CASCADE
+
+
+class PersonDetector:
+    """Boxes around the people in a frame, found on a downscaled copy.
+
+    Uses OpenCV's HOG people detector, or the bundled full-body Haar cascade
+    with method="haar". Overlapping boxes are merged by non-maximum
+    suppression and returned in frame pixels as (x0, y0, x1, y1).
+    """
+
+    def __init__(self, method="hog", detect_width=320, min_score=0.3, nms_threshold=0.4):
+        self.method = method
+        self.detect_width = detect_width
+        self.min_score = min_score
+        self.nms_threshold = nms_threshold
+        if method == "hog":
+            self.hog = cv.HOGDescriptor()
+            self.hog.setSVMDetector(cv.HOGDescriptor_getDefaultPeopleDetector())
+        else:
+            self.cascade = cv.CascadeClassifier(FULLBODY_CASCADE)
+
+    def detect(self, img):
+        h, w = img.shape[:2]
+        scale = min(1.0, self.detect_width / w)
+        small = cv.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv.INTER_AREA)
+        if self.method == "hog":
+            rects, weights = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+            scores = np.ravel(weights).astype(float) if len(rects) else np.zeros(0)
+        else:
+            gray = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+            rects = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3)
+            scores = np.ones(len(rects))
+        if len(rects) == 0:
+            return []
+        keep = cv.dnn.NMSBoxes([list(map(int, r)) for r in rects], scores.tolist(), self.min_score,
+                               self.nms_threshold)
+        boxes = []
+        for i in np.ravel(keep):
+            x, y, bw, bh = rects[i]
+            boxes.append((x / scale, y / scale, (x + bw) / scale, (y + bh) / scale))
+        return boxes
+
+
+def iou(a, b):
+    """Intersection over union of two (x0, y0, x1, y1) boxes."""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def expand_box(box, w, h, margin=0.2):
+    """Integer crop around a box, grown by `margin` on every side and clipped to the frame."""
+    x0, y0, x1, y1 = box
+    pad_x, pad_y = (x1 - x0) * margin, (y1 - y0) * margin
+    return (max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y)),
+            min(w, int(x1 + pad_x) + 1), min(h, int(y1 + pad_y) + 1))
+
+
+class PersonTrack:
+    """One subject in view, with their own calculators and streaming estimators.
+
+    `box` is the last detection, used to match detections to tracks, and
+    `body` the box around the last landmarks, which the next crop follows.
+    """
+
+    def __init__(self, track_id, box, camera_calibration=None):
+        self.track_id = track_id
+        self.box = box
+        self.body = None
+        self.camera_calibration = camera_calibration
+        self.calculators = calibrated_calculators(camera_calibration)
+        self.estimators = create_estimators(self.calculators)
+        self.misses = 0
+        self.frames = 0
+
+    def add(self, landmarks, w, h):
+        self.frames += 1
+        measured = measure_landmarks(landmarks, w, h, self.calculators, self.camera_calibration)
+        for name, (value, visibility) in measured.items():
+            self.estimators[name].update(float(value), float(visibility))
+
+    @property
+    def converged(self):
+        return all(estimator.converged for estimator in self.estimators.values())
+
+
+class PersonTracker:
+    """Greedy IoU matching of person boxes to tracks, so every subject keeps one id.
+
+    A track that goes unmatched for more than `max_misses` frames is moved
+    to `finished`, from where its measurements can be saved. New tracks
+    measure through camera_calibration, if given.
+    """
+
+    def __init__(self, min_iou=0.3, max_misses=15, camera_calibration=None):
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+        self.camera_calibration = camera_calibration
+        self.tracks = []
+        self.finished = []
+        self.ids = itertools.count(1)
+
+    def update(self, boxes):
+        """Match this frame's boxes; returns the tracks seen in it."""
+        pairs = sorted(((iou(track.box, box), t, b) for t, track in enumerate(self.tracks)
+                        for b, box in enumerate(boxes)), reverse=True)
+        matched_tracks, matched_boxes = set(), set()
+        for overlap, t, b in pairs:
+            if overlap < self.min_iou:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            self.tracks[t].box = boxes[b]
+            self.tracks[t].body = None
+            self.tracks[t].misses = 0
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        seen = [track for t, track in enumerate(self.tracks) if t in matched_tracks]
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                track = PersonTrack(next(self.ids), box, self.camera_calibration)
+                self.tracks.append(track)
+                seen.append(track)
+
+        self.finished.extend(track for track in self.tracks if track.misses > self.max_misses)
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+        return seen
+
+
+def chunks(items, count):
+    """Split items into at most `count` nearly equal, non-empty lists."""
+    size = -(-len(items) // count) if items else 1
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class CrowdMeasurer:
+    """Measures everyone in view of one camera at the same time.
+
+    People are detected every `detect_every` frames; in between, the crops
+    follow each track's last landmarks. All crops of a frame are spread over
+    the worker pool in one pass, and each track's landmarks only feed that
+    track's estimators. Every track is a stream of one LandmarkFilter, so
+    the landmarks of everyone in the frame are smoothed in a single call.
+    With a CameraCalibration every track is measured in cm through it.
+    """
+
+    def __init__(self, pool, workers, detector=None, tracker=None, detect_every=3, landmark_filter=None,
+                 camera_calibration=None):
+        self.pool = pool
+        self.workers = workers
+        self.detector = detector or PersonDetector()
+        self.camera_calibration = camera_calibration
+        self.tracker = tracker or PersonTracker(camera_calibration=camera_calibration)
+        self.detect_every = detect_every
+        self.landmark_filter = landmark_filter or LandmarkFilter()
+        self.frame_index = 0
+
+    def process(self, img, timestamp=None):
+        """Measure one frame taken at `timestamp` (s); returns the tracks that were measured in it."""
+        h, w = img.shape[:2]
+        if self.frame_index % self.detect_every == 0:
+            tracks = self.tracker.update(self.detector.detect(img))
+        else:
+            tracks = [track for track in self.tracker.tracks if track.misses == 0]
+        self.frame_index += 1
+        if not tracks:
+            return []
+
+        rois = [expand_box(track.body or track.box, w, h) for track in tracks]
+        crops = [img[y0:y1, x0:x1] for x0, y0, x1, y1 in rois]
+        jobs = [self.pool.submit(infer_images, chunk) for chunk in chunks(crops, self.workers)]
+        results = [result for job in jobs for result in job.result()]
+
+        measured, found = [], []
+        for track, roi, (landmarks, _, _) in zip(tracks, rois, results):
+            if landmarks is not None:
+                measured.append(track)
+                found.append(crop_to_frame(landmarks, roi, w, h))
+        # Tracks that ended give their filter slots to new ones
+        self.landmark_filter.retain(track.track_id for track in self.tracker.tracks)
+        if not measured:
+            return []
+        filtered = self.landmark_filter.update([track.track_id for track in measured], np.stack(found), timestamp)
+        for track, landmarks in zip(measured, filtered):
+            track.add(landmarks, w, h)
+            track.body = bounding_box(landmarks, w, h)
+        return measured
+
+    def all_tracks(self):
+        return self.tracker.finished + self.tracker.tracks
+
+
+def draw_tracks(img, tracks):
+    for track in tracks:
+        x0, y0, x1, y1 = map(int, track.body or track.box)
+        height = track.estimators["height"]
+        label = f"#{track.track_id}: {height.value:.1f} cm" if height.count else f"#{track.track_id}"
+        cv.rectangle(img, (x0, y0), (x1, y1), (0, 255, 0), 2)
+        cv.putText(img, label, (x0, max(20, y0 - 10)), cv.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+
+
+def measure_crowd(source, workers=None, method="hog", detect_every=3, display=False, min_frames=15,
+                  store_path=DEFAULT_STORE, max_frames=None, calibration_cache=None):
+    """Measure every person in a camera feed (an index) or a recording.
+
+    Each track seen on at least `min_frames` frames is saved to the
+    measurement store at store_path, if set, as its own session. With a
+    CalibrationCache the source is calibrated from the marker in its first
+    frame, like the single-camera kiosk. Returns {track id: results}.
+    Raises IOError if the camera cannot be opened.
+    """
+    workers = workers or os.cpu_count()
+    capture = FrameGrabber(source) if isinstance(source, int) else None
+    if capture is not None and not capture.isOpened():
+        capture.release()
+        raise IOError(f"Could not open camera {source}")
+    frames = camera_frames(capture, timestamps=True) if capture is not None else iter_frames(source, timestamps=True)
+    frames = with_frame_times(frames)
+    display_stage = DisplayStage("People", max_fps=15) if display else None
+
+    camera_calibration = None
+    if calibration_cache is not None:
+        first = next(frames, None)
+        if first is not None:
+            camera_calibration = calibration_cache.for_frame(source, first[1])
+            frames = itertools.chain([first], frames)
+        if camera_calibration is None:
+            print("No camera calibration; using the default scaling factors.")
+
+    # Crops of different people share the workers, so each one is an independent image
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=({"static_image_mode": True},)) as pool:
+        measurer = CrowdMeasurer(pool, workers, PersonDetector(method), detect_every=detect_every,
+                                 camera_calibration=camera_calibration)
+        try:
+            for count, (timestamp, img) in enumerate(frames):
+                if max_frames is not None and count >= max_frames:
+                    break
+                tracks = measurer.process(img, timestamp)
+                if display_stage is not None:
+                    if not display_stage.show(img, overlay=lambda frame: draw_tracks(frame, tracks)):
+                        break
+        finally:
+            if capture is not None:
+                capture.release()
+            if display:
+                cv.destroyAllWindows()
+
+    results = {}
+    for track in measurer.all_tracks():
+        if track.frames < min_frames:
+            continue
+        results[track.track_id] = summarize(track.estimators)
+        if store_path:
+            save_measurements(measurement_stats(track.estimators),
+                              calibration=calibration_record(camera_calibration), path=store_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure several people in view at the same time.")
+    parser.add_argument('source', nargs='?', default='0', help="camera index or video file (default: camera 0)")
+    parser.add_argument('--workers', type=int, default=None, help="pose worker processes (default: one per CPU)")
+    parser.add_argument('--detector', choices=['hog', 'haar'], default='hog', help="person detector")
+    parser.add_argument('--detect-every', type=int, default=3, help="run the person detector every N frames")
+    parser.add_argument('--min-frames', type=int, default=15, help="frames a person needs to be reported")
+    parser.add_argument('--display', action='store_true', help="show the tracked people")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="measurement store the results are recorded in")
+    parser.add_argument('--calibration', default=DEFAULT_CACHE,
+                        help="camera calibration cache ('' to use the default scaling factors)")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    cache = CalibrationCache(args.calibration) if args.calibration else None
+    results = measure_crowd(source, args.workers, args.detector, args.detect_every, args.display,
+                            args.min_frames, args.store, calibration_cache=cache)
+    for track_id, values in results.items():
+        print(f"Person {track_id}: {values}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import os
+
+import cv2 as cv
+
+from body_measurement import (calibrated_calculators, calibration_record, measurement_stats, pipeline_options,
+                              process_frames, save_measurements, summarize)
+from calibration import DEFAULT_CACHE, CalibrationCache
+from landmark_log import LandmarkLog
+from measurement_store import DEFAULT_STORE
+from metrics import write_metrics
+from model_pool import DEFAULT_PROFILE, load_profile, pose_options, shared_pool
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def video_frames(path, timestamps=False):
+    """Yield every frame of a video file as fast as it can be decoded.
+
+    With timestamps=True every frame comes with its position in the file,
+    as a (seconds, img) pair: the frame index over the file's frame rate.
+    """
+    capture = cv.VideoCapture(path)
+    if not capture.isOpened():
+        raise IOError(f"Could not open video file: {path}")
+    fps = capture.get(cv.CAP_PROP_FPS) or 30.0
+    try:
+        index = 0
+        while True:
+            isTrue, img = capture.read()
+            if not isTrue:
+                break
+            yield (index / fps, img) if timestamps else img
+            index += 1
+    finally:
+        capture.release()
+
+
+def image_frames(paths):
+    """Yield images from a list of paths, skipping files that cannot be read."""
+    for path in paths:
+        img = cv.imread(path)
+        if img is None:
+            print(f"Skipping unreadable image: {path}")
+            continue
+        yield img
+
+
+def list_images(directory):
+    """Image files in a directory, in name order."""
+    names = sorted(name for name in os.listdir(directory)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    return [os.path.join(directory, name) for name in names]
+
+
+def iter_frames(source, timestamps=False):
+    """Frames from a video file, a frame directory or a list of image paths.
+
+    timestamps=True makes a video file yield (seconds, img) pairs (see
+    video_frames); images have no time and are always yielded as they are.
+    """
+    if isinstance(source, (list, tuple)):
+        return image_frames(source)
+    if os.path.isdir(source):
+        return image_frames(list_images(source))
+    if source.lower().endswith(IMAGE_EXTENSIONS):
+        return image_frames([source])
+    return video_frames(source, timestamps)
+
+
+def measure_offline(source, calculators=None, static_image_mode=False, store_path=DEFAULT_STORE,
+                    session_id=None, use_gate=False, use_keyframes=False, record_path=None, profile=None,
+                    camera_calibration=None, use_filter=True):
+    """Measure a recorded session headlessly, without any drawing or GUI calls.
+
+    Records the results in the measurement store at store_path, if set, and
+    returns a dict with one value (cm) per measurement. use_gate
+    skips empty frames and crops inference to the tracked person, and
+    use_keyframes tracks landmarks between keyframes instead of running
+    inference on every frame. record_path saves every frame's landmarks to a
+    landmark log for later recomputation. Pose graphs come from the shared
+    pool, so measuring several sessions in one process builds the model once.
+    An inference profile from tune_profile.py sets the Pose options and the
+    model input width. camera_calibration is the CameraCalibration of the
+    camera the recording was made with, if it was calibrated. Landmarks are
+    smoothed with a LandmarkFilter, as in a live scan, unless use_filter is
+    False; the landmark log records which filter was used.
+    """
+    if calculators is None:
+        calculators = calibrated_calculators(camera_calibration)
+    profile = profile or {}
+
+    recorder = LandmarkLog(record_path) if record_path else None
+    try:
+        with shared_pool(static_image_mode=static_image_mode, **pose_options(profile)).acquire() as pose:
+            estimators = process_frames(iter_frames(source, timestamps=True), pose, calculators, display=False,
+                                        recorder=recorder,
+                                        **pipeline_options(profile, use_gate, use_keyframes, use_filter,
+                                                           camera_calibration))
+    finally:
+        if recorder is not None:
+            recorder.close()
+
+    if store_path:
+        save_measurements(measurement_stats(estimators), session_id, calibration_record(camera_calibration),
+                          path=store_path)
+    return summarize(estimators)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recorded sessions without a camera or display.")
+    parser.add_argument('source', nargs='+',
+                        help="a video file, a directory of frames, or several image files")
+    parser.add_argument('--store', default=DEFAULT_STORE, help="measurement store the results are recorded in")
+    parser.add_argument('--session', help="session id to record the results under (default: a new id)")
+    parser.add_argument('--static-images', action='store_true',
+                        help="treat every image as an independent photo instead of a video sequence")
+    parser.add_argument('--gate', action='store_true',
+                        help="skip frames without a person and crop inference to the tracked body")
+    parser.add_argument('--keyframes', action='store_true',
+                        help="run inference on keyframes only and track landmarks in between")
+    parser.add_argument('--no-filter', dest='use_filter', action='store_false',
+                        help="measure the raw landmarks instead of smoothing them first")
+    parser.add_argument('--record', metavar='LOG', help="save every frame's landmarks to a landmark log")
+    parser.add_argument('--metrics-file', help="write pipeline metrics to this file when done")
+    parser.add_argument('--profile', default=DEFAULT_PROFILE,
+                        help="inference profile written by tune_profile.py (used if the file exists)")
+    parser.add_argument('--camera', help="camera the recording was made with, to use its cached calibration")
+    parser.add_argument('--calibration', default=DEFAULT_CACHE, help="camera calibration cache used with --camera")
+    args = parser.parse_args()
+
+    camera_calibration = None
+    if args.camera is not None:
+        camera_calibration = CalibrationCache(args.calibration).get(args.camera)
+        if camera_calibration is None:
+            print(f"No calibration for camera {args.camera}; using the default scaling factors.")
+
+    source = args.source[0] if len(args.source) == 1 else args.source
+    results = measure_offline(source, static_image_mode=args.static_images, store_path=args.store,
+                              session_id=args.session, use_gate=args.gate, use_keyframes=args.keyframes, record_path=args.record,
+                              profile=load_profile(args.profile), camera_calibration=camera_calibration,
+                              use_filter=args.use_filter)
+    for name, value in results.items():
+        print(f"{name}: {value} cm")
+    if args.metrics_file:
+        write_metrics(args.metrics_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import os
+
+import cv2 as cv
+
+from landmarks import bounding_box, crop_to_frame
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FULLBODY_CASCADE = os.path.join(HERE, 'haarcascade_fullbody.xml')
+FACE_CASCADE = os.path.join(HERE, 'haarcascade_frontalface_default.xml')
+
+
+class PersonGate:
+    """Decides which pixels, if any, pose inference runs on.
+
+    While nobody is tracked, a cheap Haar cascade check on a small grayscale
+    copy of the frame decides whether pose inference runs at all; the check
+    itself only runs every `check_every` frames. Once a pose is found, the
+    next frames are cropped to the previous landmarks' bounding box plus a
+    margin and downscaled to at most `max_input_side` pixels. The crop is
+    only moved when the body gets close to its edge, so MediaPipe's own
+    tracker sees a stable input.
+    """
+
+    def __init__(self, detect_width=240, check_every=3, full_frame_every=30,
+                 margin=0.2, max_input_side=480):
+        self.fullbody = cv.CascadeClassifier(FULLBODY_CASCADE)
+        self.face = cv.CascadeClassifier(FACE_CASCADE)
+        self.detect_width = detect_width
+        self.check_every = check_every
+        self.full_frame_every = full_frame_every
+        self.margin = margin
+        self.max_input_side = max_input_side
+        self.roi = None
+        self.idle_frames = 0
+        self.skipped = 0
+
+    def person_present(self, img):
+        """Low-resolution cascade check for a body or a face."""
+        h, w = img.shape[:2]
+        scale = self.detect_width / w
+        small = cv.resize(img, (self.detect_width, max(1, int(h * scale))), interpolation=cv.INTER_AREA)
+        gray = cv.cvtColor(small, cv.COLOR_BGR2GRAY)
+        for cascade in (self.fullbody, self.face):
+            if len(cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=3)):
+                return True
+        return False
+
+    def prepare(self, img):
+        """Image to run pose inference on and its roi in frame pixels, or (None, None) to skip."""
+        h, w = img.shape[:2]
+        if self.roi is None:
+            self.idle_frames += 1
+            # Cascades miss people now and then, so periodically try the full frame anyway
+            due_full_frame = self.idle_frames % self.full_frame_every == 0
+            due_check = self.idle_frames % self.check_every == 0
+            if not due_full_frame and not (due_check and self.person_present(img)):
+                self.skipped += 1
+                return None, None
+            roi = (0, 0, w, h)
+        else:
+            roi = self.roi
+
+        x0, y0, x1, y1 = roi
+        crop = img[y0:y1, x0:x1]
+        side = max(x1 - x0, y1 - y0)
+        if side > self.max_input_side:
+            scale = self.max_input_side / side
+            crop = cv.resize(crop, (max(1, int((x1 - x0) * scale)), max(1, int((y1 - y0) * scale))),
+                             interpolation=cv.INTER_AREA)
+        return crop, roi
+
+    def update(self, landmarks, roi, w, h):
+        """Map crop landmarks back to the frame and choose the next roi.
+
+        Returns the landmarks in normalized frame coordinates, or None when
+        the pose was lost, in which case the gate falls back to person checks.
+        """
+        if landmarks is None:
+            self.roi = None
+            return None
+
+        self.idle_frames = 0
+        landmarks = crop_to_frame(landmarks, roi, w, h)
+        box = bounding_box(landmarks, w, h)
+        if box is None:
+            self.roi = None
+        elif self.roi is None or not self._well_inside(box, self.roi):
+            self.roi = self._expand(box, w, h)
+        return landmarks
+
+    def _well_inside(self, box, roi):
+        """True while the box keeps half the margin away from the roi edges."""
+        bx0, by0, bx1, by1 = box
+        x0, y0, x1, y1 = roi
+        pad_x = (bx1 - bx0) * self.margin / 2
+        pad_y = (by1 - by0) * self.margin / 2
+        return bx0 - pad_x >= x0 and by0 - pad_y >= y0 and bx1 + pad_x <= x1 and by1 + pad_y <= y1
+
+    def _expand(self, box, w, h):
+        bx0, by0, bx1, by1 = box
+        pad_x = (bx1 - bx0) * self.margin
+        pad_y = (by1 - by0) * self.margin
+        x0, y0 = max(0, int(bx0 - pad_x)), max(0, int(by0 - pad_y))
+        x1, y1 = min(w, int(bx1 + pad_x) + 1), min(h, int(by1 + pad_y) + 1)
+        if x1 - x0 < 16 or y1 - y0 < 16:
+            return None
+        return x0, y0, x1, y1
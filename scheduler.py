@@ -0,0 +1,89 @@
+import cv2 as cv
+import numpy as np
+
+from landmarks import segment_lengths
+
+# Lucas-Kanade optical flow settings for propagating landmarks between keyframes
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+class KeyframeScheduler:
+    """Runs full pose inference on keyframes and tracks landmarks with optical flow in between.
+
+    The keyframe interval grows by one frame after every keyframe where the
+    tracked landmarks agreed with inference (every measurement segment within
+    `tolerance_px`), and halves as soon as they disagree. Any motion above
+    `motion_px` per frame or a failed track forces inference on the next
+    frame, so a customer who is moving is measured on every frame while one
+    standing still is measured on every `max_interval`-th frame.
+    """
+
+    def __init__(self, max_interval=8, tolerance_px=3.0, motion_px=4.0,
+                 max_flow_error=20.0, max_lost_fraction=0.2, min_visibility=0.5):
+        self.max_interval = max_interval
+        self.tolerance_px = tolerance_px
+        self.motion_px = motion_px
+        self.max_flow_error = max_flow_error
+        self.max_lost_fraction = max_lost_fraction
+        self.min_visibility = min_visibility
+        self.interval = 1
+        self.since_keyframe = 0
+        self.landmarks = None
+        self.prev_gray = None
+        self.inferences = 0
+        self.tracked_frames = 0
+
+    def step(self, img, infer):
+        """Landmarks for this frame, from infer(img) on keyframes or from tracking otherwise."""
+        gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+        h, w = gray.shape
+        tracked = self._track(gray, w, h) if self.landmarks is not None else None
+
+        if tracked is not None and self.since_keyframe + 1 < self.interval:
+            self.since_keyframe += 1
+            self.tracked_frames += 1
+            self.landmarks, self.prev_gray = tracked, gray
+            return tracked
+
+        landmarks = infer(img)
+        self.inferences += 1
+        self.since_keyframe = 0
+        self._adapt(tracked, landmarks, w, h)
+        self.landmarks, self.prev_gray = landmarks, gray
+        return landmarks
+
+    def _track(self, gray, w, h):
+        """Landmarks propagated from the previous frame, or None when tracking is unreliable."""
+        scale = np.array([w, h], dtype=np.float32)
+        prev_points = (self.landmarks[:, :2] * scale).reshape(-1, 1, 2)
+        points, status, error = cv.calcOpticalFlowPyrLK(self.prev_gray, gray, prev_points, None, **LK_PARAMS)
+        if points is None:
+            return None
+
+        visible = self.landmarks[:, 3] >= self.min_visibility
+        found = status.ravel() == 1
+        if not visible.any() or np.mean(~found[visible]) > self.max_lost_fraction:
+            return None
+        if np.mean(error.ravel()[visible & found]) > self.max_flow_error:
+            return None
+
+        motion = np.linalg.norm(points - prev_points, axis=2).ravel()
+        if np.median(motion[visible & found]) > self.motion_px:
+            # Moving subject: keep the track, but make the next frame a keyframe
+            self.interval = 1
+
+        tracked = self.landmarks.copy()
+        tracked[found, :2] = points.reshape(-1, 2)[found] / scale
+        return tracked
+
+    def _adapt(self, tracked, landmarks, w, h):
+        """Grow or shrink the keyframe interval from how well tracking matched inference."""
+        if tracked is None or landmarks is None:
+            self.interval = 1
+            return
+        drift = np.abs(segment_lengths(tracked, w, h) - segment_lengths(landmarks, w, h))
+        if drift.max() > self.tolerance_px:
+            self.interval = max(1, self.interval // 2)
+        else:
+            self.interval = min(self.max_interval, self.interval + 1)
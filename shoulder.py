@@ -1,11 +1,14 @@
-import cv2
-import mediapipe as mp
-import math
-import numpy as np
+import argparse
 
-# Initialize Mediapipe Pose
-mpPose = mp.solutions.pose
-pose = mpPose.Pose()
+import cv2
+from body_measurement import FRAME_TIMEOUT, FrameBuffers, model_input
+from capture import FrameGrabber
+from estimator import StreamingEstimator
+from measurement_store import DEFAULT_STORE, MeasurementStore, new_session_id
+from landmark_filter import LandmarkFilter
+from model_pool import create_pose
+from landmarks import (LEFT_SHOULDER, RIGHT_SHOULDER, SEGMENT_INDEX, landmarks_to_array,
+                       segment_lengths, segment_visibility, to_pixels)
 
 # Calibrate the scaling factor using a known reference object (in cm)
 known_object_size_cm = 30  # Example: Known size of reference object in cm (e.g., ruler)
@@ -13,76 +16,93 @@ known_object_pixel_size = 100  # Measured pixel size of the reference object in
 
 # Calculate the scaling factor for converting pixels to cm
 scaling_factor = known_object_size_cm / known_object_pixel_size
-print(f"Calibration Scaling Factor: {scaling_factor} cm per pixel")
 
-# Function to save the overall average measurement to a file
-def save_overall_average_to_file(overall_average):
-    with open('measurement.txt', 'a') as file:
-        file.write(f"Shoulder Width: {overall_average:.2f} cm\n")
-    print(f"Overall average saved to 'measurement.txt': {overall_average:.2f} cm")
+# Function to save the overall average measurement to the measurement store
+def save_overall_average(overall_average, estimator, session_id):
+    with MeasurementStore() as store:
+        store.record(session_id, "shoulder", overall_average, estimator.count,
+                     estimator.variance, {"shoulder": scaling_factor})
+    print(f"Overall average saved to '{DEFAULT_STORE}' as session {session_id}: {overall_average:.2f} cm")
 
 # Function to detect shoulder distance in the video feed
-def detect_shoulder_distance_in_video():
-    capture = cv2.VideoCapture(0)  # Capture video from the default camera
+def detect_shoulder_distance_in_video(session_id=None):
+    print(f"Calibration Scaling Factor: {scaling_factor} cm per pixel")
+    capture = FrameGrabber(0)  # Capture video from the default camera
     if not capture.isOpened():
         print("Error: Camera not accessible!")
         return
+
+    # One session id per run, so the other scripts can add to the same subject's session
+    session_id = session_id or new_session_id()
+
+    # Build the pose model when a measurement starts rather than on import
+    pose = create_pose()
+    landmark_filter = LandmarkFilter()  # Smooths landmark jitter before measuring
+    buffers = FrameBuffers()  # Reused for the RGB conversion, so frames allocate nothing
     
-    all_measurements = []  # Store all measurements for averaging
+    estimator = StreamingEstimator()  # Running average of all measurements
     
     print("Starting camera feed...")  # Debug message
-    while True:
-        isTrue, img = capture.read()
-        if not isTrue:
-            print("Failed to capture image.")
-            break
-
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        result = pose.process(img_rgb)
+    try:
+        while True:
+            # Newest frame, stamped with when it was captured, for the landmark filter
+            isTrue, img, captured_at = capture.read_latest(FRAME_TIMEOUT)
+            if not isTrue:
+                print("Failed to capture image.")
+                break
+
+            img_rgb = model_input(img, buffers)
+            result = pose.process(img_rgb)
         
-        # Check if landmarks are detected
-        if result.pose_landmarks:
-            landmarks = result.pose_landmarks.landmark
-            h, w, c = img.shape
-            left_shoulder = landmarks[mpPose.PoseLandmark.LEFT_SHOULDER.value]
-            right_shoulder = landmarks[mpPose.PoseLandmark.RIGHT_SHOULDER.value]
-
-            # Calculate pixel distance between shoulders
-            left_shoulder_x, left_shoulder_y = int(left_shoulder.x * w), int(left_shoulder.y * h)
-            right_shoulder_x, right_shoulder_y = int(right_shoulder.x * w), int(right_shoulder.y * h)
-            distance_pixels_shoulder = math.sqrt((left_shoulder_x - right_shoulder_x) ** 2 + 
-                                                 (left_shoulder_y - right_shoulder_y) ** 2)
-            shoulder_width_cm = distance_pixels_shoulder * scaling_factor
-
-            # Add measurement to the list
-            all_measurements.append(shoulder_width_cm)
-
-            # Draw landmarks and shoulder line
-            cv2.circle(img, (left_shoulder_x, left_shoulder_y), 10, (0, 255, 0), -1)
-            cv2.circle(img, (right_shoulder_x, right_shoulder_y), 10, (0, 255, 255), -1)
-            cv2.line(img, (left_shoulder_x, left_shoulder_y), 
-                     (right_shoulder_x, right_shoulder_y), (255, 0, 255), 2)
-            cv2.putText(img, f"Shoulder Width: {int(shoulder_width_cm)} cm", (50, 100), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-
-        # Show the video feed
-        cv2.imshow("Shoulder Measurement", img)
-
-        # Exit on 'q' key press
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            print("Exiting program.")
-            break
-
-    capture.release()
-    cv2.destroyAllWindows()
+            # Check if landmarks are detected
+            landmarks = landmark_filter(landmarks_to_array(result), captured_at)
+            if landmarks is not None:
+                h, w, c = img.shape
+                points = to_pixels(landmarks, w, h).astype(int).tolist()
+                left_shoulder_x, left_shoulder_y = points[LEFT_SHOULDER]
+                right_shoulder_x, right_shoulder_y = points[RIGHT_SHOULDER]
+
+                # Calculate pixel distance between shoulders
+                distance_pixels_shoulder = segment_lengths(landmarks, w, h)[SEGMENT_INDEX["shoulder"]]
+                shoulder_width_cm = distance_pixels_shoulder * scaling_factor
+
+                # Add measurement to the running average
+                estimator.update(shoulder_width_cm, segment_visibility(landmarks)[SEGMENT_INDEX["shoulder"]])
+
+                # Draw landmarks and shoulder line
+                cv2.circle(img, (left_shoulder_x, left_shoulder_y), 10, (0, 255, 0), -1)
+                cv2.circle(img, (right_shoulder_x, right_shoulder_y), 10, (0, 255, 255), -1)
+                cv2.line(img, (left_shoulder_x, left_shoulder_y), 
+                         (right_shoulder_x, right_shoulder_y), (255, 0, 255), 2)
+                cv2.putText(img, f"Shoulder Width: {int(shoulder_width_cm)} cm", (50, 100), 
+                            cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+            # Show the video feed
+            cv2.imshow("Shoulder Measurement", img)
+
+            # Exit on 'q' key press
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("Exiting program.")
+                break
+
+            # Stop by itself once the average is stable
+            if estimator.converged:
+                print("Shoulder measurement converged.")
+                break
+    finally:
+        capture.release()
+        cv2.destroyAllWindows()
+        pose.close()
 
     # Calculate and save the overall average
-    if all_measurements:
-        overall_average = np.mean(all_measurements)
-        save_overall_average_to_file(overall_average)
+    if estimator.count:
+        overall_average = estimator.mean
+        save_overall_average(overall_average, estimator, session_id)
     else:
         print("No measurements were captured to calculate the average.")
 
 # Run the main function
 if __name__ == "__main__":
-    detect_shoulder_distance_in_video()
+    parser = argparse.ArgumentParser(description="Measure the shoulder width from the camera.")
+    parser.add_argument('--session', help="session id to record under, to group it with the other measurements")
+    detect_shoulder_distance_in_video(parser.parse_args().session)
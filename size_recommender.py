@@ -0,0 +1,238 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from body_measurement import HISTORY_WINDOWS
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional; indexes then fall back to a brute-force search
+    cKDTree = None
+
+# Measurement columns of a size chart, in the order of every vector below
+MEASUREMENTS = list(HISTORY_WINDOWS)
+
+# Roughly one size step (cm) per measurement, so every dimension weighs the same in the index
+DIMENSION_SCALES = np.array([6.0, 2.0, 3.0, 4.0, 4.0, 3.0])
+
+# How far (cm) a body may be from a chart value and still fit, unless a brand overrides it
+DEFAULT_TOLERANCES = {"height": 5.0, "shoulder": 2.0, "arm": 3.0, "chest": 4.0, "waist": 4.0, "lower_length": 3.0}
+
+CHUNK_ROWS = 50000
+
+
+class CatalogIndex:
+    """The size chart rows of one catalog file, with their spatial index.
+
+    Charts often leave some measurements out (NaN). Rows are grouped by
+    which measurements they give, and each group gets a k-d tree over
+    just those columns, standardized by DIMENSION_SCALES.
+    """
+
+    def __init__(self, skus, brands, sizes, values):
+        self.skus = np.asarray(skus, dtype=object)
+        self.brands = np.asarray(brands, dtype=object)
+        self.sizes = np.asarray(sizes, dtype=object)
+        self.values = np.asarray(values, dtype=np.float64).reshape(-1, len(MEASUREMENTS))
+        defined = ~np.isnan(self.values)
+        self.groups = []
+        for mask in np.unique(defined, axis=0):
+            if not mask.any():
+                continue
+            rows = np.flatnonzero((defined == mask).all(axis=1))
+            points = self.values[np.ix_(rows, mask)] / DIMENSION_SCALES[mask]
+            tree = cKDTree(points) if cKDTree is not None else None
+            self.groups.append((mask, rows, points, tree))
+
+    def __len__(self):
+        return len(self.values)
+
+    def candidates(self, scan, count):
+        """Row indices of the `count` charts per group nearest to the scan.
+
+        A group that uses a measurement the scan does not have is searched
+        by brute force over the measurements both give, as is every group
+        when scipy is not installed.
+        """
+        have = ~np.isnan(scan)
+        found = []
+        for mask, rows, points, tree in self.groups:
+            shared = have[mask]
+            if not shared.any():
+                continue
+            query = scan[mask & have] / DIMENSION_SCALES[mask & have]
+            k = min(count, len(rows))
+            if tree is not None and shared.all():
+                _, nearest = tree.query(query, k=k)
+                nearest = np.atleast_1d(nearest)
+            else:
+                distances = ((points[:, shared] - query) ** 2).sum(axis=1)
+                nearest = np.argpartition(distances, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            found.append(rows[nearest])
+        return np.concatenate(found) if found else np.zeros(0, dtype=int)
+
+
+def read_catalog(path, chunk_rows=CHUNK_ROWS):
+    """Index a CSV size chart with sku, brand, size and measurement columns (cm).
+
+    Missing or empty measurement columns mean the chart does not give them.
+    The file is parsed `chunk_rows` rows at a time into arrays, so a large
+    catalog never holds its parsed CSV rows in memory all at once.
+    """
+    columns = {"skus": [], "brands": [], "sizes": [], "values": []}
+    with open(path, newline='') as file:
+        rows = []
+        for row in csv.DictReader(file):
+            rows.append(row)
+            if len(rows) >= chunk_rows:
+                _append_rows(columns, rows)
+                rows = []
+        _append_rows(columns, rows)
+    return CatalogIndex(*(np.concatenate(parts) if parts else np.zeros(0) for parts in columns.values()))
+
+
+def _append_rows(columns, rows):
+    if not rows:
+        return
+    columns["skus"].append(np.array([row["sku"] for row in rows], dtype=object))
+    columns["brands"].append(np.array([row["brand"] for row in rows], dtype=object))
+    columns["sizes"].append(np.array([row["size"] for row in rows], dtype=object))
+    columns["values"].append(np.array([[float(row[name]) if row.get(name) else np.nan for name in MEASUREMENTS]
+                                       for row in rows]))
+
+
+def load_tolerances(path):
+    """Per-brand tolerances: {"brand": {"chest": 3, ...}}; unlisted values use DEFAULT_TOLERANCES."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+class SizeCatalog:
+    """Size charts from any number of catalog files, loaded and indexed incrementally.
+
+    refresh() only reads files that are new or changed since they were last
+    loaded, and drops files that disappeared, so a running kiosk picks up
+    catalog updates without reindexing the rest. Each file has its own
+    CatalogIndex.
+    """
+
+    def __init__(self, tolerances=None, chunk_rows=CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        self.files = {}
+        self.brand_tolerances = {}
+        default = np.array([DEFAULT_TOLERANCES[name] for name in MEASUREMENTS])
+        self.default_tolerances = default
+        for brand, overrides in (tolerances or {}).items():
+            self.brand_tolerances[brand] = np.array([overrides.get(name, default[i])
+                                                     for i, name in enumerate(MEASUREMENTS)])
+
+    def load(self, path):
+        index = read_catalog(path, self.chunk_rows)
+        # Resolve every row's brand tolerances once, so lookups only index arrays
+        index.tolerances = self.tolerances(index.brands).reshape(-1, len(MEASUREMENTS))
+        self.files[path] = (os.path.getmtime(path), index)
+
+    def refresh(self, paths):
+        """Load new or modified catalog files; returns the paths that were (re)loaded."""
+        loaded = []
+        for path in paths:
+            known = self.files.get(path)
+            if known is None or known[0] != os.path.getmtime(path):
+                self.load(path)
+                loaded.append(path)
+        for path in set(self.files) - set(paths):
+            del self.files[path]
+        return loaded
+
+    def indexes(self):
+        return [index for _, index in self.files.values()]
+
+    def __len__(self):
+        return sum(len(index) for index in self.indexes())
+
+    def tolerances(self, brands):
+        """(rows, measurements) tolerances for an array of brand names."""
+        return np.array([self.brand_tolerances.get(brand, self.default_tolerances) for brand in brands])
+
+    def recommend(self, measurements, top=5, per_brand=1, candidates=32):
+        """Best-fitting sizes for one scan: {name: cm} with None for measurements it lacks.
+
+        Each index proposes its `candidates` nearest charts, which are then
+        scored against the scan with their brand's tolerances: the score is
+        the RMS of the differences in units of tolerance over the
+        measurements both give, and a size fits when every difference is
+        within tolerance. Returns up to `top` recommendations, best first,
+        with at most `per_brand` per brand.
+        """
+        scan = np.array([np.nan if measurements.get(name) is None else float(measurements[name])
+                         for name in MEASUREMENTS])
+        results = []
+        for index in self.indexes():
+            rows = index.candidates(scan, candidates)
+            if len(rows) == 0:
+                continue
+            ratio = np.abs(index.values[rows] - scan) / index.tolerances[rows]
+            compared = ~np.isnan(ratio)
+            ratio = np.where(compared, ratio, 0.0)
+            scores = np.sqrt((ratio ** 2).sum(axis=1) / np.maximum(compared.sum(axis=1), 1))
+            fits = (ratio <= 1.0).all(axis=1)
+            for i in np.argsort(scores)[:top * max(per_brand, 1) * 4]:
+                results.append((not fits[i], float(scores[i]), index, rows[i]))
+
+        results.sort(key=lambda result: result[:2])
+        recommendations = []
+        counts = {}
+        for misfit, score, index, row in results:
+            brand = index.brands[row]
+            if counts.get(brand, 0) >= per_brand:
+                continue
+            counts[brand] = counts.get(brand, 0) + 1
+            recommendations.append({
+                "sku": index.skus[row],
+                "brand": brand,
+                "size": index.sizes[row],
+                "score": round(score, 3),
+                "fits": not misfit,
+            })
+            if len(recommendations) >= top:
+                break
+        return recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recommend garment sizes for a set of body measurements.")
+    parser.add_argument('catalogs', nargs='+', help="CSV size charts (sku, brand, size and measurement columns)")
+    parser.add_argument('--tolerances', help="JSON file with per-brand tolerances (cm)")
+    parser.add_argument('--measurements', required=True,
+                        help="JSON of {name: cm}, inline or a file, e.g. '{\"height\": 172, \"chest\": 96}'")
+    parser.add_argument('--top', type=int, default=5, help="number of recommendations")
+    parser.add_argument('--per-brand', type=int, default=1, help="recommendations allowed per brand")
+    args = parser.parse_args()
+
+    catalog = SizeCatalog(load_tolerances(args.tolerances))
+    started = time.perf_counter()
+    catalog.refresh(args.catalogs)
+    print(f"Indexed {len(catalog)} sizes in {time.perf_counter() - started:.2f} s")
+
+    if os.path.exists(args.measurements):
+        with open(args.measurements) as file:
+            measurements = json.load(file)
+    else:
+        measurements = json.loads(args.measurements)
+    started = time.perf_counter()
+    recommendations = catalog.recommend(measurements, args.top, args.per_brand)
+    print(f"Lookup took {(time.perf_counter() - started) * 1000:.2f} ms")
+    for recommendation in recommendations:
+        fit = "fits" if recommendation["fits"] else "closest"
+        print(f"{recommendation['brand']} {recommendation['size']} ({recommendation['sku']}): "
+              f"score {recommendation['score']}, {fit}")
+
+
+if __name__ == "__main__":
+    main()
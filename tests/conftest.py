@@ -0,0 +1,11 @@
+import pytest
+
+import model_pool
+from tests import fake_pose
+
+
+@pytest.fixture
+def fake_mediapipe(monkeypatch):
+    """Make model_pool build FakePose graphs instead of importing mediapipe."""
+    monkeypatch.setattr(model_pool, "pose_solution", fake_pose.solution)
+    return fake_pose
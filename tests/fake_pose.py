@@ -0,0 +1,74 @@
+"""A stand-in for mediapipe's Pose solution, so the pipeline runs without the model.
+
+FakePose returns landmarks from a callable of the frame index (a fixed,
+upright standing pose by default), with optional Gaussian jitter and a
+segmentation mask covering the middle of the frame.
+"""
+import types
+
+import numpy as np
+
+from landmarks import (LEFT_ANKLE, LEFT_HIP, LEFT_SHOULDER, LEFT_WRIST, NOSE, NUM_LANDMARKS, RIGHT_ANKLE, RIGHT_HIP,
+                       RIGHT_SHOULDER)
+
+
+def standing_pose():
+    """(33, 4) normalized landmarks of a person standing in the middle of the frame."""
+    landmarks = np.zeros((NUM_LANDMARKS, 4), dtype=np.float32)
+    landmarks[:, 0] = 0.5
+    landmarks[:, 1] = np.linspace(0.1, 0.9, NUM_LANDMARKS)
+    landmarks[:, 3] = 0.95
+    landmarks[NOSE, :2] = (0.5, 0.1)
+    landmarks[LEFT_SHOULDER, :2] = (0.4, 0.25)
+    landmarks[RIGHT_SHOULDER, :2] = (0.6, 0.25)
+    landmarks[LEFT_WRIST, :2] = (0.35, 0.55)
+    landmarks[LEFT_HIP, :2] = (0.45, 0.55)
+    landmarks[RIGHT_HIP, :2] = (0.55, 0.55)
+    landmarks[LEFT_ANKLE, :2] = (0.45, 0.9)
+    landmarks[RIGHT_ANKLE, :2] = (0.55, 0.9)
+    return landmarks
+
+
+class FakePose:
+    def __init__(self, landmarks=None, jitter=0.0, seed=0, enable_segmentation=False, **options):
+        self.landmarks = landmarks or (lambda index: standing_pose())
+        self.jitter = jitter
+        self.rng = np.random.default_rng(seed)
+        self.enable_segmentation = enable_segmentation
+        self.options = options
+        self.frames = 0
+        self.resets = 0
+        self.closed = False
+
+    def process(self, img):
+        landmarks = self.landmarks(self.frames)
+        self.frames += 1
+        mask = None
+        if self.enable_segmentation:
+            h, w = img.shape[:2]
+            mask = np.zeros((h, w), dtype=np.float32)
+            mask[:, int(w * 0.4):int(w * 0.6)] = 1.0
+        if landmarks is None:
+            return types.SimpleNamespace(pose_landmarks=None, segmentation_mask=mask)
+        landmarks = np.array(landmarks, dtype=np.float64)
+        if self.jitter:
+            landmarks[:, :2] += self.rng.normal(0, self.jitter, (len(landmarks), 2))
+        points = [types.SimpleNamespace(x=x, y=y, z=z, visibility=v) for x, y, z, v in landmarks]
+        return types.SimpleNamespace(pose_landmarks=types.SimpleNamespace(landmark=points), segmentation_mask=mask)
+
+    def reset(self):
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def solution(**defaults):
+    """Namespace shaped like mp.solutions.pose whose Pose() builds FakePose graphs."""
+    return types.SimpleNamespace(Pose=lambda **options: FakePose(**{**defaults, **options}))
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from analytics import KINDS, MeasurementAnalytics, OnlineMoments, Reservoir
+from measurement_store import MeasurementStore
+
+
+def test_moments_merged_in_chunks_equal_one_pass():
+    rows = np.random.default_rng(0).normal([170, 90, 40], [8, 6, 3], (1000, 3))
+    moments = OnlineMoments(3)
+    for chunk in np.array_split(rows, [1, 7, 300, 301, 650]):
+        moments.update(chunk)
+    moments.update(rows[:0])
+    assert moments.count == 1000
+    assert np.allclose(moments.mean, rows.mean(axis=0))
+    assert np.allclose(moments.covariance(), np.cov(rows, rowvar=False))
+    assert np.allclose(moments.correlation(), np.corrcoef(rows, rowvar=False))
+
+
+def test_moments_of_fewer_than_two_rows_are_nan():
+    moments = OnlineMoments(2)
+    moments.update(np.ones((1, 2)))
+    assert np.isnan(moments.covariance()).all()
+
+
+def test_reservoir_keeps_everything_until_full():
+    reservoir = Reservoir(10, 1)
+    reservoir.update(np.arange(4.0)[:, None])
+    reservoir.update(np.arange(4.0, 10.0)[:, None])
+    assert reservoir.rows[:, 0].tolist() == list(range(10))
+    assert reservoir.seen == 10
+
+
+def test_reservoir_sample_is_uniform_over_the_stream():
+    # Each of 100 rows should be kept with probability 10 / 100, whatever chunk it came in
+    kept = np.zeros(100)
+    for seed in range(2000):
+        reservoir = Reservoir(10, 1, seed=seed)
+        for chunk in np.array_split(np.arange(100.0)[:, None], [3, 10, 60]):
+            reservoir.update(chunk)
+        assert len(reservoir.rows) == 10 and reservoir.seen == 100
+        kept[reservoir.rows[:, 0].astype(int)] += 1
+    assert len(np.unique(reservoir.rows)) == 10
+    frequency = kept / 2000
+    assert frequency.mean() == pytest.approx(0.1)
+    # Early, middle and late rows are all kept as often
+    for part in np.array_split(frequency, 4):
+        assert part.mean() == pytest.approx(0.1, abs=0.01)
+
+
+def record_sessions(path, rows, first=0):
+    with MeasurementStore(path) as store:
+        for i, row in enumerate(rows, first):
+            for kind, value in zip(KINDS, row):
+                if np.isfinite(value):
+                    store.record(f"s{i}", kind, value)
+            store.record_truth(f"s{i}", KINDS[0], row[0] - 1.0)
+
+
+def test_incremental_refresh_matches_a_full_rebuild(tmp_path):
+    store, state = str(tmp_path / "store.db"), str(tmp_path / "state.npz")
+    rows = np.random.default_rng(1).normal(100, 10, (60, len(KINDS)))
+    rows[5, 1] = np.nan
+
+    record_sessions(store, rows[:25])
+    MeasurementAnalytics(store, state, chunk_size=len(KINDS) * 4).refresh()
+    record_sessions(store, rows[25:], first=25)
+    # A new instance resumes from the saved state and reads only the new sessions
+    incremental = MeasurementAnalytics(store, state, chunk_size=len(KINDS) * 4)
+    incremental.refresh()
+
+    full = MeasurementAnalytics(store, None)
+    full.refresh()
+    complete = rows[~np.isnan(rows).any(axis=1)]
+    assert incremental.sessions == full.sessions == 60
+    assert incremental.moments.count == len(complete)
+    assert np.allclose(incremental.moments.comoment, full.moments.comoment)
+    assert np.allclose(incremental.moments.mean, complete.mean(axis=0))
+    assert np.allclose(incremental.minimum, np.nanmin(rows, axis=0))
+    errors = incremental.errors.summary()
+    assert errors["count"][0] == 60
+    assert errors["bias"][0] == pytest.approx(1.0)
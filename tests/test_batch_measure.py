@@ -0,0 +1,46 @@
+import types
+
+import numpy as np
+import pytest
+
+import model_pool
+from batch_measure import measure_many
+from benchmark import make_synthetic_video
+from calibration import CameraCalibration
+from landmarks import SEGMENT_INDEX, segment_lengths
+from tests import fake_pose
+from tests.fake_pose import standing_pose
+
+SIZE = (160, 120)
+
+
+def test_failing_files_are_reported_and_the_rest_measured(tmp_path, fake_mediapipe):
+    video = make_synthetic_video(str(tmp_path / "a.avi"), frames=10, size=SIZE)
+    jobs = {job["path"]: job for job in measure_many([video, str(tmp_path / "missing.mp4")], processes=1)}
+    assert jobs[video]["error"] is None
+    assert jobs[video]["results"]["height"] == pytest.approx(
+        segment_lengths(standing_pose(), *SIZE)[SEGMENT_INDEX["height"]] * 0.5, abs=0.01)
+    assert "missing.mp4" in jobs[str(tmp_path / "missing.mp4")]["error"]
+
+
+def test_files_are_measured_through_the_camera_calibration(tmp_path, fake_mediapipe):
+    video = make_synthetic_video(str(tmp_path / "a.avi"), frames=10, size=SIZE)
+    # 0.25 cm per pixel of a 640x480 view
+    calibration = CameraCalibration(np.diag([0.25, 0.25, 1.0]), (640, 480), None)
+    [job] = measure_many([video], processes=1, camera_calibration=calibration)
+    expected = calibration.segment_lengths(standing_pose())[SEGMENT_INDEX["height"]]
+    assert job["results"]["height"] == pytest.approx(expected, abs=0.01)
+
+
+def test_workers_close_their_pose_graphs(tmp_path, monkeypatch):
+    closed = tmp_path / "closed"
+
+    class ClosingPose(fake_pose.FakePose):
+        def close(self):
+            with open(closed, 'a') as file:
+                file.write("closed\n")
+
+    monkeypatch.setattr(model_pool, "pose_solution", lambda: types.SimpleNamespace(Pose=ClosingPose))
+    video = make_synthetic_video(str(tmp_path / "a.avi"), frames=3, size=SIZE)
+    assert all(job["error"] is None for job in measure_many([video] * 3, processes=2))
+    assert closed.read_text().splitlines() == ["closed", "closed"]
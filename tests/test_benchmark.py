@@ -0,0 +1,12 @@
+from benchmark import benchmark_pipeline, make_synthetic_video
+
+
+def test_benchmark_times_the_shipped_pipeline(tmp_path, fake_mediapipe):
+    video = make_synthetic_video(str(tmp_path / "fixture.avi"), frames=12, size=(320, 240))
+    run = benchmark_pipeline(video, display=True)
+    assert run["frames"] == 12
+    assert run["synthetic_landmark_frames"] == 0
+    for stage in ("capture", "convert", "pose", "filtering", "recording", "geometry", "aggregation", "display",
+                  "output"):
+        assert run["stages"][stage]["count"] > 0, stage
+    assert run["stages"]["pose"]["count"] == 12
@@ -0,0 +1,24 @@
+import numpy as np
+
+from body_measurement import DisplayStage, FrameBuffers
+
+
+def test_frame_buffers_reuse_memory_per_name():
+    buffers = FrameBuffers()
+    first = buffers.get("rgb", (4, 6, 3))
+    smaller = buffers.get("rgb", (2, 3, 3))
+    assert np.shares_memory(first, smaller)
+    assert not np.shares_memory(first, buffers.get("resized", (4, 6, 3)))
+
+
+def test_display_draws_on_its_own_copy():
+    img = np.full((120, 160, 3), 50, dtype=np.uint8)
+    original = img.copy()
+
+    def overlay(frame):
+        frame[:10] = 255
+
+    drawn = DisplayStage(max_fps=0).draw(img, overlay=overlay)
+    assert np.array_equal(img, original)
+    assert not np.shares_memory(drawn, img)
+    assert drawn[:10].min() == 255 and np.array_equal(drawn[10:], original[10:])
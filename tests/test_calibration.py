@@ -0,0 +1,85 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from calibration import MARKER_DICTIONARY, CalibrationCache, calibrate
+from tests.fake_pose import standing_pose
+
+# Homography from the marker plane (cm) into a 640x480 image, seen slightly from the side
+PLANE_TO_IMAGE = np.array([[6.0, 0.4, 220.0], [0.2, 5.5, 140.0], [0.0004, 0.0002, 1.0]])
+
+
+def marker_scene(size_cm=20.0, plane_to_image=PLANE_TO_IMAGE, shape=(480, 640)):
+    """Grey frame showing one ArUco marker of size_cm, warped by plane_to_image."""
+    dictionary = cv.aruco.getPredefinedDictionary(getattr(cv.aruco, MARKER_DICTIONARY))
+    marker = cv.aruco.generateImageMarker(dictionary, 0, 200)
+    # White border so the detector sees the marker's black outline
+    marker = cv.copyMakeBorder(marker, 20, 20, 20, 20, cv.BORDER_CONSTANT, value=255)
+    cm_per_px = size_cm / 200
+    marker_to_plane = np.array([[cm_per_px, 0, -20 * cm_per_px], [0, cm_per_px, -20 * cm_per_px], [0, 0, 1]])
+    warp = plane_to_image @ marker_to_plane
+    img = cv.warpPerspective(marker, warp, shape[::-1], borderValue=160)
+    return cv.cvtColor(img, cv.COLOR_GRAY2BGR)
+
+
+def test_calibration_recovers_plane_lengths():
+    calibration = calibrate(marker_scene())
+    assert calibration is not None
+
+    # Two points 30 cm apart on the plane, in normalized image coordinates
+    plane = np.array([[0.0, 0.0], [30.0, 0.0]])
+    image = cv.perspectiveTransform(plane.reshape(-1, 1, 2), PLANE_TO_IMAGE).reshape(-1, 2)
+    assert np.linalg.norm(np.diff(calibration.to_cm(image), axis=0)) == pytest.approx(30.0, rel=0.02)
+
+    normalized = image / calibration.frame_size
+    center = normalized.mean(axis=0)
+    span = normalized[1, 0] - normalized[0, 0]
+    assert calibration.width_cm((center[0], normalized[0, 1]), span) == pytest.approx(30.0, rel=0.03)
+
+
+def test_segment_lengths_do_not_depend_on_resolution():
+    calibration = calibrate(marker_scene())
+    landmarks = standing_pose()
+    lengths = calibration.segment_lengths(landmarks)
+    assert np.all(lengths > 0)
+    small = calibrate(cv.resize(marker_scene(), (320, 240)))
+    assert small.segment_lengths(landmarks) == pytest.approx(lengths, rel=0.03)
+
+
+def test_no_marker_no_calibration():
+    assert calibrate(np.full((480, 640, 3), 160, dtype=np.uint8)) is None
+
+
+def test_cache_keeps_calibration_until_camera_moves(tmp_path):
+    cache = CalibrationCache(str(tmp_path / "calibration.json"))
+    img = marker_scene()
+    first = cache.for_frame(0, img)
+    assert cache.for_frame(0, img) is first
+    assert CalibrationCache(cache.path).get(0).homography == pytest.approx(first.homography)
+
+    shifted = np.roll(img, 40, axis=1)
+    assert first.moved(shifted)
+    assert cache.for_frame(0, shifted) is not first
+
+
+def test_failed_recalibration_keeps_cached_entry(tmp_path):
+    cache = CalibrationCache(str(tmp_path / "calibration.json"))
+    first = cache.for_frame(0, marker_scene())
+    blocked = np.full((480, 640, 3), 40, dtype=np.uint8)
+    assert first.moved(blocked)
+    assert cache.for_frame(0, blocked) is None
+    assert cache.get(0) is first
+    assert CalibrationCache(cache.path).get(0) is not None
+
+
+def test_save_keeps_cameras_saved_by_other_caches(tmp_path):
+    path = str(tmp_path / "calibration.json")
+    calibration = calibrate(marker_scene())
+    kiosk_a, kiosk_b = CalibrationCache(path), CalibrationCache(path)
+    kiosk_a.put(0, calibration)
+    kiosk_b.put(1, calibration)
+    assert set(CalibrationCache(path).calibrations) == {"0", "1"}
+
+    kiosk_a.invalidate(0)
+    assert set(CalibrationCache(path).calibrations) == {"1"}
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["calibration.json"]
@@ -0,0 +1,83 @@
+import time
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from body_measurement import camera_frames
+from capture import FrameGrabber
+from metrics import MetricsRegistry
+
+
+def numbered_video(path, frames, fps=30, size=(64, 48)):
+    """Video whose i-th frame is uniformly grey level 10 * i."""
+    writer = cv.VideoWriter(str(path), cv.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def frame_number(img):
+    return round(img.mean() / 10)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_keeps_only_the_newest_frame_and_counts_the_rest(tmp_path):
+    grabber = FrameGrabber(numbered_video(tmp_path / "clip.avi", 12), buffer_size=2)
+    try:
+        wait_until(lambda: grabber.stopped)
+        assert grabber.dropped == 10
+        isTrue, img, captured_at = grabber.read_latest()
+        assert isTrue and frame_number(img) == 11
+        assert captured_at <= time.monotonic()
+        # Reading the newest frame drops the older one still buffered
+        assert grabber.dropped == 11
+        assert grabber.read_latest() == (False, None, None)
+        assert grabber.read() == (False, None)
+    finally:
+        grabber.release()
+
+
+def test_read_latest_waits_for_a_frame_up_to_the_timeout(tmp_path):
+    # Played at 4 fps, so the first frame is about 0.25 s away
+    grabber = FrameGrabber(numbered_video(tmp_path / "clip.avi", 3, fps=4), realtime=True)
+    try:
+        started = time.monotonic()
+        assert grabber.read_latest(timeout=0.05) == (False, None, None)
+        assert time.monotonic() - started < 0.2
+        isTrue, img, _ = grabber.read_latest(timeout=2)
+        assert isTrue and frame_number(img) == 0
+        assert grabber.dropped == 0
+    finally:
+        grabber.release()
+
+
+@pytest.mark.parametrize("read", [lambda g: g.read_latest(), lambda g: g.read_latest(timeout=5)[:1],
+                                  lambda g: g.read()[:1]])
+def test_source_that_does_not_open_never_blocks(tmp_path, read):
+    grabber = FrameGrabber(str(tmp_path / "missing.mp4"))
+    assert not grabber.isOpened()
+    assert grabber.stopped
+    started = time.monotonic()
+    assert read(grabber)[0] is False
+    assert time.monotonic() - started < 1
+    grabber.release()
+
+
+def test_camera_frames_give_up_on_a_silent_camera(tmp_path):
+    # Still open, but its first frame is a second away
+    grabber = FrameGrabber(numbered_video(tmp_path / "clip.avi", 3, fps=1), realtime=True)
+    try:
+        started = time.monotonic()
+        assert list(camera_frames(grabber, MetricsRegistry(), timeout=0.1)) == []
+        assert time.monotonic() - started < 0.5
+        assert not grabber.stopped
+    finally:
+        grabber.release()
@@ -0,0 +1,114 @@
+import numpy as np
+
+from estimator import StreamingEstimator
+
+
+def feed(estimator, values):
+    return [estimator.update(value) for value in values]
+
+
+def test_mean_and_variance_match_numpy():
+    values = np.random.default_rng(0).normal(100, 2, 500)
+    estimator = StreamingEstimator(outlier_threshold=100)
+    feed(estimator, values)
+    assert estimator.count == 500
+    assert np.isclose(estimator.mean, values.mean())
+    assert np.isclose(estimator.variance, values.var(ddof=1))
+
+
+def test_window_average_uses_last_values_only():
+    estimator = StreamingEstimator(window=5)
+    feed(estimator, [1, 2, 3, 4, 5, 6, 7])
+    assert estimator.value == np.mean([3, 4, 5, 6, 7])
+
+
+def test_invisible_and_non_finite_frames_are_rejected():
+    estimator = StreamingEstimator()
+    assert not estimator.update(10.0, visibility=0.1)
+    assert not estimator.update(float('nan'))
+    assert estimator.count == 0 and estimator.rejected == 2
+
+
+def test_single_outlier_is_rejected():
+    rng = np.random.default_rng(1)
+    estimator = StreamingEstimator()
+    feed(estimator, 150 + rng.normal(0, 0.3, 50))
+    assert not estimator.update(190.0)
+    assert abs(estimator.value - 150) < 0.2
+
+
+def test_level_shift_is_followed():
+    rng = np.random.default_rng(2)
+    estimator = StreamingEstimator(window=20)
+    feed(estimator, 150 + rng.normal(0, 0.3, 100))
+    accepted = feed(estimator, 170 + rng.normal(0, 0.3, 200))
+    assert sum(accepted) > 180
+    assert abs(estimator.value - 170) < 0.3
+    assert estimator.converged
+
+
+def test_small_level_shift_is_followed_without_window():
+    rng = np.random.default_rng(3)
+    estimator = StreamingEstimator()
+    feed(estimator, 150 + rng.normal(0, 0.1, 100))
+    feed(estimator, 152 + rng.normal(0, 0.1, 300))
+    assert abs(estimator.value - 152) < 0.1
+    assert estimator.restarts == 1
+
+
+def test_not_converged_right_after_a_shift():
+    rng = np.random.default_rng(4)
+    estimator = StreamingEstimator()
+    feed(estimator, 150 + rng.normal(0, 0.3, 100))
+    assert estimator.converged
+    feed(estimator, 170 + rng.normal(0, 0.3, estimator.restart_after))
+    assert estimator.count < estimator.min_samples
+    assert not estimator.converged
+
+
+def test_correlated_values_need_more_frames_to_converge():
+    rng = np.random.default_rng(3)
+    noise = rng.normal(0, 1.5, 400)
+    # The same noise after a first-order low-pass, like smoothed landmarks
+    smoothed = np.empty_like(noise)
+    smoothed[0] = noise[0]
+    for i in range(1, len(noise)):
+        smoothed[i] = 0.2 * noise[i] + 0.8 * smoothed[i - 1]
+
+    independent = StreamingEstimator(outlier_threshold=100)
+    correlated = StreamingEstimator(outlier_threshold=100)
+    feed(independent, 100 + noise)
+    feed(correlated, 100 + smoothed)
+    assert independent.autocorrelation < 0.2
+    assert 0.6 < correlated.autocorrelation < 0.95
+    assert correlated.effective_count < correlated.count / 4
+    assert correlated.half_width > 2 * independent.half_width * correlated.std / independent.std
+
+
+def test_restart_forgets_the_autocorrelation():
+    estimator = StreamingEstimator(outlier_threshold=100)
+    feed(estimator, np.linspace(100, 110, 50))
+    assert estimator.autocorrelation > 0.5
+    estimator.restart()
+    assert estimator.pairs == 0 and estimator.autocorrelation == 0.0
+
+
+def test_converged_value_is_the_estimate_the_interval_describes():
+    outside = 0
+    for seed in range(100):
+        rng = np.random.default_rng(seed)
+        noise = rng.normal(0, 3, 600)
+        smoothed = np.empty_like(noise)
+        smoothed[0] = noise[0]
+        for i in range(1, len(noise)):
+            smoothed[i] = 0.3 * noise[i] + 0.7 * smoothed[i - 1]
+        estimator = StreamingEstimator(window=17)
+        for value in 100 + smoothed:
+            estimator.update(value)
+            if estimator.converged:
+                break
+        assert estimator.converged
+        assert estimator.value == estimator.mean
+        outside += abs(estimator.value - 100) > estimator.tolerance
+    # The window average of the last 17 frames misses the tolerance about a third of the time
+    assert outside <= 20
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from landmark_filter import LandmarkFilter
+from tests.fake_pose import standing_pose
+
+
+def jittered(rng, sigma=0.003):
+    landmarks = standing_pose().astype(np.float64)
+    landmarks[:, :2] += rng.normal(0, sigma, (len(landmarks), 2))
+    return landmarks
+
+
+def test_first_frame_passes_through_and_visibility_is_kept():
+    landmarks = jittered(np.random.default_rng(0))
+    landmarks[:, 3] = np.linspace(0, 1, len(landmarks))
+    assert np.array_equal(LandmarkFilter()(landmarks, 0.0), landmarks)
+
+
+def test_reduces_jitter_at_rest():
+    rng = np.random.default_rng(1)
+    landmark_filter = LandmarkFilter()
+    raw = np.array([jittered(rng) for _ in range(300)])
+    filtered = np.array([landmark_filter(frame, i / 30) for i, frame in enumerate(raw)])
+    ratio = filtered[50:, :, :2].std(axis=0).mean() / raw[50:, :, :2].std(axis=0).mean()
+    assert ratio < 0.5
+
+
+def test_follows_movement_with_little_lag():
+    landmark_filter = LandmarkFilter()
+    for i in range(60):
+        landmarks = standing_pose().astype(np.float64)
+        landmarks[:, 0] += 0.5 * i / 30
+        filtered = landmark_filter(landmarks, i / 30)
+    # Under one frame of motion behind, where a plain 1 Hz low-pass would trail by about five
+    assert landmarks[:, 0] - filtered[:, 0] == pytest.approx(np.full(len(landmarks), 0.0), abs=0.5 / 30)
+
+
+def test_uses_the_time_between_frames():
+    landmarks = standing_pose().astype(np.float64)
+    moved = landmarks.copy()
+    moved[:, 0] += 0.05
+    results = []
+    for dt in (1 / 30, 1.0):
+        landmark_filter = LandmarkFilter(beta=0.0)
+        landmark_filter(landmarks, 0.0)
+        results.append(landmark_filter(moved, dt)[:, 0].mean())
+    # After a long gap the new position is trusted far more than after one frame
+    assert results[1] > results[0] + 0.02
+
+
+def test_streams_are_independent_and_released_streams_start_fresh():
+    rng = np.random.default_rng(2)
+    together = LandmarkFilter()
+    alone = LandmarkFilter()
+    a = [jittered(rng) for _ in range(20)]
+    b = [jittered(rng) + 0.1 for _ in range(20)]
+    for i in range(20):
+        both = together.update(["a", "b"], np.stack([a[i], b[i]]), i / 30)
+        assert np.allclose(both[0], alone.update(["a"], a[i][None], i / 30)[0])
+
+    together.release("a")
+    assert np.array_equal(together.update(["a"], b[0][None], 1.0)[0], b[0])
+    together.retain([])
+    assert together.slots == {}
+
+
+def test_settings_round_trip():
+    landmark_filter = LandmarkFilter(min_cutoff=0.7, beta=3.0, d_cutoff=2.0, rate=25.0)
+    assert LandmarkFilter.from_json(landmark_filter.to_json()).to_json() == landmark_filter.to_json()
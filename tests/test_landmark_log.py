@@ -0,0 +1,71 @@
+import struct
+
+import numpy as np
+import pytest
+
+from body_measurement import calibrated_calculators, process_frames, summarize
+from calibration import CameraCalibration
+from landmark_filter import LandmarkFilter
+from landmark_log import LandmarkLog, read_landmark_log, recompute_measurements
+from metrics import MetricsRegistry
+from model_pool import create_pose
+from tests.fake_pose import standing_pose
+
+CALIBRATION = CameraCalibration(np.array([[0.3, 0.01, -20.0], [0.0, 0.31, -5.0], [0.0, 0.0001, 1.0]]),
+                                (640, 480), np.zeros((120, 160)))
+
+
+def visible_with_gaps(index):
+    """The standing pose, except for a few frames where nobody is in view."""
+    return None if 20 <= index < 24 else standing_pose()
+
+
+def record_session(path, camera_calibration=None, frames=60, landmark_filter=None):
+    # Uneven frame times, as from a camera that drops frames now and then
+    times = np.cumsum(np.where(np.arange(frames) % 7 == 3, 2, 1)) / 30
+    frames = [(t, np.zeros((480, 640, 3), dtype=np.uint8)) for t in times]
+    with create_pose(landmarks=visible_with_gaps, jitter=0.004) as pose, LandmarkLog(path) as log:
+        estimators = process_frames(frames, pose, calibrated_calculators(camera_calibration), recorder=log,
+                                    metrics=MetricsRegistry(), camera_calibration=camera_calibration,
+                                    landmark_filter=landmark_filter)
+    return summarize(estimators)
+
+
+@pytest.mark.parametrize("camera_calibration", [None, CALIBRATION], ids=["uncalibrated", "calibrated"])
+@pytest.mark.parametrize("filtered", [False, True], ids=["raw", "filtered"])
+def test_recompute_matches_live_session(tmp_path, fake_mediapipe, camera_calibration, filtered):
+    path = str(tmp_path / "session.lmk")
+    landmark_filter = LandmarkFilter(min_cutoff=0.5, beta=5.0) if filtered else None
+    live = record_session(path, camera_calibration, landmark_filter=landmark_filter)
+    assert recompute_measurements(path) == live
+
+
+def test_recompute_can_try_other_filter_settings(tmp_path, fake_mediapipe):
+    path = str(tmp_path / "session.lmk")
+    live = record_session(path, landmark_filter=LandmarkFilter())
+    assert read_landmark_log(path)[3]["landmark_filter"] == LandmarkFilter().to_json()
+    assert recompute_measurements(path, landmark_filter=LandmarkFilter(beta=0.0)) != live
+
+
+def test_calibration_is_stored_in_the_header(tmp_path, fake_mediapipe):
+    path = str(tmp_path / "session.lmk")
+    record_session(path, CALIBRATION, frames=3)
+    records, w, h, metadata = read_landmark_log(path)
+    assert (len(records), w, h) == (3, 640, 480)
+    assert np.allclose(metadata["calibration"]["homography"], CALIBRATION.homography)
+
+    # Appending a session measured with another calibration would mix two scales in one log
+    with pytest.raises(ValueError):
+        record_session(path, None, frames=3)
+
+
+def test_reads_logs_without_metadata(tmp_path):
+    path = tmp_path / "old.lmk"
+    landmarks = standing_pose()
+    record = np.zeros((), dtype=[("timestamp", "<f8"), ("landmarks", "<f4", landmarks.shape)])
+    record["landmarks"] = landmarks
+    path.write_bytes(struct.pack("<8sII", b"IVSLMK01", 640, 480) + record.tobytes() * 2)
+
+    records, w, h, metadata = read_landmark_log(str(path))
+    assert (len(records), w, h, metadata) == (2, 640, 480, {})
+    assert records["landmarks"][1] == pytest.approx(landmarks)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmark import make_synthetic_video
+from measurement_service import MeasurementService
+from measurement_store import MeasurementStore
+
+pytestmark = pytest.mark.usefixtures("fake_mediapipe")
+
+
+async def request(port, method, path, body=b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), head.decode(), payload
+
+
+def json_lines(payload):
+    """JSON lines of a chunked response body."""
+    lines = []
+    for part in payload.split(b"\r\n"):
+        part = part.strip()
+        if part.startswith(b"{"):
+            lines.append(json.loads(part))
+    return lines
+
+
+def run_service(scenario, **options):
+    """Run scenario(service, port) against a service listening on a free local port."""
+    service = MeasurementService(**{"workers": 1, "store_path": None, **options})
+
+    async def main():
+        await service.start()
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        try:
+            return await scenario(service, server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+
+    try:
+        return asyncio.run(main())
+    finally:
+        service.pool.shutdown()
+
+
+async def new_session(port):
+    status, _, payload = await request(port, "POST", "/sessions")
+    assert status == 201
+    return json.loads(payload)["session_id"]
+
+
+def test_unreadable_clip_is_rejected_before_streaming():
+    async def scenario(service, port):
+        session_id = await new_session(port)
+        return await request(port, "POST", f"/sessions/{session_id}/clip", b"not a video at all")
+
+    status, head, payload = run_service(scenario)
+    assert status == 400
+    assert "chunked" not in head
+    assert json.loads(payload) == {"error": "Body is not a readable video"}
+
+
+def test_unreadable_photo_is_rejected():
+    async def scenario(service, port):
+        session_id = await new_session(port)
+        return await request(port, "POST", f"/sessions/{session_id}/frames", b"\x00" * 16)
+
+    status, _, _ = run_service(scenario)
+    assert status == 400
+
+
+def test_unexpected_errors_return_500(monkeypatch):
+    async def scenario(service, port):
+        async def broken(*args):
+            raise RuntimeError("boom")
+        monkeypatch.setattr(service, "route", broken)
+        return await request(port, "GET", "/sessions")
+
+    status, _, payload = run_service(scenario)
+    assert status == 500
+    assert "error" in json.loads(payload)
+
+
+def test_clip_streams_partial_results(tmp_path):
+    clip = make_synthetic_video(str(tmp_path / "clip.avi"), frames=10, size=(160, 120))
+    with open(clip, 'rb') as file:
+        body = file.read()
+
+    async def scenario(service, port):
+        session_id = await new_session(port)
+        return await request(port, "POST", f"/sessions/{session_id}/clip", body)
+
+    status, head, payload = run_service(scenario, max_batch=4)
+    lines = json_lines(payload)
+    assert status == 200 and "chunked" in head
+    assert [line["frames"] for line in lines] == [4, 8, 10, 10]
+    assert lines[-1]["done"]
+
+
+def test_idle_sessions_are_saved_as_incomplete(tmp_path):
+    store = str(tmp_path / "store.db")
+    clip = make_synthetic_video(str(tmp_path / "clip.avi"), frames=5, size=(160, 120))
+    with open(clip, 'rb') as file:
+        body = file.read()
+
+    async def scenario(service, port):
+        abandoned = await new_session(port)
+        await request(port, "POST", f"/sessions/{abandoned}/clip", body)
+        active = await new_session(port)
+        service.sessions[abandoned].last_seen -= 3600
+        await service.expire_idle()
+        return abandoned, active, set(service.sessions)
+
+    abandoned, active, remaining = run_service(scenario, store_path=store, session_timeout=600)
+    assert remaining == {active}
+    with MeasurementStore(store) as saved:
+        records = saved.by_session(abandoned)
+    assert {record.kind for record in records} == {"height", "shoulder", "arm", "chest", "waist", "lower_length"}
+    assert all(record.calibration["incomplete"] and record.frame_count == 5 for record in records)
@@ -0,0 +1,83 @@
+import multiprocessing
+import sqlite3
+
+from measurement_store import MeasurementRecord, MeasurementStore
+
+WRITERS = 4
+SESSIONS_PER_WRITER = 50
+
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path / "store.db")
+    with MeasurementStore(path) as store:
+        store.record("s1", "height", 172.5, 40, 0.25, {"height": 0.5}, recorded_at=100.0)
+        store.record_session("s2", {"chest": (96.0, 30, 1.5), "waist": (None, 0, 0.0)}, {"chest": 1.0})
+        store.record("s1", "arm", 61, recorded_at=101.0)
+        store.record_truth("s1", "height", 171.0)
+
+    with MeasurementStore(path) as store:
+        assert store.by_session("s1") == [
+            MeasurementRecord("s1", "height", 172.5, 40, 0.25, {"height": 0.5}, 100.0),
+            MeasurementRecord("s1", "arm", 61.0, 0, None, None, 101.0),
+        ]
+        [chest] = store.by_session("s2")
+        assert (chest.kind, chest.value, chest.frame_count, chest.calibration) == ("chest", 96.0, 30, {"chest": 1.0})
+        assert [record.kind for record in store.in_range(100.0, 101.0)] == ["height"]
+        assert [record.session_id for record in store.in_range(kind="chest")] == ["s2"]
+        assert store.last_ids() == (3, 1)
+        assert [record.kind for _, record in store.measurements_between(1, 3)] == ["chest", "arm"]
+        assert list(store.truth_pairs((0, 3), (0, 1))) == [("height", 172.5, 171.0)]
+
+
+def test_records_are_written_in_batches(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = MeasurementStore(path, batch_size=3)
+    reader = sqlite3.connect(path)
+    try:
+        for i in range(2):
+            store.record("s", "height", i)
+        assert reader.execute("SELECT COUNT(*) FROM measurements").fetchone()[0] == 0
+        store.record("s", "height", 2)
+        assert reader.execute("SELECT COUNT(*) FROM measurements").fetchone()[0] == 3
+        assert store.pending == []
+    finally:
+        store.close()
+        reader.close()
+
+
+def test_close_writes_pending_records(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = MeasurementStore(path)
+    store.record("s", "height", 170.0)
+    store.record_truth("s", "height", 169.0)
+    store.close()
+    with MeasurementStore(path) as store:
+        assert store.last_ids() == (1, 1)
+
+
+def write_sessions(path, writer):
+    with MeasurementStore(path, batch_size=7, timeout=30) as store:
+        for i in range(SESSIONS_PER_WRITER):
+            store.record_session(f"w{writer}-{i}", {"height": (170.0 + i, 10, 0.1), "waist": (80.0, 10, 0.1)})
+
+
+def test_concurrent_writers_lose_nothing(tmp_path):
+    path = str(tmp_path / "store.db")
+    # Create the schema first, so every writer only appends
+    MeasurementStore(path).close()
+    processes = [multiprocessing.Process(target=write_sessions, args=(path, writer)) for writer in range(WRITERS)]
+    for process in processes:
+        process.start()
+    # Reading while the writers run never blocks them in WAL mode
+    with MeasurementStore(path) as reader:
+        while any(process.is_alive() for process in processes):
+            list(reader.in_range())
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    with MeasurementStore(path) as store:
+        assert store.connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        rows = list(store.measurements_between(0, store.last_ids()[0]))
+    assert [row_id for row_id, _ in rows] == list(range(1, WRITERS * SESSIONS_PER_WRITER * 2 + 1))
+    assert len({record.session_id for _, record in rows}) == WRITERS * SESSIONS_PER_WRITER
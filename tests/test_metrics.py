@@ -0,0 +1,94 @@
+import re
+import urllib.request
+
+import pytest
+
+from metrics import Histogram, MetricsRegistry, serve_metrics, write_metrics
+
+
+def parse(text):
+    """{(name, labels text): value} of the samples, and the HELP and TYPE lines by name."""
+    samples, help_lines, types = {}, {}, {}
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            name, _, help_text = line[7:].partition(" ")
+            assert name not in help_lines, f"second HELP for {name}"
+            help_lines[name] = help_text
+        elif line.startswith("# TYPE "):
+            name, _, kind = line[7:].partition(" ")
+            types[name] = kind
+        else:
+            match = re.fullmatch(r'([a-z_]+)(?:\{(.*)\})? (\S+)', line)
+            assert match, line
+            samples[match[1], match[2] or ""] = float(match[3])
+    return samples, help_lines, types
+
+
+def test_counter_gauge_and_histogram_updates():
+    registry = MetricsRegistry()
+    frames = registry.counter("frames_total", "Frames")
+    frames.inc()
+    frames.inc(4)
+    assert registry.counter("frames_total") is frames and frames.value == 5
+    registry.gauge("queue_depth", "Queued frames").set(7)
+    assert registry.gauge("queue_depth").value == 7
+
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    # Bounds are inclusive ("le"), and values above the last one land in +Inf
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4 and histogram.sum == pytest.approx(3.65)
+
+
+def test_render_uses_the_exposition_format():
+    registry = MetricsRegistry(prefix="ivs_")
+    registry.counter("frames_total", "Frames processed").inc(3)
+    registry.gauge("queue_depth", "Queued frames").set(2.5)
+    for stage, seconds in [("pose", 0.02), ("pose", 0.2), ("pose", 9.0), ("capture", 0.0001)]:
+        registry.histogram("stage_seconds", "Stage latency", {"stage": stage}).observe(seconds)
+
+    samples, help_lines, types = parse(registry.render())
+    assert types == {"ivs_frames_total": "counter", "ivs_queue_depth": "gauge", "ivs_stage_seconds": "histogram"}
+    assert help_lines["ivs_stage_seconds"] == "Stage latency"
+    assert samples["ivs_frames_total", ""] == 3
+    assert samples["ivs_queue_depth", ""] == 2.5
+
+    buckets = [(labels, value) for (name, labels), value in samples.items()
+               if name == "ivs_stage_seconds_bucket" and labels.startswith('stage="pose"')]
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts), "buckets must be cumulative"
+    assert buckets[-1][0] == 'stage="pose",le="+Inf"'
+    assert counts[-1] == samples["ivs_stage_seconds_count", 'stage="pose"'] == 3
+    assert samples["ivs_stage_seconds_bucket", 'stage="pose",le="0.025"'] == 1
+    assert samples["ivs_stage_seconds_bucket", 'stage="pose",le="0.25"'] == 2
+    assert samples["ivs_stage_seconds_sum", 'stage="pose"'] == pytest.approx(9.22)
+    assert samples["ivs_stage_seconds_count", 'stage="capture"'] == 1
+
+
+def test_timer_records_into_the_stage_histogram():
+    registry = MetricsRegistry()
+    with registry.timer("geometry"):
+        pass
+    with pytest.raises(ValueError):
+        with registry.timer("geometry"):
+            raise ValueError
+    assert registry.histogram("stage_seconds", labels={"stage": "geometry"}).count == 2
+
+
+def test_metrics_are_served_and_written(tmp_path):
+    registry = MetricsRegistry()
+    registry.counter("frames_total", "Frames").inc()
+    server = serve_metrics(registry, port=0, host="127.0.0.1")
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain")
+            assert response.read().decode() == registry.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    path = tmp_path / "metrics.prom"
+    write_metrics(str(path), registry)
+    assert path.read_text() == registry.render()
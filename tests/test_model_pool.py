@@ -0,0 +1,55 @@
+import threading
+import time
+import types
+
+import pytest
+
+import model_pool
+from model_pool import PosePool
+
+
+@pytest.fixture
+def failing_mediapipe(monkeypatch):
+    """Pose solution whose graphs fail to build after `release` is set."""
+    release = threading.Event()
+
+    def broken(**options):
+        release.wait(5)
+        raise RuntimeError("model file missing")
+
+    monkeypatch.setattr(model_pool, "pose_solution", lambda: types.SimpleNamespace(Pose=broken))
+    return release
+
+
+def test_acquire_reuses_and_resets_graphs(fake_mediapipe):
+    pool = PosePool(size=1)
+    with pool.acquire() as first:
+        pass
+    with pool.acquire() as second:
+        pass
+    assert second is first
+    assert pool.created == 1
+    assert first.resets >= 2
+
+
+def test_failed_background_build_is_raised_by_waiting_acquire(failing_mediapipe):
+    pool = PosePool(size=1)
+    pool.warm(background=True)
+    while pool.created == 0:
+        time.sleep(0.001)
+
+    threading.Timer(0.05, failing_mediapipe.set).start()
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="model file missing"):
+        with pool.acquire(timeout=5):
+            pass
+    assert time.monotonic() - started < 2
+    assert pool.created == 0
+
+
+def test_acquire_times_out_when_every_graph_is_in_use(fake_mediapipe):
+    pool = PosePool(size=1)
+    with pool.acquire():
+        with pytest.raises(TimeoutError):
+            with pool.acquire(timeout=0.05):
+                pass
@@ -0,0 +1,64 @@
+import threading
+
+import numpy as np
+import pytest
+
+from benchmark import make_synthetic_video
+from calibration import CameraCalibration
+from capture import FrameGrabber
+from multi_camera import (DEFAULT_VIEW_SCALE, KioskRig, ellipse_circumference, front_calculators, measure_fused,
+                          synchronized_frames)
+from tests.fake_pose import standing_pose
+
+
+def collect(generator, timeout=10):
+    """Every item of a generator, failing the test instead of hanging if it does not end."""
+    items = []
+    thread = threading.Thread(target=lambda: items.extend(generator), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "generator did not end"
+    return items
+
+
+def test_synchronized_frames_ends_when_a_source_never_opened(tmp_path):
+    video = make_synthetic_video(str(tmp_path / "front.avi"), frames=5, size=(160, 120))
+    grabbers = {"front": FrameGrabber(video), "side": FrameGrabber(str(tmp_path / "missing.mp4"))}
+    try:
+        sets = collect(synchronized_frames(grabbers, max_skew=1.0, timeout=0.1))
+    finally:
+        for grabber in grabbers.values():
+            grabber.release()
+    assert sets
+    assert all(set(frames) == {"front"} for _, frames in sets)
+
+
+def test_kiosk_rig_refuses_a_camera_that_does_not_open(tmp_path):
+    video = make_synthetic_video(str(tmp_path / "front.avi"), frames=5, size=(160, 120))
+    with pytest.raises(IOError, match="side camera"):
+        KioskRig("kiosk", {"front": video, "side": str(tmp_path / "missing.mp4")}, pool=None)
+
+
+def views(w=640, h=480, width=100.0, depth=60.0):
+    landmarks = standing_pose()
+    return {"front": (landmarks, w, h, {"chest": width, "waist": width}),
+            "side": (landmarks, w, h, {"chest": depth, "waist": depth})}
+
+
+def test_fused_circumference_uses_each_camera_calibration():
+    front = CameraCalibration(np.diag([0.5, 0.5, 1.0]), (640, 480), np.zeros((120, 160)))
+    side = CameraCalibration(np.diag([0.25, 0.25, 1.0]), (640, 480), np.zeros((120, 160)))
+    calibrated = measure_fused(views(), front_calculators(), {"front": front, "side": side})
+    uncalibrated = measure_fused(views(), front_calculators())
+
+    # 100 px at 0.5 cm/px across, 60 px at 0.25 cm/px deep: an ellipse with axes 50 and 15 cm
+    assert calibrated["chest"][0] == pytest.approx(ellipse_circumference(50, 15))
+    assert uncalibrated["chest"][0] == pytest.approx(
+        ellipse_circumference(100 * DEFAULT_VIEW_SCALE, 60 * DEFAULT_VIEW_SCALE))
+
+
+def test_calibrated_width_does_not_depend_on_resolution():
+    calibration = CameraCalibration(np.diag([0.5, 0.5, 1.0]), (640, 480), np.zeros((120, 160)))
+    full = measure_fused(views(640, 480, 100, 60), front_calculators(), {"front": calibration, "side": calibration})
+    half = measure_fused(views(320, 240, 50, 30), front_calculators(), {"front": calibration, "side": calibration})
+    assert half["chest"][0] == pytest.approx(full["chest"][0])
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import batch_measure
+from multi_person import CrowdMeasurer, PersonTracker, chunks, expand_box, iou, measure_crowd
+
+
+def shifted(box, dx):
+    return box[0] + dx, box[1], box[2] + dx, box[3]
+
+
+LEFT = (100, 50, 200, 350)
+RIGHT = (400, 50, 500, 350)
+
+
+def test_iou():
+    assert iou(LEFT, LEFT) == 1.0
+    assert iou(LEFT, RIGHT) == 0.0
+    assert iou((0, 0, 10, 10), (5, 0, 15, 10)) == pytest.approx(50 / 150)
+    assert iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+
+def test_tracks_keep_their_ids_while_people_move():
+    tracker = PersonTracker()
+    first = tracker.update([LEFT, RIGHT])
+    ids = {track.box: track.track_id for track in first}
+    assert sorted(ids.values()) == [1, 2]
+
+    for step in range(1, 10):
+        # Listed in the other order, each moving 10 px a frame
+        seen = tracker.update([shifted(RIGHT, -10 * step), shifted(LEFT, 10 * step)])
+        assert {track.box[0]: track.track_id for track in seen} == {RIGHT[0] - 10 * step: ids[RIGHT],
+                                                                     LEFT[0] + 10 * step: ids[LEFT]}
+    assert len(tracker.tracks) == 2
+
+
+def test_each_box_matches_at_most_one_track():
+    tracker = PersonTracker()
+    tracker.update([LEFT])
+    seen = tracker.update([LEFT, shifted(LEFT, 5)])
+    assert sorted(track.track_id for track in seen) == [1, 2]
+
+
+def test_unmatched_tracks_finish_after_max_misses():
+    tracker = PersonTracker(max_misses=2)
+    tracker.update([LEFT, RIGHT])
+    for _ in range(2):
+        tracker.update([LEFT])
+    assert [track.track_id for track in tracker.finished] == []
+    tracker.update([LEFT])
+    assert [track.track_id for track in tracker.finished] == [2]
+    assert [track.track_id for track in tracker.tracks] == [1]
+
+    # Someone stepping back in later is a new subject
+    assert [track.track_id for track in tracker.update([LEFT, RIGHT]) if track.box == RIGHT] == [3]
+
+
+def test_expand_box_and_chunks():
+    assert expand_box((10, 10, 20, 30), 100, 100) == (8, 6, 23, 35)
+    assert expand_box((0, 0, 100, 100), 100, 100) == (0, 0, 100, 100)
+    assert chunks([1, 2, 3, 4, 5], 2) == [[1, 2, 3], [4, 5]]
+    assert chunks([1], 4) == [[1]]
+
+
+class FixedDetector:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+    def detect(self, img):
+        return self.boxes
+
+
+def test_crowd_measurer_keeps_each_person_separate(fake_mediapipe):
+    batch_measure.init_worker({"static_image_mode": True})
+    img = np.zeros((400, 600, 3), dtype=np.uint8)
+    with ThreadPoolExecutor(1) as pool:
+        measurer = CrowdMeasurer(pool, 2, FixedDetector([LEFT, RIGHT]), detect_every=3)
+        for i in range(9):
+            measured = measurer.process(img, i / 30)
+            assert sorted(track.track_id for track in measured) == [1, 2]
+
+    tracks = {track.track_id: track for track in measurer.all_tracks()}
+    assert all(track.frames == 9 for track in tracks.values())
+    assert set(measurer.landmark_filter.slots) == {1, 2}
+    # Both crops see the same figure, so both subjects measure the same, at their own place in the frame
+    assert tracks[1].estimators["height"].value == pytest.approx(tracks[2].estimators["height"].value)
+    assert tracks[1].body[2] < tracks[2].body[0]
+
+
+def test_camera_that_does_not_open_is_an_error():
+    with pytest.raises(IOError, match="camera 99"):
+        measure_crowd(99, workers=1, store_path=None)
@@ -0,0 +1,28 @@
+import pytest
+
+from benchmark import make_synthetic_video
+from landmark_filter import LandmarkFilter
+from landmark_log import read_landmark_log
+from offline import measure_offline
+
+pytestmark = pytest.mark.usefixtures("fake_mediapipe")
+
+
+@pytest.fixture
+def video(tmp_path):
+    return make_synthetic_video(str(tmp_path / "clip.avi"), frames=20, size=(320, 240))
+
+
+def test_recordings_are_filtered_like_a_live_scan(tmp_path, video):
+    path = str(tmp_path / "session.lmk")
+    results = measure_offline(video, store_path=None, record_path=path)
+    records, w, h, metadata = read_landmark_log(path)
+    assert (len(records), w, h) == (20, 320, 240)
+    assert metadata["landmark_filter"] == LandmarkFilter().to_json()
+    assert set(results) == {"height", "shoulder", "arm", "chest", "waist", "lower_length"}
+
+
+def test_filter_can_be_turned_off(tmp_path, video):
+    path = str(tmp_path / "session.lmk")
+    measure_offline(video, store_path=None, record_path=path, use_filter=False)
+    assert "landmark_filter" not in read_landmark_log(path)[3]
@@ -0,0 +1,65 @@
+import numpy as np
+
+from body_measurement import default_calculators, process_frames
+from person_gate import PersonGate
+from tests.fake_pose import FakePose, standing_pose
+
+EMPTY = np.full((240, 320, 3), 30, dtype=np.uint8)
+PERSON = np.full((240, 320, 3), 200, dtype=np.uint8)
+
+
+class PresencePose(FakePose):
+    """FakePose that only finds the standing pose in bright frames."""
+
+    def __init__(self):
+        super().__init__()
+        self.inferences = 0
+
+    def process(self, img):
+        self.inferences += 1
+        self.landmarks = (lambda index: standing_pose()) if img.mean() > 100 else (lambda index: None)
+        return super().process(img)
+
+
+def test_empty_frames_skip_inference_until_a_full_frame_retry():
+    gate = PersonGate(check_every=3, full_frame_every=10)
+    assert not gate.person_present(EMPTY)
+    prepared = [gate.prepare(EMPTY) for _ in range(10)]
+    assert all(img is None and roi is None for img, roi in prepared[:9])
+    assert gate.skipped == 9
+    # Cascades miss people now and then, so every full_frame_every-th frame is tried anyway
+    img, roi = prepared[9]
+    assert roi == (0, 0, 320, 240) and img.shape == EMPTY.shape
+
+
+def test_crops_to_the_person_and_readmits_them_after_they_leave():
+    gate = PersonGate(check_every=1)
+    gate.person_present = lambda img: img.mean() > 100
+    assert gate.prepare(EMPTY) == (None, None)
+
+    img, roi = gate.prepare(PERSON)
+    assert roi == (0, 0, 320, 240)
+    landmarks = gate.update(standing_pose(), roi, 320, 240)
+    assert np.allclose(landmarks, standing_pose())
+    x0, y0, x1, y1 = gate.roi
+    assert 0 < x0 and x1 < 320
+    crop, roi = gate.prepare(PERSON)
+    assert roi == gate.roi and crop.shape == (y1 - y0, x1 - x0, 3)
+
+    # Pose lost: back to presence checks, and in again once someone is seen
+    assert gate.update(None, roi, 320, 240) is None
+    assert gate.prepare(EMPTY) == (None, None)
+    assert gate.prepare(PERSON)[1] == (0, 0, 320, 240)
+
+
+def test_gated_scan_skips_empty_frames_and_measures_the_person_when_back():
+    frames = [PERSON] * 20 + [EMPTY] * 40 + [PERSON] * 40
+    gate = PersonGate(check_every=2)
+    gate.person_present = lambda img: img.mean() > 100
+    pose = PresencePose()
+    estimators = process_frames(iter(frames), pose, default_calculators(), gate=gate)
+
+    assert gate.skipped >= 35
+    assert pose.inferences <= len(frames) - 35
+    # Every person frame but the one spent finding them again is measured
+    assert estimators["shoulder"].count >= 58
@@ -0,0 +1,110 @@
+import cv2 as cv
+import numpy as np
+import pytest
+
+from body_measurement import default_calculators, process_frames
+from landmarks import segment_lengths
+from scheduler import KeyframeScheduler
+from tests.fake_pose import FakePose, standing_pose
+
+W, H = 320, 240
+TEXTURE = cv.GaussianBlur(np.random.default_rng(0).integers(0, 256, (H, W)).astype(np.uint8), (0, 0), 2)
+
+
+def scene(scale):
+    """Textured frame zoomed by `scale` about its centre, and the pose at that zoom."""
+    matrix = cv.getRotationMatrix2D((W / 2, H / 2), 0, scale)
+    img = cv.cvtColor(cv.warpAffine(TEXTURE, matrix, (W, H), borderMode=cv.BORDER_REFLECT), cv.COLOR_GRAY2BGR)
+    landmarks = standing_pose()
+    landmarks[:, :2] = 0.5 + (landmarks[:, :2] - 0.5) * scale
+    return img, landmarks
+
+
+class ScenePose(FakePose):
+    """FakePose that answers with the true pose of the frame it is given."""
+
+    def __init__(self, poses):
+        super().__init__()
+        self.poses = poses
+        self.inferences = 0
+
+    def process(self, img):
+        self.inferences += 1
+        # The frame number is written into the top-left pixel
+        self.landmarks = lambda index, pose=self.poses[int(img[0, 0, 0])]: pose
+        return super().process(img)
+
+
+def zooming_frames(scales):
+    frames, poses = [], []
+    for i, scale in enumerate(scales):
+        img, landmarks = scene(scale)
+        img[0, 0] = i
+        frames.append(img)
+        poses.append(landmarks)
+    return frames, poses
+
+
+def test_keyframe_interval_grows_while_the_track_agrees():
+    img, landmarks = scene(1.0)
+    scheduler = KeyframeScheduler(max_interval=4)
+    keyframes = []
+    for i in range(30):
+        calls = []
+        scheduler.step(img, lambda frame: calls.append(frame) or landmarks)
+        if calls:
+            keyframes.append(i)
+    # Intervals of 1, 2, 3, then max_interval
+    assert keyframes[:6] == [0, 1, 3, 6, 10, 14]
+    assert scheduler.interval == 4
+    assert scheduler.inferences == len(keyframes) and scheduler.tracked_frames == 30 - len(keyframes)
+
+
+def test_fast_motion_and_lost_poses_force_inference():
+    still, landmarks = scene(1.0)
+    scheduler = KeyframeScheduler(max_interval=8)
+    for _ in range(12):
+        scheduler.step(still, lambda frame: landmarks)
+    while scheduler.since_keyframe:
+        scheduler.step(still, lambda frame: landmarks)
+    assert scheduler.interval > 2
+
+    def step(img, answer):
+        calls = []
+        scheduler.step(img, lambda frame: calls.append(frame) or answer)
+        return bool(calls)
+
+    assert not step(still, landmarks)
+    # Moving 10 px in a frame is more than motion_px, so the frame is inferred despite the interval
+    moved = np.roll(still, 10, axis=1)
+    shifted = landmarks.copy()
+    shifted[:, 0] += 10 / W
+    assert step(moved, shifted)
+
+    # A keyframe finding nobody leaves nothing to track, so every frame is inferred until someone is found
+    while not step(moved, None):
+        pass
+    assert scheduler.interval == 1 and scheduler.landmarks is None
+    assert step(moved, None)
+    assert step(moved, shifted)
+    # The first keyframe back has no track to check, the second confirms it
+    assert step(moved, shifted)
+    assert not step(moved, shifted)
+
+
+def test_scheduled_scan_stays_within_tolerance_of_every_frame_inference():
+    # The subject walks slowly towards the camera, growing by 0.2% a frame
+    frames, poses = zooming_frames(1 + 0.002 * np.arange(120))
+    every_frame_pose = ScenePose(poses)
+    every_frame = process_frames(iter(frames), every_frame_pose, default_calculators())
+    scheduled_pose = ScenePose(poses)
+    scheduler = KeyframeScheduler()
+    scheduled = process_frames(iter(frames), scheduled_pose, default_calculators(), scheduler=scheduler)
+
+    assert scheduled_pose.inferences < every_frame_pose.inferences / 3
+    for name, estimator in every_frame.items():
+        assert scheduled[name].count == estimator.count
+        assert scheduled[name].value == pytest.approx(estimator.value, abs=estimator.tolerance), name
+    # Tracked frames stay within tolerance_px of the true pose
+    tracked = segment_lengths(scheduler.landmarks, W, H)
+    assert np.abs(tracked - segment_lengths(poses[-1], W, H)).max() <= scheduler.tolerance_px
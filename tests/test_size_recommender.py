@@ -0,0 +1,107 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+
+import size_recommender
+from size_recommender import MEASUREMENTS, CatalogIndex, SizeCatalog, read_catalog
+
+BODY = {"height": 176.0, "shoulder": 45.0, "arm": 61.0, "chest": 98.0, "waist": 84.0, "lower_length": 102.0}
+
+
+def write_catalog(path, rows):
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, ["sku", "brand", "size", *MEASUREMENTS])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({name: "" if value is None else value for name, value in row.items()})
+    return str(path)
+
+
+def chart(sku, brand, size, step, **overrides):
+    """A chart row `step` size steps away from BODY, with overrides (None leaves a column out)."""
+    values = {name: BODY[name] + step * scale for name, scale in zip(MEASUREMENTS, size_recommender.DIMENSION_SCALES)}
+    return {"sku": sku, "brand": brand, "size": size, **values, **overrides}
+
+
+def random_index(seed=0, rows=500):
+    rng = np.random.default_rng(seed)
+    values = np.array([BODY[name] for name in MEASUREMENTS]) + rng.normal(0, 10, (rows, len(MEASUREMENTS)))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    names = [f"r{i}" for i in range(rows)]
+    return CatalogIndex(names, ["brand"] * rows, names, values)
+
+
+@pytest.mark.parametrize("scan_missing", [[], ["arm"], ["height", "waist"]])
+def test_tree_candidates_match_a_brute_force_search(monkeypatch, scan_missing):
+    scan = np.array([np.nan if name in scan_missing else BODY[name] for name in MEASUREMENTS])
+    with_tree = random_index().candidates(scan, 5)
+    monkeypatch.setattr(size_recommender, "cKDTree", None)
+    brute_force = random_index().candidates(scan, 5)
+    assert sorted(with_tree) == sorted(brute_force)
+
+
+def test_candidates_are_nearest_over_the_columns_a_chart_gives():
+    index = random_index(rows=300)
+    scan = np.array([BODY[name] for name in MEASUREMENTS])
+    found = set(index.candidates(scan, 3).tolist())
+    for mask, rows, points, _ in index.groups:
+        distances = np.sqrt((((index.values[rows][:, mask] - scan[mask]) / size_recommender.DIMENSION_SCALES[mask])
+                             ** 2).sum(axis=1))
+        assert set(rows[np.argsort(distances)[:3]].tolist()) <= found
+
+
+def test_recommends_the_closest_size_with_one_per_brand(tmp_path):
+    path = write_catalog(tmp_path / "catalog.csv", [
+        chart("a-s", "A", "S", -1), chart("a-m", "A", "M", 0.1), chart("a-l", "A", "L", 1.5),
+        chart("b-m", "B", "M", 0.3), chart("b-xl", "B", "XL", 2),
+    ])
+    catalog = SizeCatalog()
+    catalog.refresh([path])
+    recommendations = catalog.recommend(BODY, top=3)
+    assert [r["sku"] for r in recommendations] == ["a-m", "b-m"]
+    assert all(r["fits"] for r in recommendations)
+    assert [r["sku"] for r in catalog.recommend(BODY, top=2, per_brand=2)] == ["a-m", "b-m"]
+    assert [r["sku"] for r in catalog.recommend(BODY, top=3, per_brand=2)] == ["a-m", "b-m", "a-s"]
+
+
+def test_charts_and_scans_with_missing_measurements(tmp_path):
+    path = write_catalog(tmp_path / "catalog.csv", [
+        chart("tops-m", "Tops", "M", 0, height=None, waist=None, lower_length=None),
+        chart("pants-m", "Pants", "M", 0.2, shoulder=None, arm=None, chest=None),
+    ])
+    assert np.isnan(read_catalog(path).values).sum() == 6
+    catalog = SizeCatalog()
+    catalog.refresh([path])
+    assert [r["sku"] for r in catalog.recommend(BODY)] == ["tops-m", "pants-m"]
+    # A scan without any upper-body measurement can only be compared with the pants
+    lower_only = {**BODY, "shoulder": None, "arm": None, "chest": None}
+    assert [r["sku"] for r in catalog.recommend(lower_only)] == ["pants-m"]
+
+
+def test_brand_tolerances_decide_what_fits(tmp_path):
+    path = write_catalog(tmp_path / "catalog.csv", [chart("a", "Strict", "M", 0, chest=BODY["chest"] + 3),
+                                                    chart("b", "Loose", "M", 0, chest=BODY["chest"] + 3)])
+    catalog = SizeCatalog({"Strict": {"chest": 2.0}, "Loose": {"chest": 6.0}})
+    catalog.refresh([path])
+    fits = {r["brand"]: r["fits"] for r in catalog.recommend(BODY)}
+    assert fits == {"Strict": False, "Loose": True}
+    assert catalog.recommend(BODY)[0]["brand"] == "Loose"
+
+
+def test_refresh_reloads_changed_files_and_drops_removed_ones(tmp_path):
+    first = write_catalog(tmp_path / "first.csv", [chart("a-m", "A", "M", 0)])
+    second = write_catalog(tmp_path / "second.csv", [chart("b-m", "B", "M", 0.5)])
+    catalog = SizeCatalog()
+    assert catalog.refresh([first, second]) == [first, second]
+    assert catalog.refresh([first, second]) == []
+
+    write_catalog(tmp_path / "second.csv", [chart("b-m", "B", "M", 0.5), chart("b-l", "B", "L", 1)])
+    stat = os.stat(second)
+    os.utime(second, (stat.st_atime, stat.st_mtime + 1))
+    assert catalog.refresh([first, second]) == [second]
+    assert len(catalog) == 3
+
+    assert catalog.refresh([second]) == []
+    assert {r["brand"] for r in catalog.recommend(BODY)} == {"B"}
@@ -0,0 +1,50 @@
+import math
+
+import pytest
+
+import tune_profile
+from benchmark import make_synthetic_video
+from landmark_filter import LandmarkFilter
+from person_gate import PersonGate
+from scheduler import KeyframeScheduler
+from tune_profile import evaluate_profile, within_limits
+
+pytestmark = pytest.mark.usefixtures("fake_mediapipe")
+
+PROFILE = {"model_complexity": 0, "input_width": 160,
+           "min_detection_confidence": 0.5, "min_tracking_confidence": 0.5}
+
+
+@pytest.fixture
+def recording(tmp_path):
+    source = make_synthetic_video(str(tmp_path / "clip.avi"), frames=60, size=(320, 240))
+    return {"source": source, "measurements": {"height": 100.0, "shoulder": 10.0}}
+
+
+def test_profiles_are_tuned_on_the_kiosk_pipeline(monkeypatch, recording):
+    pipelines = []
+    process_frames = tune_profile.process_frames
+
+    def spy(frames, pose, calculators, **options):
+        pipelines.append(options)
+        return process_frames(frames, pose, calculators, **options)
+
+    monkeypatch.setattr(tune_profile, "process_frames", spy)
+    evaluate_profile(PROFILE, [recording, recording])
+    assert len(pipelines) == 2
+    for options in pipelines:
+        assert isinstance(options["gate"], PersonGate)
+        assert isinstance(options["scheduler"], KeyframeScheduler)
+        assert isinstance(options["landmark_filter"], LandmarkFilter)
+        assert options["input_width"] == 160
+    # Each recording starts with fresh per-session stages
+    assert pipelines[0]["scheduler"] is not pipelines[1]["scheduler"]
+
+
+def test_evaluation_scores_every_labelled_measurement(recording):
+    run = evaluate_profile(PROFILE, [recording], max_frames=45)
+    assert run["latency"]["count"] == 45
+    assert run["errors"].keys() == {"height", "shoulder"}
+    assert all(math.isfinite(error) for error in run["errors"].values())
+    assert within_limits(run["errors"], math.inf, {})
+    assert not within_limits(run["errors"], 0.0, {"height": math.inf})
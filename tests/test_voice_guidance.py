@@ -0,0 +1,75 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import voice_guidance
+from landmarks import LEFT_ANKLE, NOSE
+from tests.fake_pose import standing_pose
+from voice_guidance import PROMPTS, VoiceGuide, guidance_state
+
+MEASURING = {"height": SimpleNamespace(converged=False), "waist": SimpleNamespace(converged=True)}
+CONVERGED = {"height": SimpleNamespace(converged=True), "waist": SimpleNamespace(converged=True)}
+
+
+@pytest.fixture
+def spoken(monkeypatch):
+    """Texts the guide speaks, through a stub pyttsx3 engine instead of audio."""
+    texts = []
+    engine = SimpleNamespace(say=texts.append, runAndWait=lambda: None)
+    monkeypatch.setitem(sys.modules, "pyttsx3", SimpleNamespace(init=lambda: engine))
+    monkeypatch.setattr(voice_guidance, "simpleaudio", None)
+    return texts
+
+
+def test_guidance_state_follows_the_pipeline():
+    assert guidance_state(None, MEASURING) == "no_person"
+    assert guidance_state(standing_pose(), MEASURING) == "hold_still"
+    assert guidance_state(standing_pose(), CONVERGED) == "done"
+
+    cut_off = standing_pose()
+    cut_off[LEFT_ANKLE, 1] = 0.995
+    assert guidance_state(cut_off, CONVERGED) == "step_back"
+    hidden = standing_pose()
+    hidden[NOSE, 3] = 0.2
+    assert guidance_state(hidden, MEASURING) == "step_back"
+
+
+def test_state_is_spoken_once_it_settles(spoken):
+    guide = VoiceGuide(settle_frames=3)
+    try:
+        for _ in range(2):
+            guide.update(None, MEASURING)
+        assert guide.pending.empty()
+        guide.update(None, MEASURING)
+        # Staying in the same state does not queue it again
+        for _ in range(5):
+            guide.update(None, MEASURING)
+    finally:
+        guide.close()
+    assert spoken == [PROMPTS["no_person"]]
+
+
+def test_done_is_spoken_right_away(spoken):
+    guide = VoiceGuide(settle_frames=5)
+    guide.update(standing_pose(), CONVERGED)
+    guide.close()
+    assert spoken == [PROMPTS["done"]]
+
+
+def test_prompts_are_not_repeated_within_repeat_after(spoken):
+    guide = VoiceGuide(prompts={"hold_still": "Freeze."}, settle_frames=1, repeat_after=60)
+    try:
+        assert guide.say("hold_still")
+        first = guide.last_spoken["hold_still"]
+        assert not guide.say("hold_still")
+        # The state settling again within repeat_after stays silent too
+        guide.update(standing_pose(), MEASURING)
+        assert guide.last_spoken["hold_still"] == first
+    finally:
+        guide.close()
+    assert spoken == ["Freeze."]
+
+    guide = VoiceGuide(settle_frames=1, repeat_after=0)
+    assert guide.say("hold_still") and guide.say("hold_still")
+    guide.close()
@@ -0,0 +1,162 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+
+from benchmark import percentiles
+from body_measurement import calibrated_calculators, pipeline_options, process_frames, summarize
+from calibration import DEFAULT_CACHE, CalibrationCache
+from metrics import MetricsRegistry
+from model_pool import DEFAULT_PROFILE, pose_options, warm_pose
+from offline import iter_frames
+
+
+def load_manifest(path):
+    """Labelled recordings: a JSON list of {"source": ..., "measurements": {name: cm}}.
+
+    Sources are video files or frame directories, relative to the manifest.
+    Only the measurements listed for a recording are scored.
+    """
+    with open(path) as file:
+        entries = json.load(file)
+    root = os.path.dirname(os.path.abspath(path))
+    return [{"source": os.path.join(root, entry["source"]), "measurements": entry["measurements"]}
+            for entry in entries]
+
+
+def timed_frames(frames, samples, max_frames=None):
+    """Yield frames and append the time the pipeline spent on each one to samples."""
+    for count, img in enumerate(frames):
+        if max_frames is not None and count >= max_frames:
+            break
+        started = time.perf_counter()
+        yield img
+        samples.append(time.perf_counter() - started)
+
+
+def evaluate_profile(profile, recordings, max_frames=None, camera_calibration=None, use_filter=True):
+    """Per-frame latency and mean absolute error (cm) per measurement for one profile.
+
+    Recordings run through the same pipeline as a kiosk scan (see
+    body_measurement.pipeline_options), measured with camera_calibration if
+    the recordings come from a calibrated camera and without the landmark
+    filter if use_filter is False. A recording that never
+    produces a measurement it is labelled with counts as an infinite error
+    for that measurement.
+    """
+    samples = []
+    errors = {}
+    pose = warm_pose(**pose_options(profile))
+    try:
+        for recording in recordings:
+            pose.reset()
+            frames = timed_frames(iter_frames(recording["source"], timestamps=True), samples, max_frames)
+            estimators = process_frames(frames, pose, calibrated_calculators(camera_calibration),
+                                        metrics=MetricsRegistry(),
+                                        **pipeline_options(profile, use_filter=use_filter,
+                                                           camera_calibration=camera_calibration))
+            results = summarize(estimators)
+            for name, truth in recording["measurements"].items():
+                value = results.get(name)
+                errors.setdefault(name, []).append(float('inf') if value is None else abs(value - truth))
+    finally:
+        pose.close()
+    return {
+        "latency": percentiles(samples),
+        "errors": {name: sum(values) / len(values) for name, values in errors.items()},
+    }
+
+
+def within_limits(errors, max_error, limits):
+    """Whether every measurement's error is within its own limit, or max_error otherwise."""
+    return all(error <= limits.get(name, max_error) for name, error in errors.items())
+
+
+def candidate_profiles(complexities, widths, detection, tracking):
+    for complexity, width, det, track in itertools.product(complexities, widths, detection, tracking):
+        yield {"model_complexity": complexity, "input_width": width,
+               "min_detection_confidence": det, "min_tracking_confidence": track}
+
+
+def tune(recordings, profiles, max_error, limits=None, max_frames=None, camera_calibration=None, use_filter=True):
+    """Evaluate every profile; returns (fastest profile within the error limits or None, all runs)."""
+    limits = limits or {}
+    runs = []
+    for profile in profiles:
+        run = {**profile, **evaluate_profile(profile, recordings, max_frames, camera_calibration, use_filter)}
+        run["accepted"] = within_limits(run["errors"], max_error, limits)
+        runs.append(run)
+        print(f"{describe(profile)}: mean {run['latency'].get('mean_ms', 0):.1f} ms/frame, "
+              f"worst error {max(run['errors'].values(), default=0):.2f} cm"
+              f"{'' if run['accepted'] else ' (over the limit)'}")
+    accepted = [run for run in runs if run["accepted"] and run["latency"]["count"]]
+    best = min(accepted, key=lambda run: run["latency"]["mean_ms"], default=None)
+    return best, runs
+
+
+def describe(profile):
+    width = profile["input_width"] or "full"
+    return (f"complexity {profile['model_complexity']}, width {width}, "
+            f"detection {profile['min_detection_confidence']}, tracking {profile['min_tracking_confidence']}")
+
+
+def parse_width(text):
+    return None if text == 'full' else int(text)
+
+
+def parse_limit(text):
+    name, _, value = text.partition('=')
+    if not value:
+        raise argparse.ArgumentTypeError(f"Expected NAME=CM, got {text!r}")
+    return name, float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find the fastest pose inference profile that keeps every measurement within an error limit.")
+    parser.add_argument('manifest', help="JSON list of labelled recordings")
+    parser.add_argument('--max-error', type=float, default=2.0, help="allowed mean absolute error (cm)")
+    parser.add_argument('--limit', type=parse_limit, action='append', default=[],
+                        help="per-measurement error limit, e.g. --limit waist=3")
+    parser.add_argument('--complexities', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--widths', type=parse_width, nargs='+', default=[None, 960, 640, 480],
+                        help="model input widths in pixels, or 'full' for the camera resolution")
+    parser.add_argument('--detection', type=float, nargs='+', default=[0.5, 0.7],
+                        help="min_detection_confidence values")
+    parser.add_argument('--tracking', type=float, nargs='+', default=[0.5, 0.7],
+                        help="min_tracking_confidence values")
+    parser.add_argument('--frames', type=int, help="frames used per recording (default: all)")
+    parser.add_argument('--output', default=DEFAULT_PROFILE, help="file the chosen profile is saved to")
+    parser.add_argument('--report', help="also save every evaluated profile to this JSON file")
+    parser.add_argument('--camera', help="camera the recordings were made with, to use its cached calibration")
+    parser.add_argument('--calibration', default=DEFAULT_CACHE, help="camera calibration cache used with --camera")
+    parser.add_argument('--no-filter', dest='use_filter', action='store_false',
+                        help="tune on the raw landmarks, for kiosks that do not smooth them")
+    args = parser.parse_args()
+
+    camera_calibration = None
+    if args.camera is not None:
+        camera_calibration = CalibrationCache(args.calibration).get(args.camera)
+        if camera_calibration is None:
+            print(f"No calibration for camera {args.camera}; using the default scaling factors.")
+    recordings = load_manifest(args.manifest)
+    profiles = candidate_profiles(args.complexities, args.widths, args.detection, args.tracking)
+    best, runs = tune(recordings, profiles, args.max_error, dict(args.limit), args.frames, camera_calibration,
+                      args.use_filter)
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(runs, file, indent=2)
+    if best is None:
+        print("No profile meets the error limits.")
+        sys.exit(1)
+    with open(args.output, 'w') as file:
+        json.dump(best, file, indent=2)
+    print(f"Fastest profile within the limits: {describe(best)} "
+          f"({best['latency']['mean_ms']:.1f} ms/frame). Saved to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+
+from landmarks import LEFT_ANKLE, NOSE, RIGHT_ANKLE
+
+try:
+    import simpleaudio
+except ImportError:  # simpleaudio is optional; prompts are then spoken by pyttsx3 directly
+    simpleaudio = None
+
+DEFAULT_CACHE_DIR = 'voice_prompts'
+
+# What the subject hears for each pipeline state
+PROMPTS = {
+    "welcome": "Please come into the frame and stand at least 180 centimeters away from the camera.",
+    "no_person": "I can't see you. Please step into the frame.",
+    "step_back": "Please step back so your whole body is visible.",
+    "hold_still": "Please stand still for a moment.",
+    "done": "Measurement complete. Thank you.",
+}
+
+# Landmarks this close to the top or bottom edge (normalized) count as cut off
+FRAME_MARGIN = 0.02
+MIN_VISIBILITY = 0.5
+
+
+def guidance_state(landmarks, estimators):
+    """Prompt key for the current frame: nobody in view, body cut off, measuring or done."""
+    if landmarks is None:
+        return "no_person"
+    ends = landmarks[[NOSE, LEFT_ANKLE, RIGHT_ANKLE]]
+    if (ends[:, 1].min() < FRAME_MARGIN or ends[:, 1].max() > 1 - FRAME_MARGIN
+            or ends[:, 3].min() < MIN_VISIBILITY):
+        return "step_back"
+    if all(estimator.converged for estimator in estimators.values()):
+        return "done"
+    return "hold_still"
+
+
+class PromptCache:
+    """Prompt audio synthesized once with pyttsx3 and kept as WAV files.
+
+    Files are named after a hash of the text, so editing a prompt
+    synthesizes only that prompt again and every later session starts
+    with all audio ready.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+
+    def path(self, text):
+        return os.path.join(self.directory, hashlib.sha1(text.encode()).hexdigest()[:16] + '.wav')
+
+    def synthesize(self, texts):
+        """Write the audio of every text that is not cached yet, in one pyttsx3 run."""
+        missing = [text for text in texts if not os.path.exists(self.path(text))]
+        if not missing:
+            return
+        import pyttsx3
+
+        os.makedirs(self.directory, exist_ok=True)
+        engine = pyttsx3.init()
+        for text in missing:
+            engine.save_to_file(text, self.path(text))
+        engine.runAndWait()
+
+
+class VoiceGuide:
+    """Speaks prompts on a background thread so capture and inference never wait for audio.
+
+    update() maps the pipeline state to a prompt once it has held for
+    `settle_frames` frames, and a prompt is not repeated within
+    `repeat_after` seconds. Only the newest prompt waits to be played;
+    older ones that were not played yet are dropped. With simpleaudio the
+    cached WAV files are played, otherwise pyttsx3 speaks the text on the
+    playback thread.
+    """
+
+    def __init__(self, prompts=None, cache=None, settle_frames=5, repeat_after=8.0):
+        self.prompts = {**PROMPTS, **(prompts or {})}
+        self.cache = cache or PromptCache()
+        self.settle_frames = settle_frames
+        self.repeat_after = repeat_after
+        self.pending = queue.Queue(maxsize=1)
+        self.state = None
+        self.state_frames = 0
+        self.last_spoken = {}
+        self.thread = threading.Thread(target=self._play, daemon=True)
+        self.thread.start()
+
+    def say(self, key):
+        """Queue a prompt without waiting; returns whether it was queued."""
+        now = time.monotonic()
+        if now - self.last_spoken.get(key, float('-inf')) < self.repeat_after:
+            return False
+        self.last_spoken[key] = now
+        try:
+            self.pending.get_nowait()
+        except queue.Empty:
+            pass
+        self.pending.put_nowait(key)
+        return True
+
+    def update(self, landmarks, estimators):
+        """Prompt for this frame's pipeline state once the state has settled."""
+        state = guidance_state(landmarks, estimators)
+        self.state_frames = self.state_frames + 1 if state == self.state else 1
+        self.state = state
+        # Done is announced right away; the session usually ends on that frame
+        if state == "done" or self.state_frames == self.settle_frames:
+            self.say(state)
+
+    def close(self, wait=True):
+        """Stop the playback thread, after playing a pending prompt if wait is set."""
+        if not self.thread.is_alive():
+            return
+        if not wait:
+            try:
+                self.pending.get_nowait()
+            except queue.Empty:
+                pass
+        self.pending.put(None)
+        self.thread.join()
+
+    def _play(self):
+        engine = None
+        if simpleaudio is not None:
+            # Synthesize missing prompts here, so a cold cache never delays the session
+            self.cache.synthesize(self.prompts.values())
+        while True:
+            key = self.pending.get()
+            if key is None:
+                break
+            text = self.prompts[key]
+            if simpleaudio is not None:
+                simpleaudio.WaveObject.from_wave_file(self.cache.path(text)).play().wait_done()
+                continue
+            if engine is None:
+                import pyttsx3
+                engine = pyttsx3.init()
+            engine.say(text)
+            engine.runAndWait()
@@ -1,11 +1,14 @@
-import cv2
-import mediapipe as mp
-import math
-import numpy as np
+import argparse
 
-# Initialize Mediapipe Pose
-mpPose = mp.solutions.pose
-pose = mpPose.Pose()
+import cv2
+from body_measurement import FRAME_TIMEOUT, FrameBuffers, model_input
+from capture import FrameGrabber
+from estimator import StreamingEstimator
+from measurement_store import DEFAULT_STORE, MeasurementStore, new_session_id
+from landmark_filter import LandmarkFilter
+from model_pool import create_pose
+from landmarks import (LEFT_HIP, RIGHT_HIP, SEGMENT_INDEX, landmarks_to_array,
+                       segment_lengths, segment_visibility, to_pixels)
 
 # Calibration: Known reference object size (in cm) and its pixel size
 known_object_size_cm = 80  # Example: Known size of reference object in cm (e.g., ruler)
@@ -13,87 +16,95 @@ known_object_pixel_size = 100  # Measured pixel size of the reference object in
 
 # Calculate the scaling factor for converting pixels to cm
 scaling_factor = known_object_size_cm / known_object_pixel_size
-print(f"Calibration Scaling Factor: {scaling_factor} cm per pixel")
 
-# Function to smooth values for more stable output
-def smooth_value(value, history, window_size=17):
-    history.append(value)
-    if len(history) > window_size:
-        history.pop(0)
-    return np.mean(history)
-
-# Function to save final measurement to a text file
-def save_measurement_to_file(average_measurement):
-    with open("measurement.txt", "a") as file:
-        file.write(f"Waist Circumference: {average_measurement:.2f} cm\n")
-    print(f"Measurement saved to 'measurement.txt': {average_measurement:.2f} cm")
+# Function to save final measurement to the measurement store
+def save_measurement(average_measurement, estimator, session_id):
+    with MeasurementStore() as store:
+        store.record(session_id, "waist", average_measurement, estimator.count,
+                     estimator.variance, {"waist": scaling_factor})
+    print(f"Measurement saved to '{DEFAULT_STORE}' as session {session_id}: {average_measurement:.2f} cm")
 
 # Function to detect waist circumference in the video feed
-def detect_waist_circumference_in_video():
-    capture = cv2.VideoCapture(0)
+def detect_waist_circumference_in_video(session_id=None):
+    print(f"Calibration Scaling Factor: {scaling_factor} cm per pixel")
+    capture = FrameGrabber(0)
 
     if not capture.isOpened():
         print("Error: Camera not accessible!")
         return
 
-    waist_width_history = []  # Store the waist measurements for smoothing
+    # One session id per run, so the other scripts can add to the same subject's session
+    session_id = session_id or new_session_id()
+
+    # Build the pose model when a measurement starts rather than on import
+    pose = create_pose()
+    landmark_filter = LandmarkFilter()  # Smooths landmark jitter before measuring
+    buffers = FrameBuffers()  # Reused for the RGB conversion, so frames allocate nothing
 
-    while True:
-        isTrue, img = capture.read()
-        if not isTrue:
-            print("Failed to capture image.")
-            break
+    waist_estimator = StreamingEstimator(window=17)  # Average of the last 17 waist measurements
 
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        result = pose.process(img_rgb)
+    try:
+        while True:
+            # Newest frame, stamped with when it was captured, for the landmark filter
+            isTrue, img, captured_at = capture.read_latest(FRAME_TIMEOUT)
+            if not isTrue:
+                print("Failed to capture image.")
+                break
 
-        if result.pose_landmarks:
-            landmarks = result.pose_landmarks.landmark
-            h, w, c = img.shape
+            img_rgb = model_input(img, buffers)
+            result = pose.process(img_rgb)
 
-            # Extract relevant landmarks for waist measurement (left and right hips)
-            left_hip = landmarks[mpPose.PoseLandmark.LEFT_HIP.value]
-            right_hip = landmarks[mpPose.PoseLandmark.RIGHT_HIP.value]
+            landmarks = landmark_filter(landmarks_to_array(result), captured_at)
+            if landmarks is not None:
+                h, w, c = img.shape
 
-            # Calculate pixel distance between the left and right hips (waist measurement)
-            left_hip_x, left_hip_y = int(left_hip.x * w), int(left_hip.y * h)
-            right_hip_x, right_hip_y = int(right_hip.x * w), int(right_hip.y * h)
-            distance_pixels_waist = math.sqrt((left_hip_x - right_hip_x) ** 2 + (left_hip_y - right_hip_y) ** 2)
+                # Extract relevant landmarks for waist measurement (left and right hips)
+                points = to_pixels(landmarks, w, h).astype(int).tolist()
+                left_hip_x, left_hip_y = points[LEFT_HIP]
+                right_hip_x, right_hip_y = points[RIGHT_HIP]
 
-            # Convert pixel distance to centimeters using the calibrated scaling factor
-            waist_circumference_cm = distance_pixels_waist * scaling_factor
+                # Calculate pixel distance between the left and right hips (waist measurement)
+                distance_pixels_waist = segment_lengths(landmarks, w, h)[SEGMENT_INDEX["waist"]]
 
-            # Smooth the waist circumference value by averaging over the last 17 frames
-            waist_circumference_smoothed = smooth_value(waist_circumference_cm, waist_width_history, window_size=17)
+                # Convert pixel distance to centimeters using the calibrated scaling factor
+                waist_circumference_cm = distance_pixels_waist * scaling_factor
 
-            # Debugging output: Print raw distance and converted waist circumference
-            print(f"Raw pixel distance (Waist): {distance_pixels_waist:.2f} px")
-            print(f"Waist Circumference: {waist_circumference_cm:.2f} cm (Raw), {waist_circumference_smoothed:.2f} cm (Smoothed)")
+                # Smooth the waist circumference value by averaging over the last 17 frames
+                waist_estimator.update(waist_circumference_cm, segment_visibility(landmarks)[SEGMENT_INDEX["waist"]])
+                waist_circumference_smoothed = waist_estimator.value or waist_circumference_cm
 
-            # Draw landmarks and waist circumference
-            cv2.circle(img, (left_hip_x, left_hip_y), 10, (0, 255, 0), -1)  # Left Hip
-            cv2.circle(img, (right_hip_x, right_hip_y), 10, (0, 0, 255), -1)  # Right Hip
-            cv2.line(img, (left_hip_x, left_hip_y), (right_hip_x, right_hip_y), (255, 255, 0), 2)  # Waist Line
+                # Draw landmarks and waist circumference
+                cv2.circle(img, (left_hip_x, left_hip_y), 10, (0, 255, 0), -1)  # Left Hip
+                cv2.circle(img, (right_hip_x, right_hip_y), 10, (0, 0, 255), -1)  # Right Hip
+                cv2.line(img, (left_hip_x, left_hip_y), (right_hip_x, right_hip_y), (255, 255, 0), 2)  # Waist Line
 
-            # Display smoothed waist circumference on the video feed
-            cv2.putText(img, f"Waist Circumference: {int(waist_circumference_smoothed)} cm", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                # Display smoothed waist circumference on the video feed
+                cv2.putText(img, f"Waist Circumference: {int(waist_circumference_smoothed)} cm", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
 
-        # Show the video feed with landmarks
-        cv2.imshow("Waist Measurement", img)
+            # Show the video feed with landmarks
+            cv2.imshow("Waist Measurement", img)
 
-        # Exit on 'q' key press
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
+            # Exit on 'q' key press
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
 
-    # Calculate and display the average of the last 17 frames when 'q' is pressed
-    if waist_width_history:
-        final_average = np.mean(waist_width_history)
-        print(f"Final Average Waist Circumference: {final_average:.2f} cm")
-        save_measurement_to_file(final_average)
+            # Stop by itself once the measurement is stable
+            if waist_estimator.converged:
+                print("Waist measurement converged.")
+                break
 
-    capture.release()
-    cv2.destroyAllWindows()
+        # Calculate and display the average of the last 17 frames
+        if waist_estimator.count:
+            final_average = waist_estimator.value
+            print(f"Final Average Waist Circumference: {final_average:.2f} cm")
+            save_measurement(final_average, waist_estimator, session_id)
+    finally:
+        capture.release()
+        cv2.destroyAllWindows()
+        pose.close()
 
 # Run the main function to start video capture
 if __name__ == "__main__":
-    detect_waist_circumference_in_video()
+    parser = argparse.ArgumentParser(description="Measure the waist from the camera.")
+    parser.add_argument('--session', help="session id to record under, to group it with the other measurements")
+    detect_waist_circumference_in_video(parser.parse_args().session)